@@ -5,4 +5,5 @@
 cd $(cd $(dirname $0); pwd)/../
 
 conda activate expdb_batch && \
-  python run_expdb_batch.py -o 1
+  python run_expdb_batch.py -o 1 -w "${EXPDB_BATCH_WORKERS:-1}" \
+    ${EXPDB_BATCH_WORKER_MEMORY_LIMIT:+-m "$EXPDB_BATCH_WORKER_MEMORY_LIMIT"}
@@ -60,6 +60,57 @@ export async function getHeatMapDataApi(path: string): Promise<{
 
 export type ImageData = number[][][]
 
+const TIFF_EXT = [".tif", ".tiff"]
+
+// dtypes of the frames, as cast by ImageFrames (FRAMES_DTYPES) of the server
+const FRAMES_ARRAY_TYPES: {
+  [dtype: string]: new (buffer: ArrayBuffer) => ArrayLike<number>
+} = {
+  "|u1": Uint8Array,
+  "|i1": Int8Array,
+  "<u2": Uint16Array,
+  "<i2": Int16Array,
+  "<u4": Uint32Array,
+  "<i4": Int32Array,
+  "<f4": Float32Array,
+  "<f8": Float64Array,
+}
+
+// frames of TIFF images are served as binary (t, y, x) arrays
+async function getImageFramesApi(
+  path: string,
+  params: {
+    workspaceId: number
+    startIndex?: number
+    endIndex?: number
+  },
+): Promise<{ data: ImageData }> {
+  const response = await axios.get(`${BASE_URL}/outputs/frames/${path}`, {
+    params: {
+      workspace_id: params.workspaceId,
+      start_index: params.startIndex,
+      end_index: params.endIndex,
+    },
+    responseType: "arraybuffer",
+  })
+  const [t, height, width] = String(response.headers["x-frames-shape"])
+    .split(",")
+    .map(Number)
+  const ArrayType = FRAMES_ARRAY_TYPES[response.headers["x-frames-dtype"]]
+  const values = new ArrayType(response.data)
+
+  const data: ImageData = []
+  for (let i = 0; i < t; i++) {
+    const frame: number[][] = []
+    for (let y = 0; y < height; y++) {
+      const offset = (i * height + y) * width
+      frame.push(Array.from({ length: width }, (_, x) => values[offset + x]))
+    }
+    data.push(frame)
+  }
+  return { data }
+}
+
 export async function getImageDataApi(
   path: string,
   params: {
@@ -68,6 +119,9 @@ export async function getImageDataApi(
     endIndex?: number
   },
 ): Promise<{ data: ImageData; meta?: PlotMetaData }> {
+  if (TIFF_EXT.some((ext) => path.toLowerCase().endsWith(ext))) {
+    return getImageFramesApi(path, params)
+  }
   const response = await axios.get(`${BASE_URL}/outputs/image/${path}`, {
     params: {
       workspace_id: params.workspaceId,
@@ -1,10 +1,16 @@
 import argparse
+import os
 
 
 def main(args):
     from studio.app.optinist.core.expdb.batch_runner import ExpDbBatchRunner
 
-    runner = ExpDbBatchRunner(args.org_id)
+    runner = ExpDbBatchRunner(
+        args.org_id,
+        workers=args.workers,
+        worker_memory_limit=args.worker_memory_limit,
+        worker_threads=args.worker_threads,
+    )
     runner.process()
 
 
@@ -13,6 +19,38 @@ if __name__ == "__main__":
     parser.add_argument(
         "-o", "--org_id", type=int, required=True, help="organization id"
     )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="number of datasets processed concurrently",
+    )
+    parser.add_argument(
+        "-m",
+        "--worker_memory_limit",
+        type=float,
+        default=None,
+        help="memory limit (RSS) of each worker process (GB)",
+    )
+    parser.add_argument(
+        "-t",
+        "--worker_threads",
+        type=int,
+        default=None,
+        help="number of threads of each worker process (default: cpus / workers)",
+    )
+    args = parser.parse_args()
+
+    # Note: 並列実行時は、workerプロセスごとのスレッド数(BLAS/OpenMP)を制限する
+    # スレッドプールはライブラリのload時に生成され、workerプロセスに(fork)継承されるため、
+    # ここで事前に（ライブラリのimport前に）環境変数を設定する
+    if args.workers > 1:
+        args.worker_threads = args.worker_threads or max(
+            1, (os.cpu_count() or 1) // args.workers
+        )
+        for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+            os.environ[name] = str(args.worker_threads)
 
     from studio.app.optinist.microscopes.ND2Reader import ND2Reader
 
@@ -23,4 +61,4 @@ if __name__ == "__main__":
     # MicroscopeReader に必要な .so を先行loadする対処をとっている。
     ND2Reader()
 
-    main(parser.parse_args())
+    main(args)
@@ -34,6 +34,7 @@ from studio.app.common.routers import (
     workspace,
 )
 from studio.app.dir_path import DIRPATH
+from studio.app.optinist.core.edit_ROI import EditRoiSessions
 from studio.app.optinist.routers import expdb, hdf5, mat, nwb, roi
 
 
@@ -47,6 +48,7 @@ async def lifespan(app: FastAPI):
     yield
 
     # Shutdown event
+    EditRoiSessions.close()
     logger.info('"Studio" application shutdown.')
 
 
@@ -1,6 +1,5 @@
 import glob
 import os
-import pickle
 import re
 import shutil
 from dataclasses import asdict
@@ -16,6 +15,11 @@ from studio.app.common.core.experiment.experiment_reader import ExptConfigReader
 from studio.app.common.core.logger import AppLogger
 from studio.app.common.core.utils.config_handler import ConfigWriter
 from studio.app.common.core.utils.filepath_creater import join_filepath
+from studio.app.common.core.utils.pickle_handler import (
+    NodeArrayStore,
+    PickleReader,
+    PickleWriter,
+)
 from studio.app.common.core.workflow.workflow import NodeRunStatus, WorkflowRunStatus
 from studio.app.common.core.workflow.workflow_reader import WorkflowConfigReader
 from studio.app.const import DATE_FORMAT
@@ -214,9 +218,14 @@ class ExptDataWriter:
                 "yaml": glob.glob(
                     os.path.join(directory, "**", "*.yaml"), recursive=True
                 ),
-                "npy": glob.glob(
-                    os.path.join(directory, "**", "*.npy"), recursive=True
-                ),
+                "npy": [
+                    path
+                    for path in glob.glob(
+                        os.path.join(directory, "**", "*.npy"), recursive=True
+                    )
+                    # node result arrays are numeric only, skip them
+                    if not os.path.dirname(path).endswith(NodeArrayStore.DIR_SUFFIX)
+                ],
                 "pkl": glob.glob(
                     os.path.join(directory, "**", "*.pkl"), recursive=True
                 ),
@@ -262,12 +271,10 @@ class ExptDataWriter:
     ) -> None:
         logger = AppLogger.get_logger()
         try:
-            with open(file_path, "rb") as file:
-                data = pickle.load(file)
+            data = PickleReader.read(file_path)
 
             updated_data = self.__replace_ids_recursive(data, old_id, new_id)
-            with open(file_path, "wb") as file:
-                pickle.dump(updated_data, file)
+            PickleWriter.write(file_path, updated_data)
 
             logger.info(f"Updated Pickle: {file_path}")
         except Exception as e:
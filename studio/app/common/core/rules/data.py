@@ -13,6 +13,9 @@ from studio.app.common.core.rules.file_writer import FileWriter
 from studio.app.common.core.snakemake.snakemake_reader import RuleConfigReader
 from studio.app.common.core.utils.pickle_handler import PickleWriter
 from studio.app.common.core.workflow.workflow import NodeType, NodeTypeUtil
+from studio.app.common.core.workflow.workflow_status_journal import (
+    WorkflowStatusJournal,
+)
 from studio.app.const import FILETYPE
 
 if __name__ == "__main__":
@@ -47,3 +50,4 @@ if __name__ == "__main__":
         assert False, f"Invalid file type: {rule_config.type}"
 
     PickleWriter.write(rule_config.output, outputfile)
+    WorkflowStatusJournal.write_success(rule_config.output, outputfile)
@@ -10,7 +10,7 @@ ROOT_DIRPATH = dirname(dirname(dirname(dirname(dirname(dirname(abspath(__file__)
 
 sys.path.append(ROOT_DIRPATH)
 
-from studio.app.common.core.rules.runner import Runner
+from studio.app.common.core.rules.rule_worker import RuleWorkerClient, RuleWorkerPool
 from studio.app.common.core.snakemake.snakemake_reader import RuleConfigReader
 from studio.app.common.core.utils.filepath_creater import join_filepath
 from studio.app.dir_path import DIRPATH
@@ -26,4 +26,10 @@ if __name__ == "__main__":
     rule_config.output = snakemake.output[0]
     run_script_path = sys.argv[0]
 
-    Runner.run(rule_config, last_output, run_script_path)
+    if RuleWorkerPool.is_available():
+        RuleWorkerClient.run(rule_config, last_output, run_script_path)
+    else:
+        # NOTE: imported here, since importing Runner loads all wrapper modules
+        from studio.app.common.core.rules.runner import Runner
+
+        Runner.run(rule_config, last_output, run_script_path)
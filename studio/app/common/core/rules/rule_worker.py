@@ -0,0 +1,373 @@
+"""
+Warm worker pool for algorithm rules (opt-in, POSIX only)
+
+By default, each algorithm rule runs `rules/func.py` in a new python process,
+which re-imports all the wrapper modules before running a single function.
+When `USE_RULE_WORKER_POOL=True` is set, `func.py` instead hands the rule over
+to a pre-warmed worker process of the same (conda) environment:
+
+- One worker is started per python environment on first use,
+  and listens on a local socket under `RuleWorkerPool.WORKER_DIR`.
+- The worker imports the wrappers (and common heavy libraries) once,
+  then forks a child process per rule, so rules still run isolated
+  and in parallel, but without the import overhead.
+- The worker exits after being idle for `RuleWorkerPool.IDLE_TIMEOUT` seconds,
+  or when a worker of updated app code replaces it (the workers are keyed by the code
+  version, so that rules never run on the code of a former deploy).
+- If the worker cannot be reached, the rule runs in the client process.
+  Errors of the worker after the rule has been handed over (including a crash
+  of its child process) are raised in the client, and the rule is not re-run.
+
+The worker also runs the commits of Edit ROI, whose algorithms run in the
+environment of the app (see `EditRoiUtils.execute`).
+"""
+import glob
+import hashlib
+import importlib
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+
+from studio.app.common.core.logger import AppLogger
+from studio.app.common.core.snakemake.smk import Rule
+from studio.app.common.core.utils.filepath_creater import join_filepath
+from studio.app.dir_path import DIRPATH
+
+logger = AppLogger.get_logger()
+
+
+class RuleWorkerError(Exception):
+    pass
+
+
+class RuleWorkerPool:
+    ENABLED = str(os.environ.get("USE_RULE_WORKER_POOL", False)).lower() == "true"
+    WORKER_DIR = f"{DIRPATH.DATA_DIR}/.rule_workers"
+    AUTHKEY_FILE = "authkey"
+    IDLE_TIMEOUT = 1800  # sec
+    CONNECT_TIMEOUT = 120  # sec
+    WATCH_INTERVAL = 10  # sec
+
+    # modules imported by the worker in advance
+    # (wrapper functions import most of their libraries locally)
+    PRELOAD_MODULES = [
+        "studio.app.common.core.rules.runner",
+        "studio.app.optinist.core.edit_ROI",
+        "numpy",
+        "scipy",
+        "pandas",
+        "h5py",
+        "pynwb",
+        "sklearn",
+        "statsmodels.api",
+        "caiman",
+        "suite2p",
+    ]
+
+    @classmethod
+    def is_available(cls) -> bool:
+        # the worker forks a child process per rule
+        return cls.ENABLED and os.name == "posix"
+
+    # code version of this process, computed once
+    __code_version = None
+
+    @classmethod
+    def get_address(cls) -> str:
+        # one worker per python environment and code version
+        return join_filepath(
+            [cls.WORKER_DIR, f"{cls.get_env_key()}-{cls.__get_code_key()}.sock"]
+        )
+
+    @classmethod
+    def get_env_key(cls) -> str:
+        return hashlib.md5(sys.prefix.encode()).hexdigest()[:12]
+
+    @classmethod
+    def __get_code_key(cls) -> str:
+        return hashlib.md5(cls.get_code_version().encode()).hexdigest()[:12]
+
+    @classmethod
+    def get_code_version(cls) -> str:
+        """
+        Version of the app code, by the modification times of its modules.
+        The code loaded by this process does not change, so it is computed once.
+        """
+        if cls.__code_version is None:
+            mtimes = [
+                os.stat(join_filepath([dirpath, filename])).st_mtime_ns
+                for dirpath, _, filenames in os.walk(DIRPATH.APP_DIR)
+                for filename in filenames
+                if filename.endswith(".py")
+            ]
+            cls.__code_version = f"{len(mtimes)}-{max(mtimes, default=0)}"
+        return cls.__code_version
+
+    @classmethod
+    def get_authkey(cls) -> bytes:
+        os.makedirs(cls.WORKER_DIR, mode=0o700, exist_ok=True)
+        authkey_path = join_filepath([cls.WORKER_DIR, cls.AUTHKEY_FILE])
+
+        try:
+            fd = os.open(authkey_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                f.write(os.urandom(32))
+        except FileExistsError:
+            pass
+
+        # the key may be being written by another process
+        for _ in range(10):
+            with open(authkey_path, "rb") as f:
+                authkey = f.read()
+            if len(authkey) == 32:
+                return authkey
+            time.sleep(0.1)
+
+        assert False, f"Invalid rule worker authkey: {authkey_path}"
+
+
+class RuleWorkerClient:
+    # errors connecting to the worker, to fall back to the client process
+    CONNECT_ERRORS = (OSError, EOFError, AuthenticationError)
+
+    @classmethod
+    def run(cls, rule_config: Rule, last_output: list, run_script_path: str) -> None:
+        """
+        Run the rule on the warm worker of the current environment,
+        and wait for its completion.
+        """
+        request = {
+            "rule": {
+                **rule_config.__dict__,
+                "input": list(rule_config.input),
+                "output": str(rule_config.output),
+            },
+            "last_output": last_output,
+            "run_script_path": run_script_path,
+            # the snakemake script process (this process) is kept as the process
+            # of the running rule, so that WorkflowMonitor can find/cancel it.
+            "pid": os.getpid(),
+        }
+
+        try:
+            conn = cls.__connect()
+        except cls.CONNECT_ERRORS as e:
+            logger.warning("rule worker unavailable, run the rule here: %s", e)
+
+            from studio.app.common.core.rules.runner import Runner
+
+            Runner.run(rule_config, last_output, run_script_path)
+            return
+
+        cls.__request(conn, request)
+
+    @classmethod
+    def commit_edit_roi(cls, file_path: str) -> None:
+        """
+        Commit the Edit ROI of the node on the warm worker,
+        and wait for its completion.
+        """
+        try:
+            conn = cls.__connect()
+        except cls.CONNECT_ERRORS as e:
+            logger.warning("rule worker unavailable, commit here: %s", e)
+
+            from studio.app.optinist.core.edit_ROI import EditROI
+
+            EditROI(file_path=file_path).commit()
+            return
+
+        cls.__request(conn, {"edit_roi": file_path})
+
+    @classmethod
+    def __request(cls, conn: Connection, request: dict) -> None:
+        # the request may have been (partially) run by the worker,
+        # so errors are raised instead of running it again here
+        try:
+            conn.send(request)
+            status, result = conn.recv()
+        except (OSError, EOFError) as e:
+            raise RuleWorkerError(f"rule worker terminated: {e!r}") from e
+        finally:
+            conn.close()
+
+        if status == "error":
+            raise RuleWorkerError(f"rule worker failed:\n{result}")
+
+    @classmethod
+    def __connect(cls) -> Connection:
+        address = RuleWorkerPool.get_address()
+        authkey = RuleWorkerPool.get_authkey()
+
+        try:
+            return Client(address, authkey=authkey)
+        except (FileNotFoundError, ConnectionRefusedError):
+            cls.__start_worker()
+
+        # wait for the worker to be warmed up
+        timeout = time.time() + RuleWorkerPool.CONNECT_TIMEOUT
+        while True:
+            try:
+                return Client(address, authkey=authkey)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.time() > timeout:
+                    raise
+                time.sleep(0.5)
+
+    @classmethod
+    def __start_worker(cls):
+        logger.info("start rule worker: %s", sys.prefix)
+
+        subprocess.Popen(
+            [sys.executable, "-m", __name__],
+            cwd=DIRPATH.ROOT_DIR,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+
+
+class RuleWorker:
+    def __init__(self):
+        self.address = RuleWorkerPool.get_address()
+        self.authkey = RuleWorkerPool.get_authkey()
+        self.last_active_at = time.time()
+
+    def serve(self):
+        listener = self.__listen()
+        if listener is None:
+            return
+
+        self.__preload()
+
+        # forked children are reaped automatically
+        signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+        threading.Thread(target=self.__watch_idle, daemon=True).start()
+
+        logger.info("rule worker ready: %s", self.address)
+        self.__remove_former_workers()
+
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                logger.warning("rule worker accept failed: %s", e)
+                continue
+
+            self.last_active_at = time.time()
+
+            if os.fork() == 0:
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                # NOTE: listener.close() would unlink the socket of the worker
+                self.__handle(conn)
+                os._exit(0)
+
+            conn.close()
+
+    def __listen(self) -> Listener:
+        if os.path.exists(self.address):
+            try:
+                Client(self.address, authkey=self.authkey).close()
+                logger.info("rule worker is already running: %s", self.address)
+                return None
+            except ConnectionRefusedError:
+                # stale socket file of a terminated worker
+                os.remove(self.address)
+
+        try:
+            return Listener(self.address, authkey=self.authkey)
+        except OSError as e:
+            # another worker has been started concurrently
+            logger.info("rule worker could not listen: %s", e)
+            return None
+
+    def __preload(self):
+        for module in RuleWorkerPool.PRELOAD_MODULES:
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                pass
+
+    def __remove_former_workers(self):
+        """
+        Remove the sockets of the workers started before this worker of this
+        environment, i.e. of the former code versions (new rules are run by
+        this worker of the current code), which then exit on watching them
+        """
+        pattern = join_filepath(
+            [RuleWorkerPool.WORKER_DIR, f"{RuleWorkerPool.get_env_key()}-*.sock"]
+        )
+        started_at = os.stat(self.address).st_mtime_ns
+        for address in glob.glob(pattern):
+            try:
+                if os.stat(address).st_mtime_ns < started_at:
+                    os.remove(address)
+            except FileNotFoundError:
+                pass
+
+    def __watch_idle(self):
+        while True:
+            time.sleep(RuleWorkerPool.WATCH_INTERVAL)
+
+            if not os.path.exists(self.address):
+                logger.info("rule worker replaced: %s", self.address)
+                os._exit(0)
+
+            if time.time() - self.last_active_at > RuleWorkerPool.IDLE_TIMEOUT:
+                logger.info("rule worker idle timeout: %s", self.address)
+                if os.path.exists(self.address):
+                    os.remove(self.address)
+                os._exit(0)
+
+    def __handle(self, conn: Connection):
+        from studio.app.common.core.rules.runner import Runner
+
+        try:
+            request = conn.recv()
+
+            # terminate the rule along with the client process (e.g. on cancel),
+            # which is detected as EOF on the connection
+            threading.Thread(
+                target=self.__watch_client, args=(conn,), daemon=True
+            ).start()
+
+            if "edit_roi" in request:
+                from studio.app.optinist.core.edit_ROI import EditROI
+
+                EditROI(file_path=request["edit_roi"]).commit()
+            else:
+                Runner.run(
+                    Rule(**request["rule"]),
+                    request["last_output"],
+                    request["run_script_path"],
+                    pid=request["pid"],
+                )
+            conn.send(("success", None))
+        except Exception as e:
+            err_msg = list(traceback.TracebackException.from_exception(e).format())
+            logger.error("\n".join(err_msg))
+            try:
+                conn.send(("error", "".join(err_msg)))
+            except OSError:
+                pass
+        finally:
+            conn.close()
+
+    @staticmethod
+    def __watch_client(conn: Connection):
+        try:
+            conn.recv()
+        except (EOFError, OSError):
+            pass
+        os._exit(1)
+
+
+if __name__ == "__main__":
+    RuleWorker().serve()
@@ -1,4 +1,3 @@
-import copy
 import gc
 import json
 import os
@@ -18,13 +17,16 @@ from studio.app.common.core.snakemake.smk import Rule
 from studio.app.common.core.utils.file_reader import JsonReader
 from studio.app.common.core.utils.filepath_creater import join_filepath
 from studio.app.common.core.utils.pickle_handler import PickleReader, PickleWriter
+from studio.app.common.core.workflow.workflow_status_journal import (
+    WorkflowStatusJournal,
+)
 from studio.app.common.schemas.workflow import WorkflowPIDFileData
 from studio.app.const import DATE_FORMAT
 from studio.app.dir_path import DIRPATH
 from studio.app.optinist.core.nwb.nwb_creater import (
     merge_nwbfile,
-    overwrite_nwbfile,
     save_nwb,
+    update_nwbfile,
 )
 from studio.app.wrappers import wrapper_dict
 
@@ -35,15 +37,15 @@ class Runner:
     RUN_PROCESS_PID_FILE = "pid.json"
 
     @classmethod
-    def run(cls, __rule: Rule, last_output, run_script_path: str):
+    def run(cls, __rule: Rule, last_output, run_script_path: str, pid: int = None):
         try:
             logger.info("start rule runner")
 
             # write pid file
             workflow_dirpath = str(Path(__rule.output).parent.parent)
-            cls.write_pid_file(workflow_dirpath, run_script_path)
+            cls.write_pid_file(workflow_dirpath, run_script_path, pid)
 
-            input_info = cls.read_input_info(__rule.input)
+            input_info = cls.read_input_info(__rule.input, __rule.return_arg)
             cls.__change_dict_key_exist(input_info, __rule)
             nwbfile = input_info["nwbfile"]
 
@@ -84,6 +86,9 @@ class Runner:
                 path = join_filepath([path, "whole.nwb"])
                 cls.save_all_nwb(path, output_info["nwbfile"])
 
+            # notify the node completion
+            WorkflowStatusJournal.write_success(__rule.output, output_info)
+
             logger.info("rule output: %s", __rule.output)
 
             del input_info, output_info
@@ -96,6 +101,7 @@ class Runner:
 
             # save error info to node pickle data.
             PickleWriter.write_error(__rule.output, e)
+            WorkflowStatusJournal.write_error(__rule.output, e)
 
     @classmethod
     def __get_pid_file_path(cls, workspace_id: str, unique_id: str) -> str:
@@ -110,12 +116,14 @@ class Runner:
         return pid_file_path
 
     @classmethod
-    def write_pid_file(cls, workflow_dirpath: str, run_script_path: str) -> None:
+    def write_pid_file(
+        cls, workflow_dirpath: str, run_script_path: str, pid: int = None
+    ) -> None:
         """
         save snakemake script file path and PID of current running algo function
         """
         pid_data = WorkflowPIDFileData(
-            last_pid=os.getpid(),
+            last_pid=pid if pid is not None else os.getpid(),
             last_script_file=run_script_path,
             create_time=time.time(),
         )
@@ -174,19 +182,15 @@ class Runner:
         timeout = 30  # ロック取得のタイムアウト時間（秒）
         with FileLock(lock_path, timeout=timeout):
             # ロックが取得できたら、ファイルに書き込みを行う
-            if os.path.exists(save_path):
-                overwrite_nwbfile(save_path, nwbconfig)
-            else:
-                save_nwb(save_path, input_nwbfile, nwbconfig)
+            # (only the entries not yet written are appended)
+            update_nwbfile(save_path, input_nwbfile, nwbconfig)
 
     @classmethod
     def __execute_function(cls, path, params, nwb_params, output_dir, input_info):
         wrapper = cls.__dict2leaf(wrapper_dict, path.split("/"))
-        func = copy.deepcopy(wrapper["function"])
-        output_info = func(
+        output_info = wrapper["function"](
             params=params, nwbfile=nwb_params, output_dir=output_dir, **input_info
         )
-        del func
         gc.collect()
 
         return output_info
@@ -198,10 +202,14 @@ class Runner:
                 input_info[arg_name] = input_info.pop(return_name)
 
     @classmethod
-    def read_input_info(cls, input_files):
+    def read_input_info(cls, input_files, return_arg: dict = None):
         input_info = {}
         for filepath in input_files:
-            load_data = PickleReader.read(filepath)
+            if return_arg is None:
+                load_data = PickleReader.read(filepath)
+            else:
+                # load only the results consumed by this rule
+                load_data = PickleReader.read_keys(filepath, return_arg.keys())
 
             # validate load_data content
             assert PickleReader.check_is_valid_node_pickle(
@@ -1,6 +1,9 @@
-import json
 import os
+from dataclasses import asdict, fields
 
+from pydantic import parse_obj_as
+
+from studio.app.common.core.utils.json_serializer import JsonSerializer
 from studio.app.common.schemas.outputs import (
     JsonTimeSeriesData,
     OutputData,
@@ -23,15 +26,12 @@ class Reader:
 class JsonReader:
     @classmethod
     def read(cls, filepath):
-        with open(filepath, "r") as f:
-            json_data = json.load(f)
-        return json_data
+        return JsonSerializer.read(filepath)
 
     @classmethod
     def read_as_output(cls, filepath) -> OutputData:
         json_data = cls.read(filepath)
-        plot_metadata_path = f"{os.path.splitext(filepath)[0]}.plot-meta.json"
-        plot_metadata = cls.read_as_plot_meta(plot_metadata_path)
+        plot_metadata = cls.read_as_plot_meta(cls.get_plot_meta_path(filepath))
 
         return OutputData(
             data=json_data["data"],
@@ -40,6 +40,30 @@ class JsonReader:
             meta=plot_metadata,
         )
 
+    @classmethod
+    def read_as_output_bytes(cls, filepath) -> bytes:
+        """
+        The JSON of `read_as_output`, validated by OutputData as the routes do
+        (e.g. columns and index as str), serialized without the response model.
+        """
+        output = cls.read_as_output(filepath)
+        output = parse_obj_as(OutputData, cls.__as_shallow_dict(output))
+        return JsonSerializer.dumps(cls.__as_shallow_dict(output))
+
+    @classmethod
+    def __as_shallow_dict(cls, output: OutputData) -> dict:
+        # without the deep copy of asdict (the data can be large)
+        output_dict = {
+            field.name: getattr(output, field.name) for field in fields(output)
+        }
+        if output.meta is not None:
+            output_dict["meta"] = asdict(output.meta)
+        return output_dict
+
+    @classmethod
+    def get_plot_meta_path(cls, filepath) -> str:
+        return f"{os.path.splitext(filepath)[0]}.plot-meta.json"
+
     @classmethod
     def read_as_timeseries(cls, filepath) -> JsonTimeSeriesData:
         json_data = cls.read(filepath)
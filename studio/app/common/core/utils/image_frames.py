@@ -0,0 +1,247 @@
+"""
+Binary frame ranges of TIFF images for the image viewer
+
+Instead of converting the frames to JSON (`save_tiff2json`), the frames are
+served as the raw (t, y, x) array in C order and little endian, gzip-compressed.
+Only the pages of the requested range are read (or memory-mapped).
+The frames are cast to the dtypes readable by the client (`FRAMES_DTYPES`),
+and may be spatially downsampled (block mean) and quantised to uint8/uint16
+over their (finite) value range.
+
+The encoded frames are cached on disk next to the image, keyed by the ETag,
+which identifies the image file (path, size, mtime) and the request parameters.
+"""
+import gzip
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from studio.app.common.core.utils.filepath_creater import (
+    create_directory,
+    join_filepath,
+)
+from studio.app.common.dataclass.image import ImageData
+
+
+@dataclass
+class ImageFramesMeta:
+    shape: List[int]
+    dtype: str
+    vmin: float
+    vmax: float
+    etag: str
+
+
+class ImageFrames:
+    QUANTIZE_DTYPES = ["uint8", "uint16"]
+
+    # dtypes of the typed arrays of the client (FRAMES_ARRAY_TYPES in Outputs.ts)
+    FRAMES_DTYPES = [
+        "uint8",
+        "int8",
+        "uint16",
+        "int16",
+        "uint32",
+        "int32",
+        "float32",
+        "float64",
+    ]
+
+    CACHE_DIRNAME = "frames"
+    MAX_CACHE_NBYTES = 256 * 1024 * 1024  # per image
+    COMPRESS_LEVEL = 1
+
+    @classmethod
+    def get_etag(
+        cls,
+        filepath: str,
+        start: int,
+        stop: int,
+        downsample: int = 1,
+        dtype: Optional[str] = None,
+    ) -> str:
+        stat = os.stat(filepath)
+        key = [filepath, stat.st_size, stat.st_mtime_ns, start, stop, downsample, dtype]
+        return hashlib.md5(json.dumps(key).encode()).hexdigest()
+
+    @classmethod
+    def read(
+        cls,
+        filepath: str,
+        start: int,
+        stop: int,
+        downsample: int = 1,
+        dtype: Optional[str] = None,
+    ) -> Tuple[ImageFramesMeta, bytes]:
+        """
+        Frames [start, stop) of the image, as the meta data and
+        the gzip-compressed array.
+        """
+        etag = cls.get_etag(filepath, start, stop, downsample, dtype)
+        cache_dirpath = cls.__get_cache_dirpath(filepath)
+        meta_path = join_filepath([cache_dirpath, f"{etag}.json"])
+        data_path = join_filepath([cache_dirpath, f"{etag}.bin.gz"])
+
+        if os.path.exists(meta_path) and os.path.exists(data_path):
+            with open(meta_path) as f:
+                meta = ImageFramesMeta(**json.load(f))
+            with open(data_path, "rb") as f:
+                data = f.read()
+            # keep recently used entries in the cache
+            os.utime(meta_path)
+            return meta, data
+
+        frames = cls.read_frames(filepath, start, stop)
+        frames = cls.cast(frames)
+        frames = cls.downsample(frames, downsample)
+        frames, vmin, vmax = cls.quantize(frames, dtype)
+        frames = frames.astype(frames.dtype.newbyteorder("<"), copy=False)
+
+        meta = ImageFramesMeta(
+            shape=list(frames.shape),
+            dtype=frames.dtype.str,
+            vmin=vmin,
+            vmax=vmax,
+            etag=etag,
+        )
+        data = gzip.compress(
+            np.ascontiguousarray(frames).tobytes(), compresslevel=cls.COMPRESS_LEVEL
+        )
+
+        cls.__write_cache(cache_dirpath, meta, data)
+
+        return meta, data
+
+    @classmethod
+    def cast(cls, frames: np.ndarray) -> np.ndarray:
+        """
+        Cast the frames of the dtypes not readable by the client.
+        """
+        if frames.dtype.name in cls.FRAMES_DTYPES:
+            return frames
+        elif frames.dtype == np.bool_:
+            return frames.astype(np.uint8)
+        elif frames.dtype == np.float16:
+            return frames.astype(np.float32)
+        else:
+            # (u)int64 etc.
+            return frames.astype(np.float64)
+
+    @staticmethod
+    def downsample(frames: np.ndarray, factor: int) -> np.ndarray:
+        """
+        Block mean of (factor x factor) pixels, keeping the dtype.
+        """
+        if factor <= 1:
+            return frames
+
+        t, height, width = frames.shape
+        height, width = height // factor * factor, width // factor * factor
+        blocks = frames[:, :height, :width].reshape(
+            t, height // factor, factor, width // factor, factor
+        )
+        means = blocks.mean(axis=(2, 4))
+        if np.issubdtype(frames.dtype, np.integer):
+            means = np.rint(means)
+        return means.astype(frames.dtype)
+
+    @classmethod
+    def quantize(cls, frames: np.ndarray, dtype: Optional[str]):
+        """
+        Scale the frames linearly from [vmin, vmax] to the range of dtype.
+        """
+        vmin, vmax = cls.get_value_range(frames)
+        if dtype is None:
+            return frames, vmin, vmax
+
+        assert dtype in cls.QUANTIZE_DTYPES, f"Invalid dtype: {dtype}"
+        dtype_max = np.iinfo(dtype).max
+        scale = dtype_max / (vmax - vmin) if vmax > vmin else 0.0
+
+        quantized = np.empty(frames.shape, dtype=dtype)
+        for i, frame in enumerate(frames):
+            values = np.rint((frame.astype(np.float32) - vmin) * scale)
+            # NaN to the minimum, and infinities to the ends of the range
+            values = np.nan_to_num(values, nan=0, posinf=dtype_max, neginf=0)
+            quantized[i] = np.clip(values, 0, dtype_max)
+        return quantized, vmin, vmax
+
+    @staticmethod
+    def get_value_range(frames: np.ndarray) -> Tuple[float, float]:
+        """
+        Range of the finite values, (0, 0) if there are none.
+        """
+        if np.issubdtype(frames.dtype, np.floating):
+            finite = np.isfinite(frames)
+            if not finite.any():
+                return 0.0, 0.0
+            return (
+                float(np.min(frames, where=finite, initial=np.inf)),
+                float(np.max(frames, where=finite, initial=-np.inf)),
+            )
+
+        if frames.size == 0:
+            return 0.0, 0.0
+        return float(np.min(frames)), float(np.max(frames))
+
+    @staticmethod
+    def read_frames(filepath: str, start: int, stop: int) -> np.ndarray:
+        """
+        Read frames [start, stop) of the image, reading only their pages.
+        """
+        image = ImageData(filepath)
+        if image.ndim == 2:
+            return image.data[np.newaxis][start:stop]
+        return image.frames(start, stop)
+
+    @classmethod
+    def __get_cache_dirpath(cls, filepath: str) -> str:
+        filename, _ = os.path.splitext(os.path.basename(filepath))
+        return join_filepath([os.path.dirname(filepath), filename, cls.CACHE_DIRNAME])
+
+    @classmethod
+    def __write_cache(cls, cache_dirpath: str, meta: ImageFramesMeta, data: bytes):
+        create_directory(cache_dirpath)
+        cls.__evict_cache(cache_dirpath, len(data))
+
+        # the meta is written last, as the entry is valid only with it
+        data_path = join_filepath([cache_dirpath, f"{meta.etag}.bin.gz"])
+        with open(f"{data_path}.tmp", "wb") as f:
+            f.write(data)
+        os.replace(f"{data_path}.tmp", data_path)
+
+        meta_path = join_filepath([cache_dirpath, f"{meta.etag}.json"])
+        with open(f"{meta_path}.tmp", "w") as f:
+            json.dump(asdict(meta), f)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+    @classmethod
+    def __evict_cache(cls, cache_dirpath: str, new_nbytes: int):
+        entries = []
+        for filename in os.listdir(cache_dirpath):
+            if not filename.endswith(".json"):
+                continue
+            etag = filename[: -len(".json")]
+            meta_path = join_filepath([cache_dirpath, filename])
+            data_path = join_filepath([cache_dirpath, f"{etag}.bin.gz"])
+            try:
+                nbytes = os.path.getsize(data_path)
+                entries.append(
+                    (os.path.getmtime(meta_path), meta_path, data_path, nbytes)
+                )
+            except OSError:
+                continue
+
+        # remove the least recently used entries
+        total_nbytes = sum(entry[3] for entry in entries) + new_nbytes
+        for _, meta_path, data_path, nbytes in sorted(entries):
+            if total_nbytes <= cls.MAX_CACHE_NBYTES:
+                break
+            for path in [meta_path, data_path]:
+                if os.path.exists(path):
+                    os.remove(path)
+            total_nbytes -= nbytes
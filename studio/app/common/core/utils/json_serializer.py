@@ -0,0 +1,182 @@
+"""
+Serialization of the JSON outputs
+
+JsonSerializer writes the outputs as compact JSON (without indentation),
+with orjson if it is installed, and pandas (ujson based) otherwise.
+NaN is written as null by both, the same as the former pandas output.
+
+JsonCompression keeps the precompressed JSON (gzip, and br if brotli is
+installed) in the cache directory, so that large outputs are compressed once,
+and served with Content-Encoding on the following requests.
+"""
+import gzip
+import hashlib
+import json
+import os
+import time
+from typing import Callable, List, Optional, Tuple
+
+import pandas as pd
+
+try:
+    import orjson
+except ModuleNotFoundError:
+    orjson = None
+
+try:
+    import brotli
+except ModuleNotFoundError:
+    brotli = None
+
+from studio.app.common.core.utils.filepath_creater import (
+    create_directory,
+    join_filepath,
+)
+from studio.app.dir_path import DIRPATH
+
+
+class JsonSerializer:
+    @classmethod
+    def dumps(cls, obj) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    @classmethod
+    def loads(cls, data: bytes):
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
+
+    @classmethod
+    def dumps_frame(cls, df: pd.DataFrame, orient: str = "columns") -> bytes:
+        """
+        DataFrame as the same JSON as `df.to_json(orient=orient)`.
+        """
+        if orjson is not None and orient == "split":
+            values = df.to_numpy()
+            split = {
+                "columns": df.columns.tolist(),
+                "index": df.index.tolist(),
+                # numeric arrays are serialized natively, NaN as null
+                "data": values.tolist() if values.dtype == object else values,
+            }
+            try:
+                return orjson.dumps(
+                    split,
+                    option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+                )
+            except orjson.JSONEncodeError:
+                # e.g. non-contiguous arrays or unsupported types of values
+                pass
+
+        return df.to_json(orient=orient).encode()
+
+    @classmethod
+    def read(cls, filepath: str):
+        with open(filepath, "rb") as f:
+            return cls.loads(f.read())
+
+    @classmethod
+    def write(cls, filepath: str, data: bytes):
+        with open(filepath, "wb") as f:
+            f.write(data)
+
+
+class JsonCompression:
+    # preferred first
+    ENCODINGS = [
+        ("br", ".br", brotli.compress if brotli is not None else None),
+        ("gzip", ".gz", lambda data: gzip.compress(data, compresslevel=6)),
+    ]
+    MIN_NBYTES = 1024
+
+    CACHE_DIRPATH = join_filepath([DIRPATH.CACHE_DIR, "json"])
+    MAX_CACHE_NBYTES = 1024 * 1024 * 1024
+
+    @classmethod
+    def select_encoding(cls, accept_encoding: str) -> Optional[tuple]:
+        accepted = [e.split(";")[0].strip() for e in accept_encoding.split(",")]
+        for encoding in cls.ENCODINGS:
+            name, _, compress = encoding
+            if compress is not None and name in accepted:
+                return encoding
+        return None
+
+    @classmethod
+    def encode(
+        cls,
+        filepath: str,
+        source_paths: List[str],
+        build: Callable[[], bytes],
+        accept_encoding: str,
+    ) -> Tuple[bytes, Optional[str]]:
+        """
+        The JSON built from the source files (by `build`), compressed with
+        the encoding accepted by the client, as (content, encoding name).
+
+        The compressed content is kept in the cache directory (not beside
+        filepath), which is valid while it is newer than the source files.
+        """
+        encoding = cls.select_encoding(accept_encoding)
+        if encoding is None:
+            return build(), None
+
+        name, ext, compress = encoding
+        compressed_path = cls.get_cache_path(filepath, ext)
+        source_mtime = max(
+            (os.path.getmtime(p) for p in source_paths if os.path.exists(p)),
+            default=0,
+        )
+        try:
+            cache_mtime = os.path.getmtime(compressed_path)
+            if cache_mtime > source_mtime:
+                with open(compressed_path, "rb") as f:
+                    content = f.read()
+                # the access time of the entry is its last use (the mtime is kept)
+                os.utime(compressed_path, (time.time(), cache_mtime))
+                return content, name
+        except OSError:
+            # not cached yet, or evicted meanwhile
+            pass
+
+        content = build()
+        if len(content) < cls.MIN_NBYTES:
+            return content, None
+
+        content = compress(content)
+        create_directory(cls.CACHE_DIRPATH)
+        cls.__evict_cache(len(content))
+
+        tmp_path = f"{compressed_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, compressed_path)
+
+        return content, name
+
+    @classmethod
+    def get_cache_path(cls, filepath: str, ext: str) -> str:
+        key = hashlib.md5(os.path.abspath(filepath).encode()).hexdigest()
+        return join_filepath([cls.CACHE_DIRPATH, f"{key}.json{ext}"])
+
+    @classmethod
+    def __evict_cache(cls, new_nbytes: int):
+        entries = []
+        for filename in os.listdir(cls.CACHE_DIRPATH):
+            if filename.endswith(".tmp"):
+                continue
+            path = join_filepath([cls.CACHE_DIRPATH, filename])
+            try:
+                entries.append((os.path.getatime(path), path, os.path.getsize(path)))
+            except OSError:
+                continue
+
+        # remove the least recently used entries
+        total_nbytes = sum(entry[2] for entry in entries) + new_nbytes
+        for _, path, nbytes in sorted(entries):
+            if total_nbytes <= cls.MAX_CACHE_NBYTES:
+                break
+            if os.path.exists(path):
+                os.remove(path)
+            total_nbytes -= nbytes
@@ -2,25 +2,26 @@ import json
 import os
 from typing import Optional
 
-import numpy as np
 import pandas as pd
-import tifffile
 
 from studio.app.common.core.utils.filepath_creater import (
     create_directory,
     join_filepath,
 )
+from studio.app.common.core.utils.json_serializer import JsonSerializer
 from studio.app.common.schemas.outputs import PlotMetaData
 
 
 class JsonWriter:
     @classmethod
     def write(cls, filepath, data):
-        pd.DataFrame(data).to_json(filepath, indent=4)
+        JsonSerializer.write(filepath, JsonSerializer.dumps_frame(pd.DataFrame(data)))
 
     @classmethod
     def write_as_split(cls, filepath, data):
-        pd.DataFrame(data).to_json(filepath, indent=4, orient="split")
+        JsonSerializer.write(
+            filepath, JsonSerializer.dumps_frame(pd.DataFrame(data), orient="split")
+        )
 
     @classmethod
     def write_plot_meta(cls, dir_name, file_name, data: Optional[PlotMetaData]):
@@ -31,20 +32,11 @@ class JsonWriter:
 
 
 def save_tiff2json(tiff_filepath, save_dirpath, start_index=None, end_index=None):
-    # Tiff画像を読み込む
-    tiffs = []
-    image = tifffile.imread(tiff_filepath)
-    if image.ndim == 2:
-        image = image[np.newaxis, :, :]
+    from studio.app.common.core.utils.image_frames import ImageFrames
 
-    for i, page in enumerate(image):
-        if i < start_index - 1:
-            continue
-
-        if i >= end_index:
-            break
-
-        tiffs.append(page.tolist())
+    # Tiff画像を読み込む (only the pages of the range)
+    image = ImageFrames.read_frames(tiff_filepath, max(start_index - 1, 0), end_index)
+    tiffs = [page.tolist() for page in image]
 
     filename, _ = os.path.splitext(os.path.basename(tiff_filepath))
     create_directory(save_dirpath)
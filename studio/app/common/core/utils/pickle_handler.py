@@ -1,5 +1,9 @@
+import os
 import pickle
 import traceback
+import uuid
+
+import numpy as np
 
 from studio.app.common.core.utils.filepath_creater import (
     create_directory,
@@ -7,11 +11,126 @@ from studio.app.common.core.utils.filepath_creater import (
 )
 
 
+class NodeArrayStore:
+    """
+    Sidecar store for the large arrays contained in node result pickles.
+
+    Arrays whose size exceeds `MIN_NBYTES` are written as individual .npy files
+    next to the pickle, and only a reference to them is stored in the pickle.
+    The pickle itself thus stays small (a metadata index of the node result),
+    and the arrays are memory-mapped lazily when the pickle is read.
+    """
+
+    DIR_SUFFIX = ".arrays"
+    MIN_NBYTES = 1024 * 1024
+    PID_NDARRAY = "ndarray"
+
+    @classmethod
+    def get_dirpath(cls, pickle_path: str) -> str:
+        return os.path.splitext(pickle_path)[0] + cls.DIR_SUFFIX
+
+    @classmethod
+    def is_target(cls, obj) -> bool:
+        return (
+            isinstance(obj, np.ndarray)
+            and not obj.dtype.hasobject
+            and obj.nbytes >= cls.MIN_NBYTES
+        )
+
+    @classmethod
+    def cleanup(cls, pickle_path: str, keep_files: set = None):
+        """
+        Remove sidecar files that are no longer referenced by the pickle.
+        """
+        dirpath = cls.get_dirpath(pickle_path)
+        if not os.path.isdir(dirpath):
+            return
+
+        keep_files = keep_files or set()
+        for filename in os.listdir(dirpath):
+            if filename in keep_files:
+                continue
+            try:
+                os.remove(join_filepath([dirpath, filename]))
+            except OSError:
+                # the file may still be mapped by another reader (on Windows)
+                pass
+
+        if not os.listdir(dirpath):
+            os.rmdir(dirpath)
+
+
+class _NodePickler(pickle.Pickler):
+    def __init__(self, file, dirpath: str):
+        super().__init__(file)
+        self.dirpath = dirpath
+        self.saved_arrays = {}
+
+    @property
+    def saved_files(self) -> set:
+        return {filename for _, filename in self.saved_arrays.values()}
+
+    def persistent_id(self, obj):
+        if not NodeArrayStore.is_target(obj):
+            return None
+
+        # the same array object may be referenced from several places
+        # (e.g. from both the output and the nwbfile dict)
+        if id(obj) not in self.saved_arrays:
+            create_directory(self.dirpath)
+            filename = f"{uuid.uuid4().hex}.npy"
+            np.save(join_filepath([self.dirpath, filename]), obj)
+            # keep a reference to obj, so that its id is not reused while dumping
+            self.saved_arrays[id(obj)] = (obj, filename)
+
+        _, filename = self.saved_arrays[id(obj)]
+        return (NodeArrayStore.PID_NDARRAY, filename)
+
+
+class _NodeUnpickler(pickle.Unpickler):
+    def __init__(self, file, dirpath: str):
+        super().__init__(file)
+        self.dirpath = dirpath
+        self.loaded_arrays = {}
+
+    def persistent_load(self, pid):
+        kind, filename = pid
+        if kind != NodeArrayStore.PID_NDARRAY:
+            raise pickle.UnpicklingError(f"Unsupported persistent id: {kind}")
+
+        # copy-on-write mapping: the data is paged in only when accessed,
+        # and in-place modifications by the caller never reach the file.
+        if filename not in self.loaded_arrays:
+            self.loaded_arrays[filename] = np.load(
+                join_filepath([self.dirpath, filename]), mmap_mode="c"
+            )
+
+        return self.loaded_arrays[filename]
+
+
 class PickleReader:
     @classmethod
     def read(cls, filepath):
         with open(filepath, "rb") as f:
-            return pickle.load(f)
+            return _NodeUnpickler(f, NodeArrayStore.get_dirpath(filepath)).load()
+
+    @classmethod
+    def read_keys(cls, filepath, keys):
+        """
+        Read node result pickle, keeping only the specified keys
+        (and "nwbfile") of the result dict.
+
+        Since large arrays are memory-mapped lazily,
+        the arrays of dropped keys are never loaded.
+        """
+        data = cls.read(filepath)
+
+        if cls.check_is_valid_node_pickle(data):
+            for key in list(data):
+                if key != "nwbfile" and key not in keys:
+                    data.pop(key)
+
+        return data
 
     @staticmethod
     def check_is_valid_node_pickle(data):
@@ -40,8 +159,17 @@ class PickleWriter:
         # ファイル保存先
         dirpath = join_filepath(pickle_path.split("/")[:-1])
         create_directory(dirpath)
-        with open(pickle_path, "wb") as f:
-            pickle.dump(info, f)
+
+        # Write to a temporary file first, so that the arrays referenced by
+        # the existing pickle (possibly memory-mapped in `info`) remain valid
+        # until the new pickle is complete.
+        tmp_pickle_path = f"{pickle_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_pickle_path, "wb") as f:
+            pickler = _NodePickler(f, NodeArrayStore.get_dirpath(pickle_path))
+            pickler.dump(info)
+        os.replace(tmp_pickle_path, pickle_path)
+
+        NodeArrayStore.cleanup(pickle_path, pickler.saved_files)
 
     @classmethod
     def write_error(cls, pickle_path, err: Exception):
@@ -51,11 +179,9 @@ class PickleWriter:
 
     @classmethod
     def overwrite(cls, pickle_path, info):
-        with open(pickle_path, "rb") as f:
-            old_pkl = pickle.load(f)
+        old_pkl = PickleReader.read(pickle_path)
 
         if isinstance(old_pkl, dict) and isinstance(info, dict):
             old_pkl.update(info)
 
-            with open(pickle_path, "wb") as f:
-                pickle.dump(old_pkl, f)
+            cls.write(pickle_path, old_pkl)
@@ -0,0 +1,110 @@
+"""
+Rolling percentile of timeseries
+
+The percentile of each sliding window of the timeseries, the same as
+`np.percentile(sliding_window_view(data, window, axis), q, axis=-1)`,
+without a percentile (copy and partition of the window) for every sample:
+
+- The windows are rolled with an order statistics skiplist (pandas rolling
+  quantile, O(log window) per sample), where the percentile method is
+  an interpolation between 2 order statistics ("linear", "hazen", ...).
+- Otherwise, np.percentile of the sliding windows, in chunks of windows.
+
+The cells (the other axes) are processed in chunks,
+in parallel if workers > 1.
+"""
+from typing import Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    import pandas as pd
+except ModuleNotFoundError:
+    pd = None
+
+CHUNK_NBYTES = 64 * 1024**2
+
+# position (0-origin, before clipping) of the percentile q (0 - 1)
+# in n sorted values, by the methods of np.percentile
+POSITIONS = {
+    "linear": lambda q, n: q * (n - 1),
+    "hazen": lambda q, n: q * n - 0.5,
+    "weibull": lambda q, n: q * (n + 1) - 1,
+    "median_unbiased": lambda q, n: q * (n + 1 / 3) - 2 / 3,
+    "normal_unbiased": lambda q, n: q * (n + 1 / 4) - 5 / 8,
+}
+
+
+def rolling_percentile(
+    data: np.ndarray,
+    window: int,
+    q: float,
+    axis: int = -1,
+    method: str = "linear",
+    workers: int = 1,
+) -> np.ndarray:
+    """
+    Percentile q (0 - 100) of the windows of data along axis, for the
+    (length - window + 1) windows within data (the caller pads the edges).
+    """
+    data = np.moveaxis(np.asarray(data, dtype=float), axis, -1)
+    shape = data.shape
+    rows = data.reshape(-1, shape[-1])
+
+    nwindows = max(shape[-1] - window + 1, 0)
+    if nwindows == 0 or len(rows) == 0:
+        return np.moveaxis(np.empty((*shape[:-1], nwindows)), -1, axis)
+
+    chunk_rows = max(CHUNK_NBYTES // (shape[-1] * 8 * 4), 1)
+    if workers > 1:
+        chunk_rows = min(chunk_rows, -(-len(rows) // workers))
+    tasks = [
+        (rows[i : i + chunk_rows], window, q, method)
+        for i in range(0, len(rows), chunk_rows)
+    ]
+
+    if workers > 1 and len(tasks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(rolling_percentile_rows, *zip(*tasks)))
+    else:
+        results = [rolling_percentile_rows(*task) for task in tasks]
+
+    percentiled = np.concatenate(results).reshape(*shape[:-1], nwindows)
+    return np.moveaxis(percentiled, -1, axis)
+
+
+def rolling_percentile_rows(
+    rows: np.ndarray, window: int, q: float, method: str = "linear"
+) -> np.ndarray:
+    """
+    Rolling percentile of each row of rows (rows x samples).
+    """
+    quantile = get_rolling_quantile(window, q, method)
+    if quantile is not None:
+        rolled = pd.DataFrame(rows.T).rolling(window).quantile(quantile)
+        return rolled.to_numpy().T[:, window - 1 :]
+
+    nwindows = rows.shape[1] - window + 1
+    percentiled = np.empty((len(rows), nwindows))
+    chunk_windows = max(CHUNK_NBYTES // (len(rows) * window * 8), 1)
+    for start in range(0, nwindows, chunk_windows):
+        stop = min(start + chunk_windows, nwindows)
+        windows = sliding_window_view(rows[:, start : stop + window - 1], window, -1)
+        percentiled[:, start:stop] = np.percentile(windows, q, axis=-1, method=method)
+    return percentiled
+
+
+def get_rolling_quantile(window: int, q: float, method: str) -> Optional[float]:
+    """
+    The quantile of the linear interpolation in the window
+    (pandas rolling quantile), equivalent to the percentile q by the method,
+    or None if not available.
+    """
+    if pd is None or method not in POSITIONS or window < 2:
+        return None
+
+    position = np.clip(POSITIONS[method](q / 100, window), 0, window - 1)
+    return float(position / (window - 1))
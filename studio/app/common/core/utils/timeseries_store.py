@@ -0,0 +1,224 @@
+"""
+Columnar storage of the timeseries of a node
+
+The timeseries of all cells are stored as a few .npy files in the timeseries
+directory, instead of a JSON file per cell:
+
+- data.npy: (cells, frames) values
+- std.npy, sem.npy: (cells, frames) optional error columns
+- index.npy: (frames,) x values
+- cell_numbers.npy: (cells,) cell numbers
+
+The arrays are memory-mapped when read, so that a subset of cells and
+a window of frames are read without loading the whole timeseries.
+"""
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from studio.app.common.core.utils.filepath_creater import join_filepath
+
+
+class TimeSeriesStore:
+    DATA = "data"
+    STD = "std"
+    SEM = "sem"
+    INDEX = "index"
+    CELL_NUMBERS = "cell_numbers"
+
+    MINMAX = "minmax"
+    LTTB = "lttb"
+
+    def __init__(self, dirpath: str):
+        self.dirpath = dirpath
+
+    @classmethod
+    def exists(cls, dirpath: str) -> bool:
+        return os.path.exists(cls.__get_path(dirpath, cls.DATA))
+
+    @classmethod
+    def write(
+        cls,
+        dirpath: str,
+        data: np.ndarray,
+        index,
+        cell_numbers,
+        std: Optional[np.ndarray] = None,
+        sem: Optional[np.ndarray] = None,
+    ):
+        columns = {
+            cls.DATA: data,
+            cls.STD: std,
+            cls.SEM: sem,
+            cls.INDEX: index,
+            cls.CELL_NUMBERS: cell_numbers,
+        }
+        for name, value in columns.items():
+            if value is not None:
+                np.save(cls.__get_path(dirpath, name), np.asarray(value))
+
+    def read_column(self, name: str) -> Optional[np.ndarray]:
+        path = self.__get_path(self.dirpath, name)
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode="r")
+
+    @property
+    def cell_numbers(self) -> np.ndarray:
+        return self.read_column(self.CELL_NUMBERS)
+
+    @property
+    def xrange(self) -> List[str]:
+        return self.format_index(self.read_column(self.INDEX))
+
+    def get_cell_positions(self, cells=None) -> np.ndarray:
+        cell_numbers = self.cell_numbers
+        if cells is None:
+            return np.arange(len(cell_numbers))
+
+        positions = {str(cell): i for i, cell in enumerate(cell_numbers)}
+        return np.array(
+            [positions[str(cell)] for cell in cells if str(cell) in positions],
+            dtype=int,
+        )
+
+    def read(
+        self,
+        cells=None,
+        start: Optional[int] = None,
+        stop: Optional[int] = None,
+        max_points: Optional[int] = None,
+        method: str = MINMAX,
+    ) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """
+        Read the timeseries of cells (all cells if None) in frames [start, stop),
+        decimated to max_points per cell if given.
+
+        Returns {column: {cell number: {x: value}}} of data (and std if stored),
+        and the x values of the points read (of any cell) as the index column.
+        """
+        positions = self.get_cell_positions(cells)
+        cell_keys = [str(cell) for cell in self.cell_numbers[positions]]
+        window = slice(start, stop)
+        index = self.read_column(self.INDEX)[window]
+        xrange = np.array(self.format_index(index))
+
+        data = np.asarray(self.read_column(self.DATA)[positions, window])
+        std = self.read_column(self.STD)
+        std = np.asarray(std[positions, window]) if std is not None else None
+
+        if max_points is not None and max_points < data.shape[1]:
+            x = (
+                index.astype(float)
+                if np.issubdtype(index.dtype, np.number)
+                else np.arange(len(index), dtype=float)
+            )
+            selected = self.decimate(x, data, max_points, method)
+            data = np.take_along_axis(data, selected, axis=1)
+            std = np.take_along_axis(std, selected, axis=1) if std is not None else None
+            xranges = xrange[selected]
+            xrange = xrange[np.unique(selected)]
+        else:
+            xranges = np.broadcast_to(xrange, data.shape)
+
+        result = {
+            self.DATA: self.__to_dict(cell_keys, xranges, data),
+            self.INDEX: xrange.tolist(),
+        }
+        if std is not None:
+            result[self.STD] = self.__to_dict(cell_keys, xranges, std)
+        return result
+
+    @classmethod
+    def decimate(
+        cls, x: np.ndarray, y: np.ndarray, max_points: int, method: str = MINMAX
+    ) -> np.ndarray:
+        """
+        Positions (cells, points) of the points kept for each cell.
+        """
+        if method == cls.LTTB:
+            return cls.lttb(x, y, max_points)
+        elif method == cls.MINMAX:
+            return cls.minmax(y, max_points)
+        else:
+            assert False, f"Invalid decimation method: {method}"
+
+    @staticmethod
+    def minmax(y: np.ndarray, max_points: int) -> np.ndarray:
+        """
+        Keep the minimum and maximum of each of (max_points / 2) buckets.
+        """
+        n_buckets = max(max_points // 2, 1)
+        edges = np.linspace(0, y.shape[1], n_buckets + 1).astype(int)
+
+        selected = np.empty((len(y), 2 * n_buckets), dtype=int)
+        for i, (start, stop) in enumerate(zip(edges[:-1], edges[1:])):
+            bucket = y[:, start:stop].astype(float)
+            is_nan = np.isnan(bucket)
+            argmin = start + np.argmin(np.where(is_nan, np.inf, bucket), axis=1)
+            argmax = start + np.argmax(np.where(is_nan, -np.inf, bucket), axis=1)
+            selected[:, 2 * i] = np.minimum(argmin, argmax)
+            selected[:, 2 * i + 1] = np.maximum(argmin, argmax)
+
+        return selected
+
+    @staticmethod
+    def lttb(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+        """
+        Largest-Triangle-Three-Buckets downsampling, for all cells at once.
+        """
+        n_cells, n_points = y.shape
+        if max_points < 3:
+            return np.broadcast_to(
+                np.linspace(0, n_points - 1, max_points).astype(int),
+                (n_cells, max_points),
+            ).copy()
+
+        # buckets of the points between the first and the last ones
+        edges = np.linspace(1, n_points - 1, max_points - 1).astype(int)
+        y = np.nan_to_num(y.astype(float))
+        cells = np.arange(n_cells)
+
+        selected = np.empty((n_cells, max_points), dtype=int)
+        selected[:, 0] = 0
+        selected[:, -1] = n_points - 1
+
+        # the next bucket of the last one is the last point
+        edges = np.append(edges, n_points)
+
+        for i in range(max_points - 2):
+            start, stop, next_stop = edges[i], edges[i + 1], edges[i + 2]
+            x_next = x[stop:next_stop].mean()
+            y_next = y[:, stop:next_stop].mean(axis=1)
+
+            # the point forming the largest triangle with the previous point
+            # and the average of the next bucket
+            prev = selected[:, i]
+            x_prev, y_prev = x[prev][:, np.newaxis], y[cells, prev][:, np.newaxis]
+            areas = np.abs(
+                (x_prev - x_next) * (y[:, start:stop] - y_prev)
+                - (x_prev - x[start:stop]) * (y_next[:, np.newaxis] - y_prev)
+            )
+            selected[:, i + 1] = start + np.argmax(areas, axis=1)
+
+        return selected
+
+    @staticmethod
+    def format_index(index: np.ndarray) -> List[str]:
+        # the same keys as the index of the JSON files written by pandas
+        return [str(x) for x in index.tolist()]
+
+    @staticmethod
+    def __to_dict(cell_keys, xranges: np.ndarray, values: np.ndarray) -> dict:
+        if np.issubdtype(values.dtype, np.floating) and np.isnan(values).any():
+            # NaN is not valid in JSON
+            values = np.where(np.isnan(values), None, values.astype(object))
+        return {
+            cell_key: dict(zip(x, v.tolist()))
+            for cell_key, x, v in zip(cell_keys, xranges, values)
+        }
+
+    @staticmethod
+    def __get_path(dirpath: str, name: str) -> str:
+        return join_filepath([dirpath, f"{name}.npy"])
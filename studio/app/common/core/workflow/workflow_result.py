@@ -18,6 +18,10 @@ from studio.app.common.core.snakemake.smk_status_logger import SmkStatusLogger
 from studio.app.common.core.utils.filepath_creater import join_filepath
 from studio.app.common.core.utils.pickle_handler import PickleReader
 from studio.app.common.core.workflow.workflow import Message, NodeRunStatus, OutputPath
+from studio.app.common.core.workflow.workflow_status_journal import (
+    NodeStatusEvent,
+    WorkflowStatusJournal,
+)
 from studio.app.common.dataclass import BaseData
 from studio.app.common.schemas.workflow import (
     WorkflowErrorInfo,
@@ -45,6 +49,7 @@ class WorkflowResult:
             [self.workflow_dirpath, DIRPATH.EXPERIMENT_YML]
         )
         self.monitor = WorkflowMonitor(workspace_id, unique_id)
+        self.journal = WorkflowStatusJournal(workspace_id, unique_id)
 
     def observe(self, nodeIdList: List[str]) -> Dict:
         """
@@ -90,6 +95,7 @@ class WorkflowResult:
         self, nodeIdList: List[str], workflow_error: WorkflowErrorInfo
     ) -> Dict[str, Message]:
         results: Dict[str, Message] = {}
+        node_events = self.journal.read_events()
 
         for node_id in nodeIdList:
             # Cases with errors in workflow
@@ -104,7 +110,12 @@ class WorkflowResult:
                 )
                 results[node_id] = node_result.observe()
 
-            # Normal case
+            # Normal case (node completion notified through the journal)
+            elif node_id in node_events:
+                results[node_id] = node_events[node_id].to_message()
+
+            # Normal case (node completion is checked by pickle file)
+            # *for nodes skipped by snakemake or workflows run before the journal
             else:
                 # search node pickle files
                 node_dirpath = join_filepath([self.workflow_dirpath, node_id])
@@ -125,11 +136,51 @@ class WorkflowResult:
 
                     self.__check_has_nwb(node_id)
 
+        # reflect only the events not yet applied to EXPERIMENT_YML
+        unapplied_events, offset = self.journal.read_unapplied_events()
+        if unapplied_events:
+            self.__apply_node_events(unapplied_events)
+            self.journal.write_applied_offset(offset)
+
         # check workflow nwb
         self.__check_has_nwb()
 
         return results
 
+    def __apply_node_events(self, node_events: Dict[str, NodeStatusEvent]):
+        """
+        Reflect the finished nodes in EXPERIMENT_YML, with a single write
+        """
+        expt_config = ExptConfigReader.read(self.expt_filepath)
+
+        for node_id, event in node_events.items():
+            message = event.to_message()
+            function = expt_config.function.get(node_id)
+            # the node has been removed from the workflow
+            if function is None:
+                continue
+
+            if NodeRunStatus.is_success(message.status):
+                function.outputPaths = message.outputPaths
+            function.success = message.status
+            function.finished_at = event.finished_at
+            function.message = message.message
+            function.hasNWB = function.hasNWB or event.has_nwb
+
+        statuses = list(map(lambda x: x.success, expt_config.function.values()))
+
+        if NodeRunStatus.RUNNING.value not in statuses:
+            expt_config.finished_at = datetime.now().strftime(DATE_FORMAT)
+            if NodeRunStatus.ERROR.value in statuses:
+                expt_config.success = NodeRunStatus.ERROR.value
+            else:
+                expt_config.success = NodeRunStatus.SUCCESS.value
+
+        # Update EXPERIMENT_YML
+        ExptConfigWriter.write_raw(
+            self.workspace_id, self.unique_id, asdict(expt_config)
+        )
+
     def __is_workflow_status_running(
         self, nodeIdList: List[str], messages: Dict[str, Message]
     ) -> bool:
@@ -161,6 +212,8 @@ class WorkflowResult:
                 config = ExptConfigReader.read(self.expt_filepath)
 
                 if target_whole_nwb:
+                    if config.hasNWB:
+                        continue
                     config.hasNWB = True
                 else:
                     config.function[node_id].hasNWB = True
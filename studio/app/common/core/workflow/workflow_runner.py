@@ -14,6 +14,9 @@ from studio.app.common.core.snakemake.snakemake_writer import SmkConfigWriter
 from studio.app.common.core.workflow.workflow import NodeType, NodeTypeUtil, RunItem
 from studio.app.common.core.workflow.workflow_params import get_typecheck_params
 from studio.app.common.core.workflow.workflow_reader import WorkflowConfigReader
+from studio.app.common.core.workflow.workflow_status_journal import (
+    WorkflowStatusJournal,
+)
 from studio.app.common.core.workflow.workflow_writer import WorkflowConfigWriter
 
 
@@ -48,6 +51,9 @@ class WorkflowRunner:
     def run_workflow(self, background_tasks):
         self.set_smk_config()
 
+        # discard node status events of the previous run
+        WorkflowStatusJournal(self.workspace_id, self.unique_id).clear()
+
         snakemake_params: SmkParam = get_typecheck_params(
             self.runItem.snakemakeParam, "snakemake"
         )
@@ -0,0 +1,220 @@
+import json
+import os
+import traceback
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from studio.app.common.core.utils.filepath_creater import join_filepath
+from studio.app.common.core.workflow.workflow import (
+    Message,
+    NodeRunStatus,
+    OutputPath,
+)
+from studio.app.common.dataclass.base import BaseData
+from studio.app.const import DATE_FORMAT
+from studio.app.dir_path import DIRPATH
+
+
+@dataclass
+class NodeStatusEvent:
+    node_id: str
+    algo_name: str
+    status: str
+    message: str
+    finished_at: str
+    has_nwb: bool = False
+    output_paths: Optional[Dict[str, dict]] = None
+
+    def to_message(self) -> Message:
+        output_paths = (
+            {k: OutputPath(**v) for k, v in self.output_paths.items()}
+            if self.output_paths is not None
+            else None
+        )
+        return Message(
+            status=self.status, message=self.message, outputPaths=output_paths
+        )
+
+
+class WorkflowStatusJournal:
+    """
+    Append-only journal of node completion events of a workflow.
+
+    Each rule process appends one JSON line when its node finishes,
+    and the API tails the journal incrementally to observe the workflow status,
+    instead of unpickling every node result on each poll.
+
+    The offset up to which the events have been applied to EXPERIMENT_YML
+    is stored next to the journal, so that each event is applied only once.
+    """
+
+    JOURNAL_FILE = "node_status.jsonl"
+    APPLIED_FILE = "node_status.applied"
+    MAX_CACHED_JOURNALS = 64
+
+    # tail state per journal file, of the recently read journals:
+    #   (inode, read offset, events by node_id, event end offsets by node_id)
+    __tail_cache: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def __init__(self, workspace_id: str, unique_id: str):
+        self.journal_path = join_filepath(
+            [
+                DIRPATH.OUTPUT_DIR,
+                workspace_id,
+                unique_id,
+                self.JOURNAL_FILE,
+            ]
+        )
+        self.applied_path = join_filepath(
+            [os.path.dirname(self.journal_path), self.APPLIED_FILE]
+        )
+
+    @classmethod
+    def __get_journal_path(cls, node_output_path: str) -> str:
+        workflow_dirpath = os.path.dirname(os.path.dirname(node_output_path))
+        return join_filepath([workflow_dirpath, cls.JOURNAL_FILE])
+
+    @classmethod
+    def __append(cls, node_output_path: str, event: NodeStatusEvent):
+        line = json.dumps(asdict(event)) + "\n"
+
+        # a single write in append mode, so that lines of concurrently
+        # running rules are not interleaved
+        with open(cls.__get_journal_path(node_output_path), "a") as f:
+            f.write(line)
+
+    @classmethod
+    def __create_event(cls, node_output_path: str, **kwargs) -> NodeStatusEvent:
+        return NodeStatusEvent(
+            node_id=os.path.basename(os.path.dirname(node_output_path)),
+            algo_name=os.path.splitext(os.path.basename(node_output_path))[0],
+            finished_at=datetime.now().strftime(DATE_FORMAT),
+            **kwargs,
+        )
+
+    @classmethod
+    def write_success(cls, node_output_path: str, output_info: dict):
+        """
+        Record the node success, together with the output paths for the frontend.
+        (the output json files are also created here, in the rule process)
+        """
+        node_dirpath = os.path.dirname(node_output_path)
+        output_paths = {}
+        for k, v in output_info.items():
+            if isinstance(v, BaseData):
+                v.save_json(node_dirpath)
+                if v.output_path:
+                    output_paths[k] = asdict(v.output_path)
+
+        algo_name = os.path.splitext(os.path.basename(node_output_path))[0]
+        event = cls.__create_event(
+            node_output_path,
+            status=NodeRunStatus.SUCCESS.value,
+            message=f"{algo_name} success",
+            has_nwb=os.path.exists(f"{os.path.splitext(node_output_path)[0]}.nwb"),
+            output_paths=output_paths,
+        )
+        cls.__append(node_output_path, event)
+
+    @classmethod
+    def write_error(cls, node_output_path: str, err: Exception):
+        err_msg = list(traceback.TracebackException.from_exception(err).format())
+
+        event = cls.__create_event(
+            node_output_path,
+            status=NodeRunStatus.ERROR.value,
+            message="\n".join(err_msg),
+        )
+        cls.__append(node_output_path, event)
+
+    def clear(self):
+        for path in [self.journal_path, self.applied_path]:
+            if os.path.exists(path):
+                os.remove(path)
+        self.__tail_cache.pop(self.journal_path, None)
+
+    def read_events(self) -> Dict[str, NodeStatusEvent]:
+        """
+        Return the latest event of each node,
+        reading only the lines appended since the last call (in this process).
+        """
+        _, _, events, _ = self.__read_tail()
+        return dict(events)
+
+    def read_unapplied_events(self) -> Tuple[Dict[str, NodeStatusEvent], int]:
+        """
+        Return the latest event of the nodes appended after the applied offset,
+        and the read offset to be passed to write_applied_offset once applied.
+        """
+        inode, offset, events, event_offsets = self.__read_tail()
+        applied_offset = self.__read_applied_offset(inode)
+        unapplied_events = {
+            node_id: event
+            for node_id, event in events.items()
+            if event_offsets[node_id] > applied_offset
+        }
+        return unapplied_events, offset
+
+    def write_applied_offset(self, offset: int):
+        inode, _, _, _ = self.__read_tail()
+        tmp_path = f"{self.applied_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"inode": inode, "offset": offset}, f)
+        os.replace(tmp_path, self.applied_path)
+
+    def __read_applied_offset(self, inode: Optional[int]) -> int:
+        try:
+            with open(self.applied_path) as f:
+                applied = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+        # the offset of a former (recreated) journal
+        if applied.get("inode") != inode:
+            return 0
+        return applied.get("offset", 0)
+
+    def __read_tail(self) -> tuple:
+        try:
+            stat = os.stat(self.journal_path)
+        except FileNotFoundError:
+            self.__tail_cache.pop(self.journal_path, None)
+            return None, 0, {}, {}
+
+        inode, offset, events, event_offsets = self.__tail_cache.get(
+            self.journal_path, (None, 0, {}, {})
+        )
+
+        # the journal has been recreated (workflow re-run)
+        if inode != stat.st_ino or stat.st_size < offset:
+            offset, events, event_offsets = 0, {}, {}
+
+        if stat.st_size > offset:
+            with open(self.journal_path, "rb") as f:
+                f.seek(offset)
+                chunk = f.read()
+
+            # skip a partially written last line, it is read on the next call
+            complete_size = chunk.rfind(b"\n") + 1
+            line_end = offset
+            for line in chunk[:complete_size].splitlines(keepends=True):
+                line_end += len(line)
+                if line.strip():
+                    event = NodeStatusEvent(**json.loads(line))
+                    events[event.node_id] = event
+                    event_offsets[event.node_id] = line_end
+            offset += complete_size
+
+        self.__tail_cache[self.journal_path] = (
+            stat.st_ino,
+            offset,
+            events,
+            event_offsets,
+        )
+        self.__tail_cache.move_to_end(self.journal_path)
+        while len(self.__tail_cache) > self.MAX_CACHED_JOURNALS:
+            self.__tail_cache.popitem(last=False)
+
+        return stat.st_ino, offset, events, event_offsets
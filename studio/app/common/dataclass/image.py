@@ -1,7 +1,7 @@
 import gc
 import math
 import os
-from typing import Optional
+from typing import Iterable, List, Optional
 
 import imageio
 import numpy as np
@@ -31,6 +31,8 @@ class ImageData(BaseData):
 
         self.json_path = None
         self.meta = meta
+        self._file_shapes = None
+        self._dtype = None
 
         if data is None:
             self.path = None
@@ -39,16 +41,58 @@ class ImageData(BaseData):
         elif isinstance(data, list) and isinstance(data[0], str):
             self.path = data
         else:
-            _dir = join_filepath([output_dir, "tiff", file_name])
-            create_directory(_dir)
-
-            _path = join_filepath([_dir, f"{file_name}.tif"])
-            tifffile.imsave(_path, data)
+            _path = self.__create_tiff_path(output_dir, file_name)
+            if isinstance(data, np.ndarray) and data.ndim >= 3:
+                # write frame by frame, to avoid a contiguous copy of views
+                self.__write_frames(_path, iter(data), data.shape, data.dtype)
+            else:
+                tifffile.imsave(_path, data)
             self.path = [_path]
+            self.__load_metadata()
 
             del data
             gc.collect()
 
+    @classmethod
+    def from_frames(
+        cls,
+        frames: Iterable[np.ndarray],
+        shape: tuple,
+        dtype,
+        output_dir=DIRPATH.OUTPUT_DIR,
+        file_name="image",
+        meta: Optional[PlotMetaData] = None,
+    ) -> "ImageData":
+        """
+        Create ImageData by appending frames to a BigTIFF incrementally,
+        so that the whole stack never needs to be held in memory.
+
+        frames: iterable of frames (shape[1:]), non-contiguous views are allowed
+        shape: shape of the whole stack, (t, y, x) or (t, z, y, x)
+        """
+        _path = cls.__create_tiff_path(output_dir, file_name)
+        cls.__write_frames(_path, frames, tuple(shape), np.dtype(dtype))
+
+        return cls([_path], output_dir=output_dir, file_name=file_name, meta=meta)
+
+    @staticmethod
+    def __create_tiff_path(output_dir: str, file_name: str) -> str:
+        _dir = join_filepath([output_dir, "tiff", file_name])
+        create_directory(_dir)
+
+        return join_filepath([_dir, f"{file_name}.tif"])
+
+    @staticmethod
+    def __write_frames(path: str, frames: Iterable[np.ndarray], shape, dtype):
+        def pages():
+            for frame in frames:
+                frame = np.asarray(frame, dtype=dtype)
+                # each TIFF page holds one (y, x) plane
+                yield from frame.reshape(-1, *frame.shape[-2:])
+
+        with tifffile.TiffWriter(path, bigtiff=True) as tif:
+            tif.write(pages(), shape=shape, dtype=dtype, photometric="minisblack")
+
     def split_image(self, output_dir: str, n_files: int = 2):
         assert n_files > 1, "n_files should be greater than 1"
 
@@ -74,22 +118,112 @@ class ImageData(BaseData):
 
         return save_paths
 
+    @property
+    def paths(self) -> List[str]:
+        if self.path is None:
+            return []
+        return self.path if isinstance(self.path, list) else [self.path]
+
     @property
     def data(self):
+        """
+        Image stack of all files.
+        A single uncompressed TIFF is returned as a (copy-on-write) memmap,
+        so the pixels are read from disk only when accessed.
+        """
         if isinstance(self.path, list):
-            return np.concatenate([imageio.volread(p) for p in self.path])
+            if len(self.path) == 1:
+                return self.__read_file(self.path[0])
+            return np.concatenate([self.__read_file(p) for p in self.path])
         else:
-            return np.array(imageio.volread(self.path))
+            return self.__read_file(self.path)
+
+    def frames(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """
+        Read frames [start, stop) of the image stack,
+        decoding only the files (and pages) overlapping the range.
+        """
+        stop = self.shape[0] if stop is None else min(stop, self.shape[0])
+        frames = []
+        offset = 0
+        for path, file_shape in zip(self.paths, self.__file_shapes):
+            n_frames = file_shape[0]
+            file_start = max(start - offset, 0)
+            file_stop = min(stop - offset, n_frames)
+            if file_start < file_stop:
+                frames.append(self.__read_file(path, file_start, file_stop))
+            offset += n_frames
+
+        if not frames:
+            return np.empty((0, *self.shape[1:]), dtype=self.dtype)
+        return frames[0] if len(frames) == 1 else np.concatenate(frames)
+
+    @property
+    def shape(self) -> tuple:
+        file_shapes = self.__file_shapes
+        n_frames = sum(file_shape[0] for file_shape in file_shapes)
+        return (n_frames, *file_shapes[0][1:])
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    @property
+    def dtype(self) -> np.dtype:
+        if self.__dict__.get("_dtype") is None:
+            self.__load_metadata()
+        return self._dtype
+
+    @property
+    def __file_shapes(self) -> List[tuple]:
+        # NOTE: instances restored from older pickles have no metadata attributes
+        if self.__dict__.get("_file_shapes") is None:
+            self.__load_metadata()
+        return self._file_shapes
+
+    def __load_metadata(self):
+        file_shapes = []
+        dtype = None
+        for path in self.paths:
+            try:
+                with tifffile.TiffFile(path) as tif:
+                    series = tif.series[0]
+                    file_shapes.append(tuple(series.shape))
+                    dtype = series.dtype
+            except (tifffile.TiffFileError, ValueError):
+                image = imageio.volread(path)
+                file_shapes.append(image.shape)
+                dtype = image.dtype
+
+        self._file_shapes = file_shapes
+        self._dtype = np.dtype(dtype) if dtype is not None else None
+
+    @staticmethod
+    def __read_file(path: str, start: int = None, stop: int = None) -> np.ndarray:
+        try:
+            image = tifffile.memmap(path, mode="c")
+        except (tifffile.TiffFileError, ValueError):
+            # compressed or non-TIFF file, which cannot be memory-mapped
+            if start is not None:
+                try:
+                    with tifffile.TiffFile(path) as tif:
+                        if len(tif.pages) == tif.series[0].shape[0]:
+                            return tif.asarray(key=range(start, stop))
+                except (tifffile.TiffFileError, ValueError):
+                    pass
+            image = np.array(imageio.volread(path))
+
+        return image if start is None else image[start:stop]
 
     def save_json(self, json_dir):
-        if self.data.ndim < 3:
+        if self.ndim < 3:
             self.json_path = join_filepath([json_dir, f"{self.file_name}.json"])
             JsonWriter.write_as_split(self.json_path, create_images_list(self.data))
             JsonWriter.write_plot_meta(json_dir, self.file_name, self.meta)
 
     @property
     def output_path(self) -> OutputPath:
-        if self.data.ndim >= 3:
+        if self.ndim >= 3:
             # self.path will be a list if self.data got into else statement on __init__
             if isinstance(self.path, list) and isinstance(self.path[0], str):
                 _path = self.path[0]
@@ -98,7 +232,7 @@ class ImageData(BaseData):
             return OutputPath(
                 path=_path,
                 type=OutputType.IMAGE,
-                max_index=len(self.data),
+                max_index=self.shape[0],
             )
         else:
             return OutputPath(
@@ -8,6 +8,7 @@ from studio.app.common.core.utils.filepath_creater import (
     join_filepath,
 )
 from studio.app.common.core.utils.json_writer import JsonWriter
+from studio.app.common.core.utils.timeseries_store import TimeSeriesStore
 from studio.app.common.core.workflow.workflow import OutputPath, OutputType
 from studio.app.common.dataclass.base import BaseData
 from studio.app.common.schemas.outputs import PlotMetaData
@@ -60,19 +61,15 @@ class TimeSeriesData(BaseData):
         create_directory(self.json_path, delete_dir=True)
         JsonWriter.write_plot_meta(json_dir, self.file_name, self.meta)
 
-        for i, cell_i in enumerate(self.cell_numbers):
-            data = self.data[i]
-            if self.std is not None:
-                std = self.std[i]
-                df = pd.DataFrame(
-                    np.concatenate([data[:, np.newaxis], std[:, np.newaxis]], axis=1),
-                    index=self.index,
-                    columns=["data", "std"],
-                )
-            else:
-                df = pd.DataFrame(data, index=self.index, columns=["data"])
-
-            JsonWriter.write(join_filepath([self.json_path, f"{str(cell_i)}.json"]), df)
+        # all cells are stored in a columnar store, instead of a json per cell
+        TimeSeriesStore.write(
+            self.json_path,
+            self.data,
+            self.index,
+            self.cell_numbers,
+            std=self.std,
+            sem=self.sem,
+        )
 
     @property
     def output_path(self) -> OutputPath:
@@ -1,16 +1,20 @@
+import gzip
 import os
 from glob import glob
-from typing import Optional
+from typing import List, Optional
 
 import pandas as pd
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
 
 from studio.app.common.core.utils.file_reader import JsonReader, Reader
 from studio.app.common.core.utils.filepath_creater import (
     create_directory,
     join_filepath,
 )
+from studio.app.common.core.utils.image_frames import ImageFrames
+from studio.app.common.core.utils.json_serializer import JsonCompression
 from studio.app.common.core.utils.json_writer import JsonWriter, save_tiff2json
+from studio.app.common.core.utils.timeseries_store import TimeSeriesStore
 from studio.app.common.schemas.outputs import JsonTimeSeriesData, OutputData
 from studio.app.const import ACCEPT_FILE_EXT
 from studio.app.dir_path import DIRPATH
@@ -32,19 +36,30 @@ def get_initial_timeseries_data(dirpath) -> JsonTimeSeriesData:
 
 @router.get("/inittimedata/{dirpath:path}", response_model=JsonTimeSeriesData)
 async def get_inittimedata(dirpath: str):
-    file_numbers = sorted(
-        [
-            os.path.splitext(os.path.basename(x))[0]
-            for x in glob(join_filepath([dirpath, "*.json"]))
-        ]
-    )
+    if TimeSeriesStore.exists(dirpath):
+        store = TimeSeriesStore(dirpath)
+        file_numbers = [str(cell) for cell in store.cell_numbers]
+        index = file_numbers[0]
+        timeseries = store.read(cells=[index])
+        json_data = JsonTimeSeriesData(
+            xrange=store.xrange,
+            data=timeseries[TimeSeriesStore.DATA][index],
+            std=timeseries.get(TimeSeriesStore.STD, {}).get(index),
+        )
+    else:
+        file_numbers = sorted(
+            [
+                os.path.splitext(os.path.basename(x))[0]
+                for x in glob(join_filepath([dirpath, "*.json"]))
+            ]
+        )
 
-    index = file_numbers[0]
-    str_index = str(index)
+        index = file_numbers[0]
+        json_data = JsonReader.read_as_timeseries(
+            join_filepath([dirpath, f"{str(index)}.json"])
+        )
 
-    json_data = JsonReader.read_as_timeseries(
-        join_filepath([dirpath, f"{str(index)}.json"])
-    )
+    str_index = str(index)
 
     data = {
         str(i): {json_data.xrange[0]: json_data.data[json_data.xrange[0]]}
@@ -72,13 +87,20 @@ async def get_inittimedata(dirpath: str):
 
 @router.get("/timedata/{dirpath:path}", response_model=JsonTimeSeriesData)
 async def get_timedata(dirpath: str, index: int):
+    return_data = get_initial_timeseries_data(dirpath)
+    str_index = str(index)
+
+    if TimeSeriesStore.exists(dirpath):
+        store = TimeSeriesStore(dirpath)
+        timeseries = store.read(cells=[index])
+        return_data.data = timeseries[TimeSeriesStore.DATA]
+        return_data.std = timeseries.get(TimeSeriesStore.STD, {})
+        return return_data
+
     json_data = JsonReader.read_as_timeseries(
         join_filepath([dirpath, f"{str(index)}.json"])
     )
 
-    return_data = get_initial_timeseries_data(dirpath)
-
-    str_index = str(index)
     return_data.data[str_index] = json_data.data
     if json_data.std is not None:
         return_data.std[str_index] = json_data.std
@@ -90,6 +112,14 @@ async def get_timedata(dirpath: str, index: int):
 async def get_alltimedata(dirpath: str):
     return_data = get_initial_timeseries_data(dirpath)
 
+    if TimeSeriesStore.exists(dirpath):
+        store = TimeSeriesStore(dirpath)
+        timeseries = store.read()
+        return_data.xrange = store.xrange
+        return_data.data = timeseries[TimeSeriesStore.DATA]
+        return_data.std = timeseries.get(TimeSeriesStore.STD, {})
+        return return_data
+
     for i, path in enumerate(glob(join_filepath([dirpath, "*.json"]))):
         str_idx = str(os.path.splitext(os.path.basename(path))[0])
         json_data = JsonReader.read_as_timeseries(path)
@@ -103,9 +133,58 @@ async def get_alltimedata(dirpath: str):
     return return_data
 
 
+@router.get("/timeseries/{dirpath:path}", response_model=JsonTimeSeriesData)
+async def get_timeseries(
+    dirpath: str,
+    cells: Optional[List[int]] = Query(None),
+    start: Optional[int] = None,
+    stop: Optional[int] = None,
+    max_points: Optional[int] = None,
+    method: str = TimeSeriesStore.MINMAX,
+):
+    """
+    Timeseries of the cells (all cells if not given) in frames [start, stop),
+    decimated to max_points per cell (by "minmax" or "lttb" method) if given.
+    """
+    if not TimeSeriesStore.exists(dirpath):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    if method not in [TimeSeriesStore.MINMAX, TimeSeriesStore.LTTB] or (
+        max_points is not None and max_points < 2
+    ):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+
+    store = TimeSeriesStore(dirpath)
+    timeseries = store.read(cells, start, stop, max_points, method)
+
+    return_data = get_initial_timeseries_data(dirpath)
+    return_data.xrange = timeseries[TimeSeriesStore.INDEX]
+    return_data.data = timeseries[TimeSeriesStore.DATA]
+    return_data.std = timeseries.get(TimeSeriesStore.STD, {})
+
+    return return_data
+
+
+def get_output_response(request: Request, json_filepath: str) -> Response:
+    """
+    The OutputData of the JSON file (the same JSON as the response model),
+    precompressed with the encoding accepted by the client.
+    """
+    content, encoding = JsonCompression.encode(
+        json_filepath,
+        [json_filepath, JsonReader.get_plot_meta_path(json_filepath)],
+        lambda: JsonReader.read_as_output_bytes(json_filepath),
+        request.headers.get("accept-encoding", ""),
+    )
+    # the content depends on the Accept-Encoding, for the caches
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
 @router.get("/data/{filepath:path}", response_model=OutputData)
-async def get_file(filepath: str):
-    return JsonReader.read_as_output(filepath)
+async def get_file(request: Request, filepath: str):
+    return get_output_response(request, filepath)
 
 
 @router.get("/html/{filepath:path}", response_model=OutputData)
@@ -115,6 +194,7 @@ async def get_html(filepath: str):
 
 @router.get("/image/{filepath:path}", response_model=OutputData)
 async def get_image(
+    request: Request,
     filepath: str,
     workspace_id: str,
     start_index: Optional[int] = 0,
@@ -139,11 +219,69 @@ async def get_image(
     else:
         json_filepath = filepath
 
-    return JsonReader.read_as_output(json_filepath)
+    return get_output_response(request, json_filepath)
+
+
+@router.get("/frames/{filepath:path}", response_class=Response)
+async def get_image_frames(
+    request: Request,
+    filepath: str,
+    workspace_id: str,
+    start_index: Optional[int] = 0,
+    end_index: Optional[int] = 10,
+    downsample: Optional[int] = 1,
+    dtype: Optional[str] = None,
+):
+    """
+    Frames of the TIFF image as binary, the same range as `/image`
+    (frames start_index to end_index, 1-origin).
+    The body is the (t, y, x) array in C order, whose shape and dtype
+    are given by the X-Frames-Shape and X-Frames-Dtype headers.
+    """
+    _, ext = os.path.splitext(os.path.basename(filepath))
+    if ext not in ACCEPT_FILE_EXT.TIFF_EXT.value:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+    if downsample < 1 or (
+        dtype is not None and dtype not in ImageFrames.QUANTIZE_DTYPES
+    ):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+
+    if not filepath.startswith(join_filepath([DIRPATH.OUTPUT_DIR, workspace_id])):
+        filepath = join_filepath([DIRPATH.INPUT_DIR, workspace_id, filepath])
+    if not os.path.exists(filepath):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    start, stop = max(start_index - 1, 0), end_index
+
+    etag = f'"{ImageFrames.get_etag(filepath, start, stop, downsample, dtype)}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+        )
+
+    meta, data = ImageFrames.read(filepath, start, stop, downsample, dtype)
+    headers = {
+        "ETag": etag,
+        "Vary": "Accept-Encoding",
+        "X-Frames-Shape": ",".join(map(str, meta.shape)),
+        "X-Frames-Dtype": meta.dtype,
+        "X-Frames-Min": str(meta.vmin),
+        "X-Frames-Max": str(meta.vmax),
+        "Access-Control-Expose-Headers": "ETag, X-Frames-Shape, X-Frames-Dtype, "
+        "X-Frames-Min, X-Frames-Max",
+    }
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+    else:
+        data = gzip.decompress(data)
+
+    return Response(
+        content=data, media_type="application/octet-stream", headers=headers
+    )
 
 
 @router.get("/csv/{filepath:path}", response_model=OutputData)
-async def get_csv(filepath: str, workspace_id: str):
+async def get_csv(request: Request, filepath: str, workspace_id: str):
     filepath = join_filepath([DIRPATH.INPUT_DIR, workspace_id, filepath])
 
     filename, _ = os.path.splitext(os.path.basename(filepath))
@@ -151,5 +289,9 @@ async def get_csv(filepath: str, workspace_id: str):
     create_directory(save_dirpath)
     json_filepath = join_filepath([save_dirpath, f"{filename}.json"])
 
-    JsonWriter.write_as_split(json_filepath, pd.read_csv(filepath, header=None))
-    return JsonReader.read_as_output(json_filepath)
+    is_converted = os.path.exists(json_filepath) and os.path.getmtime(
+        json_filepath
+    ) >= os.path.getmtime(filepath)
+    if not is_converted:
+        JsonWriter.write_as_split(json_filepath, pd.read_csv(filepath, header=None))
+    return get_output_response(request, json_filepath)
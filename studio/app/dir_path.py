@@ -12,6 +12,7 @@ class DIRPATH:
 
     INPUT_DIR = f"{DATA_DIR}/input"
     OUTPUT_DIR = f"{DATA_DIR}/output"
+    CACHE_DIR = f"{DATA_DIR}/cache"
 
     if not os.path.exists(INPUT_DIR):
         os.makedirs(INPUT_DIR)
@@ -1,3 +1,4 @@
 from studio.app.optinist.core.edit_ROI.edit_ROI import EditROI, EditRoiUtils
+from studio.app.optinist.core.edit_ROI.edit_ROI_session import EditRoiSessions
 
-__all__ = ["EditROI", "EditRoiUtils"]
+__all__ = ["EditROI", "EditRoiSessions", "EditRoiUtils"]
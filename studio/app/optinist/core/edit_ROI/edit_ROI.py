@@ -1,3 +1,4 @@
+import copy
 import os
 from dataclasses import dataclass
 from glob import glob
@@ -5,11 +6,12 @@ from typing import Dict, List
 
 import numpy as np
 from fastapi import HTTPException, status
+from filelock import FileLock
 from snakemake import snakemake
 
 from studio.app.common.core.experiment.experiment import ExptOutputPathIds
 from studio.app.common.core.logger import AppLogger
-from studio.app.common.core.rules.runner import Runner
+from studio.app.common.core.rules.rule_worker import RuleWorkerClient, RuleWorkerPool
 from studio.app.common.core.utils.config_handler import ConfigReader
 from studio.app.common.core.utils.filepath_creater import join_filepath
 from studio.app.common.core.utils.filepath_finder import find_condaenv_filepath
@@ -18,8 +20,12 @@ from studio.app.common.dataclass.base import BaseData
 from studio.app.dir_path import DIRPATH
 from studio.app.optinist.core.edit_ROI.utils import create_ellipse_mask
 from studio.app.optinist.core.edit_ROI.wrappers import edit_roi_wrapper_dict
-from studio.app.optinist.core.nwb.nwb_creater import overwrite_nwb
-from studio.app.optinist.dataclass import EditRoiData, IscellData, RoiData
+from studio.app.optinist.core.nwb.nwb_creater import (
+    overwrite_nwb,
+    replace_nwbfile,
+    update_nwbfile,
+)
+from studio.app.optinist.dataclass import EditRoiData, IscellData, RoiData, RoiMasks
 from studio.app.optinist.schemas.roi import RoiStatus
 
 logger = AppLogger.get_logger()
@@ -54,6 +60,17 @@ class EditRoiUtils:
 
     @classmethod
     def execute(cls, filepath):
+        algo = cls.get_algo(filepath)
+
+        # the algorithms without conda environment are committed
+        # in the environment of the app, without launching snakemake
+        if not edit_roi_wrapper_dict[algo].get("conda_name"):
+            if RuleWorkerPool.is_available():
+                RuleWorkerClient.commit_edit_roi(filepath)
+            else:
+                EditROI(file_path=filepath).commit()
+            return
+
         result = snakemake(
             DIRPATH.SNAKEMAKE_FILEPATH,
             use_conda=True,
@@ -61,7 +78,7 @@ class EditRoiUtils:
             workdir=f"{os.path.dirname(DIRPATH.STUDIO_DIR)}",
             config={
                 "type": "EDIT_ROI",
-                "algo": cls.get_algo(filepath),
+                "algo": algo,
                 "file_path": filepath,
             },
         )
@@ -92,12 +109,24 @@ class EditROI:
         if not isinstance(self.tmp_data, EditRoiData):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
 
+        if self.tmp_data is self.data:
+            # keep the movie reference of the committed data for the commit
+            self.tmp_data = copy.copy(self.data)
         self.tmp_data.images = None
 
+        # ROIs of the pickles created before the sparse representation
+        if isinstance(self.tmp_data.im, np.ndarray):
+            self.tmp_data.im = RoiMasks.from_dense(self.tmp_data.im)
+
         self.tmp_iscell = self.tmp_output_info.get(
             "iscell", self.output_info.get("iscell")
         ).data
 
+        # edits not yet written to the tmp pickle (see `save`)
+        self.is_dirty = False
+        # cell_roi image, updated incrementally on the edits
+        self.cell_roi_image: np.ndarray = None
+
         logger.info("start edit roi: %s", self.function_id)
 
     @property
@@ -116,77 +145,64 @@ class EditROI:
 
     @property
     def shape(self):
-        return self.tmp_data.im.shape[1:]
+        return self.tmp_data.im.shape
 
     @property
     def num_cell(self):
-        return self.tmp_data.im.shape[0]
+        return len(self.tmp_data.im)
+
+    @property
+    def nbytes(self) -> int:
+        roi_masks = self.tmp_data.im
+        nbytes = sum(p.nbytes for p in roi_masks.pixels)
+        nbytes += sum(w.nbytes for w in roi_masks.weights)
+        nbytes += self.tmp_iscell.nbytes
+        if self.cell_roi_image is not None:
+            nbytes += self.cell_roi_image.nbytes
+        return nbytes
 
     def get_status(self) -> RoiStatus:
         return self.tmp_data.status()
 
     def add(self, roi_pos):
         new_roi = create_ellipse_mask(self.shape, roi_pos)
-        new_roi = new_roi[np.newaxis, :, :] * self.num_cell
 
         self.tmp_data.temp_add_roi[self.num_cell] = roi_pos
         self.tmp_iscell = np.append(self.tmp_iscell, CellType.TEMP_ADD)
-        self.tmp_data.im = np.vstack((self.tmp_data.im, new_roi))
+        id = self.tmp_data.im.append(~np.isnan(new_roi))
 
-        info = {
-            "cell_roi": RoiData(
-                np.nanmax(
-                    self.tmp_data.im[self.tmp_iscell != CellType.NON_ROI], axis=0
-                ),
-                output_dir=self.node_dirpath,
-                file_name="cell_roi",
-            ),
-            "iscell": IscellData(self.tmp_iscell),
-            "edit_roi_data": self.tmp_data,
-        }
-        self.__update_pickle_for_roi_edition(self.tmp_pickle_file_path, info)
-        self.__save_json(info)
+        self.is_dirty = True
+        self.__update_cell_roi(id)
 
     def merge(self, ids: List[int]):
-        merging_rois = self.tmp_data.im[ids, :, :]
-        merging_rois[np.isnan(merging_rois)] = -np.inf
-        merged_roi = np.maximum.reduce(merging_rois)
-        merged_roi = np.where(merged_roi == -np.inf, np.nan, self.num_cell)
-
         self.tmp_data.temp_merge_roi[float(self.num_cell)] = ids
-        self.tmp_data.im = np.vstack((self.tmp_data.im, merged_roi[np.newaxis, :, :]))
+        id = self.tmp_data.im.merge(ids)
 
         self.tmp_iscell[ids] = CellType.TEMP_DELETE
         self.tmp_iscell = np.append(self.tmp_iscell, CellType.TEMP_ADD)
 
-        info = {
-            "cell_roi": RoiData(
-                np.nanmax(
-                    self.tmp_data.im[self.tmp_iscell != CellType.NON_ROI], axis=0
-                ),
-                output_dir=self.node_dirpath,
-                file_name="cell_roi",
-            ),
-            "iscell": IscellData(self.tmp_iscell),
-            "edit_roi_data": self.tmp_data,
-        }
-
-        self.__update_pickle_for_roi_edition(self.tmp_pickle_file_path, info)
-        self.__save_json(info)
+        self.is_dirty = True
+        self.__update_cell_roi(id)
 
     def delete(self, ids: List[int]):
+        # ROIs to be deleted are still drawn in cell_roi until the commit
         self.tmp_iscell[ids] = CellType.TEMP_DELETE
 
         for id in ids:
             self.tmp_data.temp_delete_roi[id] = None
 
+        self.is_dirty = True
+
+    def save(self):
+        """
+        Write the edits to the tmp pickle, which holds only the edited data.
+        """
         info = {
             "iscell": IscellData(self.tmp_iscell),
             "edit_roi_data": self.tmp_data,
         }
-
-        self.__update_pickle_for_roi_edition(self.tmp_pickle_file_path, info)
-        self.__save_json(info)
+        PickleWriter.write(pickle_path=self.tmp_pickle_file_path, info=info)
+        self.is_dirty = False
 
     def commit(self):
         if "suite2p" in self.function_id:
@@ -235,6 +251,7 @@ class EditROI:
         self.__save_json(info)
         self.__update_whole_nwb(info)
 
+        self.is_dirty = False
         (
             os.remove(self.tmp_pickle_file_path)
             if os.path.exists(self.tmp_pickle_file_path)
@@ -243,25 +260,35 @@ class EditROI:
 
     def cancel(self):
         original_num_cell = len(self.output_info.get("fluorescence").data)
-        self.tmp_data.im = self.tmp_data.im[:original_num_cell]
+        self.tmp_data.im.truncate(original_num_cell)
         self.tmp_iscell = self.tmp_iscell[:original_num_cell]
         self.tmp_data.cancel()
 
+        self.is_dirty = False
+        self.__update_cell_roi()
+        (
+            os.remove(self.tmp_pickle_file_path)
+            if os.path.exists(self.tmp_pickle_file_path)
+            else None
+        )
+
+    def __update_cell_roi(self, id: int = None):
+        if self.cell_roi_image is None or id is None:
+            self.cell_roi_image = self.tmp_data.im.render(
+                self.tmp_iscell != CellType.NON_ROI
+            )
+        else:
+            # the new ROI has the largest index, so it is drawn over the others
+            self.cell_roi_image.flat[self.tmp_data.im.pixels[id]] = id
+
         info = {
             "cell_roi": RoiData(
-                np.nanmax(
-                    self.tmp_data.im[self.tmp_iscell != CellType.NON_ROI], axis=0
-                ),
+                self.cell_roi_image,
                 output_dir=self.node_dirpath,
                 file_name="cell_roi",
             ),
         }
         self.__save_json(info)
-        (
-            os.remove(self.tmp_pickle_file_path)
-            if os.path.exists(self.tmp_pickle_file_path)
-            else None
-        )
 
     def __update_whole_nwb(self, output_info):
         smk_config_file = join_filepath(
@@ -269,15 +296,32 @@ class EditROI:
         )
         smk_config = ConfigReader.read(smk_config_file)
         last_outputs = smk_config.get("last_output")
+        func_name = os.path.splitext(os.path.basename(self.pickle_file_path))[0]
 
+        # the nwbfile configs of the downstream nodes include the edited one
         for last_output in last_outputs:
             last_output_path = join_filepath([DIRPATH.OUTPUT_DIR, last_output])
-            last_output_info = self.__update_pickle_for_roi_edition(
-                last_output_path, output_info
+            if os.path.abspath(last_output_path) == os.path.abspath(
+                self.pickle_file_path
+            ):
+                continue
+
+            last_output_info = PickleReader.read(last_output_path)
+            if PickleReader.check_is_valid_node_pickle(
+                last_output_info
+            ) and func_name in last_output_info.get("nwbfile", {}):
+                last_output_info["nwbfile"][func_name] = output_info["nwbfile"]
+                PickleWriter.write(last_output_path, last_output_info)
+
+        # only the entries of the edited function are rewritten,
+        # with the lock of the node runs writing the same file (save_all_nwb)
+        whole_nwb_path = join_filepath([self.workflow_dirpath, "whole.nwb"])
+        with FileLock(whole_nwb_path + ".lock", timeout=30):
+            update_nwbfile(
+                whole_nwb_path,
+                self.output_info["nwbfile"].get("input"),
+                output_info["nwbfile"],
             )
-            whole_nwb_path = join_filepath([self.workflow_dirpath, "whole.nwb"])
-
-            Runner.save_all_nwb(whole_nwb_path, last_output_info["nwbfile"])
 
     def __save_json(self, output_info):
         for k, v in output_info.items():
@@ -287,7 +331,7 @@ class EditROI:
             if k == "nwbfile":
                 nwb_files = glob(join_filepath([self.node_dirpath, "[!tmp_]*.nwb"]))
 
-                if len(nwb_files) > 0:
+                if len(nwb_files) > 0 and not replace_nwbfile(nwb_files[0], v):
                     overwrite_nwb(v, self.node_dirpath, os.path.basename(nwb_files[0]))
 
     def __update_pickle_for_roi_edition(self, file_path, new_output_info):
@@ -0,0 +1,147 @@
+"""
+In-memory Edit ROI sessions
+
+Each Edit ROI request used to load the node pickles into a new EditROI,
+and write the whole edited data back to the tmp pickle.
+EditRoiSessions instead keeps the EditROI of each node in the server memory:
+
+- The edits are applied to the in-memory session, and only the cell_roi
+  image (read by the frontend) is written on each edit.
+- The edits are written to the tmp pickle behind the requests
+  (`WRITE_BEHIND_DELAY` seconds after the last edit), and in any case
+  before the commit, on the eviction of the session and on the app shutdown.
+- The least recently used sessions are evicted, when the number of sessions
+  or their memory usage exceed `MAX_SESSIONS` or `MAX_NBYTES`.
+- A session is reloaded when its node pickle is updated by another process
+  (e.g. rerun of the workflow).
+"""
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator
+
+from studio.app.common.core.logger import AppLogger
+from studio.app.optinist.core.edit_ROI.edit_ROI import EditROI
+
+logger = AppLogger.get_logger()
+
+
+class EditRoiSessions:
+    MAX_SESSIONS = 8
+    MAX_NBYTES = 1024**3
+    WRITE_BEHIND_DELAY = 5  # sec
+
+    __sessions: "OrderedDict[str, EditROI]" = OrderedDict()
+    __pickle_mtimes = {}
+    __lock = threading.RLock()
+    __timer: threading.Timer = None
+
+    @classmethod
+    def get(cls, file_path: str) -> EditROI:
+        key = os.path.dirname(file_path)
+
+        with cls.__lock:
+            session = cls.__sessions.get(key)
+
+            if session is not None and cls.__is_stale(key, session):
+                cls.__sessions.pop(key)
+                session = None
+
+            if session is None:
+                session = EditROI(file_path=file_path)
+                cls.__sessions[key] = session
+                cls.__pickle_mtimes[key] = cls.__get_mtime(session.pickle_file_path)
+                cls.__evict(keep=key)
+
+            cls.__sessions.move_to_end(key)
+            return session
+
+    @classmethod
+    @contextmanager
+    def edit(cls, file_path: str) -> Iterator[EditROI]:
+        """
+        Edit the session of the node, and write the edits behind.
+        """
+        with cls.__lock:
+            yield cls.get(file_path)
+            cls.__evict(keep=os.path.dirname(file_path))
+            cls.__schedule_flush()
+
+    @classmethod
+    def flush(cls, file_path: str = None):
+        """
+        Write the edits of the session of the node (or of all sessions)
+        to the tmp pickles.
+        """
+        with cls.__lock:
+            keys = (
+                list(cls.__sessions)
+                if file_path is None
+                else [os.path.dirname(file_path)]
+            )
+            for key in keys:
+                session = cls.__sessions.get(key)
+                if session is not None and session.is_dirty:
+                    session.save()
+
+    @classmethod
+    def close(cls, file_path: str = None, save: bool = True):
+        """
+        Remove the session of the node (or all sessions) from the memory,
+        writing their edits to the tmp pickles unless `save=False`.
+        """
+        with cls.__lock:
+            if save:
+                cls.flush(file_path)
+
+            keys = (
+                list(cls.__sessions)
+                if file_path is None
+                else [os.path.dirname(file_path)]
+            )
+            for key in keys:
+                cls.__sessions.pop(key, None)
+                cls.__pickle_mtimes.pop(key, None)
+
+    @classmethod
+    def __is_stale(cls, key: str, session: EditROI) -> bool:
+        try:
+            mtime = cls.__get_mtime(session.pickle_file_path)
+        except Exception:
+            # the node has been removed
+            return True
+        return mtime != cls.__pickle_mtimes.get(key)
+
+    @staticmethod
+    def __get_mtime(path: str) -> int:
+        return os.stat(path).st_mtime_ns
+
+    @classmethod
+    def __evict(cls, keep: str):
+        while len(cls.__sessions) > 1 and (
+            len(cls.__sessions) > cls.MAX_SESSIONS
+            or sum(s.nbytes for s in cls.__sessions.values()) > cls.MAX_NBYTES
+        ):
+            key = next(k for k in cls.__sessions if k != keep)
+            session = cls.__sessions.pop(key)
+            cls.__pickle_mtimes.pop(key, None)
+            if session.is_dirty:
+                session.save()
+            logger.info("evict edit roi session: %s", key)
+
+    @classmethod
+    def __schedule_flush(cls):
+        if cls.__timer is not None and cls.__timer.is_alive():
+            cls.__timer.cancel()
+
+        cls.__timer = threading.Timer(cls.WRITE_BEHIND_DELAY, cls.__flush_behind)
+        cls.__timer.daemon = True
+        cls.__timer.start()
+
+    @classmethod
+    def __flush_behind(cls):
+        try:
+            cls.flush()
+        except Exception as e:
+            logger.error(e, exc_info=True)
@@ -2,6 +2,7 @@ from typing import Tuple
 
 import numpy as np
 
+from studio.app.optinist.dataclass.roi import MovieRef, RoiMasks
 from studio.app.optinist.schemas.roi import RoiPos
 
 
@@ -28,3 +29,20 @@ def create_ellipse_mask(shape: Tuple[int, int], roi_pos: RoiPos):
     ellipse[distance <= 1] = 1
 
     return ellipse
+
+
+def extract_roi_traces(images, roi_masks: RoiMasks, ids) -> np.ndarray:
+    """
+    Mean traces of ROIs of ids, from the movie referenced by EditRoiData.
+    """
+    if not isinstance(images, MovieRef):
+        # pickles created before MovieRef hold the movie data itself
+        images = np.asarray(images)
+        return np.array(
+            [
+                np.mean(images[:, roi_masks.get_mask(i)], axis=1)
+                for i in roi_masks.get_ids(ids)
+            ]
+        ).reshape(-1, images.shape[0])
+
+    return images.extract_traces(roi_masks, ids)
@@ -1,12 +1,18 @@
 import numpy as np
 
-from studio.app.common.dataclass.image import ImageData
+from studio.app.optinist.core.edit_ROI.utils import extract_roi_traces
 from studio.app.optinist.core.edit_ROI.wrappers.caiman_edit_roi.utils import set_nwbfile
-from studio.app.optinist.dataclass import EditRoiData, FluoData, IscellData, RoiData
+from studio.app.optinist.dataclass import (
+    EditRoiData,
+    FluoData,
+    IscellData,
+    MovieRef,
+    RoiData,
+)
 
 
 def commit_edit(
-    images: ImageData,
+    images: MovieRef,
     data: EditRoiData,
     fluorescence: FluoData,
     iscell,
@@ -16,22 +22,21 @@ def commit_edit(
     from studio.app.optinist.core.edit_ROI.edit_ROI import CellType
 
     fluorescence = fluorescence.data
-    num_cell = data.im.shape[0]
+    num_cell = len(data.im)
 
     new_fluorescences = np.zeros((num_cell, fluorescence.shape[1]))
     new_fluorescences[: len(fluorescence)] = fluorescence
 
     iscell[iscell == CellType.TEMP_DELETE] = CellType.NON_ROI
-    for i in range(num_cell):
-        if iscell[i] == CellType.TEMP_ADD:
-            new_fluorescences[i] = np.mean(images[:, ~np.isnan(data.im[i])], axis=1)
-            iscell[i] = CellType.ROI
+    add_ids = np.flatnonzero(iscell == CellType.TEMP_ADD)
+    new_fluorescences[add_ids] = extract_roi_traces(images, data.im, add_ids)
+    iscell[add_ids] = CellType.ROI
 
     data.commit()
 
     info = {
         "cell_roi": RoiData(
-            np.nanmax(data.im[iscell != CellType.NON_ROI], axis=0),
+            data.im.render(iscell != CellType.NON_ROI),
             output_dir=node_dirpath,
             file_name="cell_roi",
         ),
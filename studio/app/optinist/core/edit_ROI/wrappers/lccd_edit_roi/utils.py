@@ -8,10 +8,10 @@ def set_nwbfile(edit_roi_data: EditRoiData, iscell, function_id, fluorescence=No
 
     # NWBにROIを追加
     roi_list = []
-    n_cells = edit_roi_data.im.shape[0]
+    n_cells = len(edit_roi_data.im)
     for i in range(n_cells):
         kargs = {}
-        kargs["image_mask"] = edit_roi_data.im[i, :]
+        kargs["pixel_mask"] = edit_roi_data.im.pixel_mask(i)
         roi_list.append(kargs)
     nwbfile[NWBDATASET.ROI] = {function_id: roi_list}
 
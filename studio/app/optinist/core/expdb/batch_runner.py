@@ -2,17 +2,21 @@ import datetime
 import glob
 import logging
 import logging.config
+import multiprocessing
 import os
 import pathlib
+import sys
 import traceback
 from enum import Enum
+from multiprocessing.connection import wait
 
+import psutil
 import yaml
 from lauda import stopwatch
 from zc import lockfile
 
 from studio.app.common.core.users.crud_organizations import get_organization
-from studio.app.common.db.database import session_scope
+from studio.app.common.db.database import engine, session_scope
 from studio.app.dir_path import DIRPATH
 from studio.app.optinist.core.expdb.batch_unit import ExpDbBatch
 from studio.app.optinist.core.expdb.crud_cells import bulk_insert_cells
@@ -30,6 +34,12 @@ from studio.app.optinist.schemas.expdb.experiment import (
 LOCKFILE_NAME = "process.lock"
 FLAG_FILE_EXT = ".proc"
 
+# interval (sec) to check the memory usage (RSS) of the worker processes
+MEMORY_CHECK_INTERVAL = 5
+
+# thread pools (BLAS/OpenMP) sized per worker process
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
 
 class ProcessCommand(Enum):
     REGIST = "regist"
@@ -61,10 +71,27 @@ class ProcessResult:
 class ExpDbBatchRunner:
     LOGGER_NAME = None  # Note: use root logger (empty name)
 
-    def __init__(self, organization_id: int):
+    def __init__(
+        self,
+        organization_id: int,
+        workers: int = 1,
+        worker_memory_limit: float = None,
+        worker_threads: int = None,
+    ):
+        """
+        workers: number of datasets processed concurrently (in worker processes)
+        worker_memory_limit: memory limit (RSS) of each worker process (GB)
+        worker_threads: number of threads of each worker process
+            (default: number of cpus / workers)
+        """
         self.start_time = datetime.datetime.now()
         self.__init_logger()
         self.org_id = organization_id
+        self.workers = max(1, workers)
+        self.worker_memory_limit = worker_memory_limit
+        self.worker_threads = worker_threads or max(
+            1, (os.cpu_count() or 1) // self.workers
+        )
 
     def __init_logger(self):
         logging_config_file = DIRPATH.CONFIG_DIR + "/logging.expdb_batch.yaml"
@@ -187,59 +214,207 @@ class ExpDbBatchRunner:
             return processResult
 
         # 処理対象datasets検索：フラグファイルを走査
-        for flag_file in target_flag_files:
-            exp_id = self.__get_exp_id_from_flag_file(flag_file)
-            self.logger_.info(
-                "start process dataset: [exp_id: %s][flag_file: %s]", exp_id, flag_file
+        if self.workers > 1:
+            self.__process_datasets_parallel(target_flag_files, processResult)
+        else:
+            for flag_file in target_flag_files:
+                exp_id = self.__get_exp_id_from_flag_file(flag_file)
+                if self.__process_dataset(flag_file):
+                    processResult.success_ids.append(exp_id)
+                else:
+                    processResult.failure_ids.append(exp_id)
+
+        # datasets処理完了後の後処理:
+        with session_scope() as db:
+            # Summarize experiment metadata.
+            summarize_experiment_metadata(db)
+
+        return processResult
+
+    def __process_dataset(self, flag_file: str) -> bool:
+        """
+        Dataset処理（フラグファイル単位）
+        """
+
+        exp_id = self.__get_exp_id_from_flag_file(flag_file)
+        self.logger_.info(
+            "start process dataset: [exp_id: %s][flag_file: %s]", exp_id, flag_file
+        )
+        self.start_time = datetime.datetime.now()
+
+        error: Exception = None
+        command = None
+
+        # フラグファイル read
+        with open(flag_file) as cfile:
+            config = yaml.safe_load(cfile)
+
+        # 対象データフォルダ存在チェック
+        # データが存在しない場合はエラー扱いとし、次のデータ処理へスキップ
+
+        # コマンド判定
+        try:
+            command = config.get("command") if config is not None else None
+
+            if command == ProcessCommand.REGIST.value:
+                self.__process_dataset_registration(flag_file)
+            elif command == ProcessCommand.REGIST_METADATA.value:
+                self.__process_dataset_metadata_registration(flag_file)
+            elif command == ProcessCommand.DELETE.value:
+                self.__process_dataset_deletion(flag_file)
+            else:
+                raise ValueError(
+                    f"invalid command: [exp_id: {exp_id}][command: {command}]"
+                )
+
+        except Exception as e:
+            self.logger_.error("%s: %s\n%s", type(e), e, traceback.format_exc())
+            error = e
+
+        finally:
+            self.__process_dataset_postprocess(flag_file, command, error)
+
+            if error:
+                self.logger_.error("finish process dataset: [exp_id: %s]", exp_id)
+            else:
+                self.logger_.info("finish process dataset: [exp_id: %s]", exp_id)
+
+        return error is None
+
+    def __process_datasets_parallel(
+        self, target_flag_files: list, processResult: ProcessResult
+    ):
+        """
+        Dataset処理（並列実行）
+        - 各datasetを個別のworkerプロセスで処理し、最大 self.workers 件を同時実行する
+        - フラグファイルの後処理は、各workerプロセスで実施される
+        """
+
+        self.logger_.info("process datasets in parallel. [workers: %d]", self.workers)
+
+        context = multiprocessing.get_context("fork")
+        pending_flag_files = list(target_flag_files)
+        running_workers = {}
+        memory_exceeded_workers = set()
+
+        while pending_flag_files or running_workers:
+            while pending_flag_files and len(running_workers) < self.workers:
+                flag_file = pending_flag_files.pop(0)
+                worker = context.Process(
+                    target=self.__run_dataset_worker, args=(flag_file,)
+                )
+                worker.start()
+                running_workers[worker.sentinel] = (
+                    flag_file,
+                    worker,
+                    datetime.datetime.now(),
+                )
+
+            finished_sentinels = wait(
+                list(running_workers.keys()),
+                timeout=MEMORY_CHECK_INTERVAL if self.worker_memory_limit else None,
             )
-            self.start_time = datetime.datetime.now()
 
-            error: Exception = None
+            # workerプロセスのメモリ使用量(RSS)をチェックし、上限超過時は強制終了する
+            if self.worker_memory_limit:
+                for sentinel, (_, worker, _) in running_workers.items():
+                    if sentinel in finished_sentinels:
+                        continue
+                    if self.__terminate_worker_exceeding_memory(worker):
+                        memory_exceeded_workers.add(sentinel)
 
-            # フラグファイル read
-            with open(flag_file) as cfile:
-                config = yaml.safe_load(cfile)
+            for sentinel in finished_sentinels:
+                flag_file, worker, start_time = running_workers.pop(sentinel)
+                worker.join()
+                exp_id = self.__get_exp_id_from_flag_file(flag_file)
 
-            # 対象データフォルダ存在チェック
-            # データが存在しない場合はエラー扱いとし、次のデータ処理へスキップ
+                if worker.exitcode == 0:
+                    processResult.success_ids.append(exp_id)
+                    continue
 
-            # コマンド判定
-            try:
-                command = config.get("command") if config is not None else None
-
-                if command == ProcessCommand.REGIST.value:
-                    self.__process_dataset_registration(flag_file)
-                elif command == ProcessCommand.REGIST_METADATA.value:
-                    self.__process_dataset_metadata_registration(flag_file)
-                elif command == ProcessCommand.DELETE.value:
-                    self.__process_dataset_deletion(flag_file)
-                else:
-                    raise ValueError(
-                        f"invalid command: [exp_id: {exp_id}][command: {command}]"
+                processResult.failure_ids.append(exp_id)
+
+                # workerプロセスが異常終了した場合（メモリ超過による強制終了等）、
+                # フラグファイルの後処理をここで実施する
+                if os.path.isfile(flag_file):
+                    if sentinel in memory_exceeded_workers:
+                        error = MemoryError(
+                            "worker process exceeded the memory limit."
+                            f" [limit: {self.worker_memory_limit} GB]"
+                        )
+                    else:
+                        error = RuntimeError(
+                            f"worker process terminated. [exitcode: {worker.exitcode}]"
+                        )
+                    self.logger_.error(
+                        "finish process dataset: [exp_id: %s] %s", exp_id, error
                     )
 
-                processResult.success_ids.append(exp_id)
+                    with open(flag_file) as cfile:
+                        config = yaml.safe_load(cfile)
+                    command = config.get("command") if config is not None else None
 
-            except Exception as e:
-                self.logger_.error("%s: %s\n%s", type(e), e, traceback.format_exc())
-                error = e
+                    self.start_time = start_time
+                    self.__process_dataset_postprocess(flag_file, command, error)
 
-                processResult.failure_ids.append(exp_id)
+                memory_exceeded_workers.discard(sentinel)
+
+    def __terminate_worker_exceeding_memory(
+        self, worker: multiprocessing.Process
+    ) -> bool:
+        """
+        workerプロセス（およびその子プロセス）の合計RSSが上限を超えた場合に強制終了する
+        - 仮想メモリ(RLIMIT_AS)ではなくRSSで判定する
+          （memmap や BLAS/OpenMP のスレッド領域による仮想メモリの確保で失敗させない）
+        """
 
-            finally:
-                self.__process_dataset_postprocess(flag_file, command, error)
+        try:
+            process = psutil.Process(worker.pid)
+            processes = [process] + process.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return False
 
-                if error:
-                    self.logger_.error("finish process dataset: [exp_id: %s]", exp_id)
-                else:
-                    self.logger_.info("finish process dataset: [exp_id: %s]", exp_id)
+        rss = 0
+        for p in processes:
+            try:
+                rss += p.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+
+        limit = int(self.worker_memory_limit * 1024**3)
+        if rss <= limit:
+            return False
+
+        self.logger_.error(
+            "worker process exceeded the memory limit. [pid: %d][rss: %d][limit: %d]",
+            worker.pid,
+            rss,
+            limit,
+        )
+        for p in reversed(processes):
+            try:
+                p.kill()
+            except psutil.NoSuchProcess:
+                pass
 
-        # datasets処理完了後の後処理:
-        with session_scope() as db:
-            # Summarize experiment metadata.
-            summarize_experiment_metadata(db)
+        return True
 
-        return processResult
+    def __run_dataset_worker(self, flag_file: str):
+        """
+        Dataset処理 workerプロセスのエントリポイント
+        """
+
+        # 親プロセスのDBコネクションは共有しない
+        engine.dispose(close=False)
+
+        # workerプロセスごとのスレッド数を制限する
+        # （workerプロセス内でloadされるライブラリ、起動される子プロセスに適用される）
+        for name in THREAD_ENV_VARS:
+            os.environ[name] = str(self.worker_threads)
+
+        success = self.__process_dataset(flag_file)
+
+        sys.exit(0 if success else 1)
 
     @stopwatch(callback=__stopwatch_callback)
     def __search_target_datasets(self) -> list:
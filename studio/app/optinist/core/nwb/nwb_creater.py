@@ -1,7 +1,14 @@
+import hashlib
+import json
+import mmap
 import os
+import pickle
 import shutil
 from datetime import datetime
+from types import SimpleNamespace
 
+import h5py
+import numpy as np
 from dateutil.tz import tzlocal
 from pynwb import NWBHDF5IO, NWBFile
 from pynwb.ophys import (
@@ -16,6 +23,7 @@ from pynwb.ophys import (
     TwoPhotonSeries,
 )
 
+from studio.app.common.core.utils.pickle_handler import NodeArrayStore
 from studio.app.optinist.core.nwb.device_metadata import (
     DeviceMetaData,
     ImagingMetaData,
@@ -51,6 +59,10 @@ from studio.app.optinist.core.nwb.subject.mouse import (
 )
 from studio.app.optinist.core.nwb.subject.mouse import SubjectMouse
 
+# the unused space (bytes, and ratio to the file size) to repack the NWB file
+REPACK_MIN_NBYTES = 64 * 1024 * 1024
+REPACK_RATIO = 0.25
+
 
 class NWBCreater:
     @classmethod
@@ -629,6 +641,297 @@ def overwrite_nwbfile(save_path, config):
     os.remove(tmp_save_path)
 
 
+class NWBConfigIndex:
+    """
+    Index of the config entries written to an NWB file,
+    kept as a json file next to it.
+
+    Each entry (e.g. the ROI of a function) is recorded with the digest of
+    its content, so that the entries already written to the file can be
+    detected without reading the file itself.
+    """
+
+    SUFFIX = ".index.json"
+
+    # patterns whose entries are keyed by function_id
+    FUNCTION_PATTERNS = [
+        NWBDATASET.POSTPROCESS,
+        NWBDATASET.TIMESERIES,
+        NWBDATASET.BEHAVIOR,
+        NWBDATASET.MOTION_CORRECTION,
+        NWBDATASET.ROI,
+        NWBDATASET.COLUMN,
+        NWBDATASET.FLUORESCENCE,
+    ]
+    # patterns written as a single entry
+    SINGLE_PATTERNS = [
+        NWBDATASET.ORISTATS,
+        NWBDATASET.LAB_METADATA,
+    ]
+
+    def __init__(self, nwb_path):
+        self.index_path = nwb_path + self.SUFFIX
+
+    def read(self):
+        if not os.path.exists(self.index_path):
+            return None
+
+        with open(self.index_path) as f:
+            return json.load(f)
+
+    def write(self, entries: dict):
+        with open(self.index_path, "w") as f:
+            json.dump(entries, f)
+
+    def remove(self):
+        if os.path.exists(self.index_path):
+            os.remove(self.index_path)
+
+    @classmethod
+    def get_entries(cls, config: dict) -> dict:
+        entries = {}
+        for pattern in cls.FUNCTION_PATTERNS:
+            for function_id, value in config.get(pattern, {}).items():
+                entries[f"{pattern}/{function_id}"] = cls.digest(value)
+        for pattern in cls.SINGLE_PATTERNS:
+            if pattern in config:
+                entries[pattern] = cls.digest(config[pattern])
+
+        return entries
+
+    @classmethod
+    def get_update_keys(cls, entries: dict, written_entries: dict) -> list:
+        """
+        Keys of the entries new or changed from the written ones.
+        The ROIs of a function are updated along with their columns
+        and fluorescence, which are stored in (or refer to) the ROI table.
+        """
+        update_keys = [k for k, v in entries.items() if written_entries.get(k) != v]
+
+        roi_patterns = [NWBDATASET.ROI, NWBDATASET.COLUMN, NWBDATASET.FLUORESCENCE]
+        for key in list(update_keys):
+            pattern, _, function_id = key.partition("/")
+            if pattern in roi_patterns:
+                for related_key in [f"{p}/{function_id}" for p in roi_patterns]:
+                    if related_key in entries and related_key not in update_keys:
+                        update_keys.append(related_key)
+
+        return update_keys
+
+    @classmethod
+    def filter_config(cls, config: dict, entry_keys) -> dict:
+        filtered_config = {}
+        for key in entry_keys:
+            if key in cls.SINGLE_PATTERNS:
+                filtered_config[key] = config[key]
+            else:
+                pattern, function_id = key.split("/", 1)
+                filtered_config.setdefault(pattern, {})[function_id] = config[pattern][
+                    function_id
+                ]
+
+        return filtered_config
+
+    @staticmethod
+    def digest(value) -> str:
+        hash = hashlib.blake2b(digest_size=16)
+        _DigestPickler(hash).dump(value)
+        return hash.hexdigest()
+
+
+class _DigestPickler(pickle.Pickler):
+    def __init__(self, hash):
+        super().__init__(SimpleNamespace(write=hash.update), protocol=5)
+
+    def persistent_id(self, obj):
+        # arrays of node results are memory-mapped from write-once sidecar files,
+        # so identify them by the file instead of reading their whole content.
+        if (
+            isinstance(obj, np.memmap)
+            and isinstance(obj.base, mmap.mmap)
+            and os.path.dirname(obj.filename).endswith(NodeArrayStore.DIR_SUFFIX)
+        ):
+            return (obj.filename, obj.offset, obj.shape, obj.strides, obj.dtype.str)
+        return None
+
+
+def is_appendable_nwbconfig(nwbfile, config) -> bool:
+    """
+    Check that the config only adds new containers to the nwbfile.
+    (existing containers cannot be replaced in append mode)
+    """
+    if NWBDATASET.LAB_METADATA in config:
+        return False
+
+    ophys = nwbfile.processing["ophys"].data_interfaces
+    optinist = nwbfile.processing["optinist"].data_interfaces
+    plane_segs = ophys["ImageSegmentation"].plane_segmentations
+
+    names = []
+    for function_id, data in config.get(NWBDATASET.POSTPROCESS, {}).items():
+        names += [(optinist, f"{function_id}_{key}") for key in data]
+    for key in config.get(NWBDATASET.TIMESERIES, {}):
+        names.append((ophys, key))
+    for key in config.get(NWBDATASET.BEHAVIOR, {}):
+        names.append((optinist, key))
+    for function_id in config.get(NWBDATASET.MOTION_CORRECTION, {}):
+        names.append((nwbfile.processing, function_id))
+    for function_id in config.get(NWBDATASET.ROI, {}):
+        names += [(plane_segs, function_id), (ophys, function_id)]
+    for function_id in config.get(NWBDATASET.FLUORESCENCE, {}):
+        names.append((ophys, function_id))
+    if NWBDATASET.ORISTATS in config:
+        names.append((nwbfile.analysis, ORISTATS_NWB_ATTR_NAME))
+
+    # columns can only be added to the plane segmentations created here
+    for function_id in config.get(NWBDATASET.COLUMN, {}):
+        if function_id not in config.get(NWBDATASET.ROI, {}):
+            return False
+
+    return not any(name in container for container, name in names)
+
+
+def append_nwbfile(save_path, config) -> bool:
+    """
+    Append the config to the existing NWB file in place.
+    Returns False (without writing) if the config is not appendable.
+    """
+    with NWBHDF5IO(save_path, "a") as io:
+        nwbfile = io.read()
+        if not is_appendable_nwbconfig(nwbfile, config):
+            return False
+
+        nwbfile = set_nwbconfig(nwbfile, config)
+        io.write(nwbfile)
+
+    return True
+
+
+def replace_nwbfile(save_path, config) -> bool:
+    """
+    Replace the entries of the config in the existing NWB file in place,
+    by removing their containers and appending them again.
+    Returns False if the entries cannot be replaced, in which case
+    the file has to be re-exported with the config (`overwrite_nwbfile`).
+
+    Note: the space of the removed containers is not reclaimed by HDF5,
+    so the file is re-exported once the unused space exceeds the threshold
+    (`repack_nwbfile`).
+    """
+    if NWBDATASET.LAB_METADATA in config or NWBDATASET.ORISTATS in config:
+        return False
+
+    rois = config.get(NWBDATASET.ROI, {})
+    fluorescences = config.get(NWBDATASET.FLUORESCENCE, {})
+
+    # columns can only be added to the plane segmentations created here
+    if any(
+        function_id not in rois for function_id in config.get(NWBDATASET.COLUMN, {})
+    ):
+        return False
+
+    paths = []
+    for function_id in rois:
+        paths.append(f"processing/ophys/ImageSegmentation/{function_id}")
+    for function_id in fluorescences:
+        paths.append(f"processing/ophys/{function_id}")
+    for function_id, data in config.get(NWBDATASET.POSTPROCESS, {}).items():
+        paths += [f"processing/optinist/{function_id}_{key}" for key in data]
+
+    with h5py.File(save_path, "a") as f:
+        # the fluorescence refers to the ROIs, so is replaced along with them
+        if any(
+            f"processing/ophys/{function_id}" in f
+            for function_id in rois
+            if function_id not in fluorescences
+        ):
+            return False
+
+        for path in paths:
+            if path in f:
+                del f[path]
+
+    if not append_nwbfile(save_path, config):
+        return False
+
+    repack_nwbfile(save_path)
+    return True
+
+
+def get_unused_nbytes(save_path) -> int:
+    """
+    The space of the NWB file not used by the datasets
+    (the removed containers, and the metadata).
+    """
+    used_nbytes = 0
+
+    def add_storage_size(name, obj):
+        nonlocal used_nbytes
+        if isinstance(obj, h5py.Dataset):
+            used_nbytes += obj.id.get_storage_size()
+
+    with h5py.File(save_path, "r") as f:
+        f.visititems(add_storage_size)
+
+    return os.path.getsize(save_path) - used_nbytes
+
+
+def repack_nwbfile(save_path) -> bool:
+    """
+    Re-export the NWB file to reclaim the space of the removed containers,
+    if it exceeds the threshold. Returns True if the file is re-exported.
+    """
+    unused_nbytes = get_unused_nbytes(save_path)
+    if unused_nbytes < max(
+        REPACK_MIN_NBYTES, REPACK_RATIO * os.path.getsize(save_path)
+    ):
+        return False
+
+    overwrite_nwbfile(save_path, {})
+    return True
+
+
+def update_nwbfile(save_path, input_config, config):
+    """
+    Save the config to the NWB file incrementally.
+
+    Only the entries not yet written to the file are appended in place,
+    and the changed entries (e.g. workflow re-run, ROI edit) are replaced
+    in place. The whole file is re-exported only when it is unavoidable.
+    """
+    index = NWBConfigIndex(save_path)
+    entries = NWBConfigIndex.get_entries(config)
+
+    if not os.path.exists(save_path):
+        save_nwb(save_path, input_config, config)
+        index.write(entries)
+        return
+
+    written_entries = index.read()
+
+    if written_entries is None:
+        # the contents of the file are unknown
+        overwrite_nwbfile(save_path, config)
+        written_entries = {}
+    else:
+        update_keys = NWBConfigIndex.get_update_keys(entries, written_entries)
+        if not update_keys:
+            return
+
+        # the index is invalid until the update completes
+        index.remove()
+        update_config = NWBConfigIndex.filter_config(config, update_keys)
+        if any(key in written_entries for key in update_keys):
+            is_updated = replace_nwbfile(save_path, update_config)
+        else:
+            is_updated = append_nwbfile(save_path, update_config)
+
+        if not is_updated:
+            overwrite_nwbfile(save_path, config)
+
+    index.write({**written_entries, **entries})
+
+
 def overwrite_nwb(config, save_path, nwb_file_name):
     # バックアップファイルを作成
     nwb_path = os.path.join(save_path, nwb_file_name)
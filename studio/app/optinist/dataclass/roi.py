@@ -1,5 +1,5 @@
 import gc
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import imageio
 import numpy as np
@@ -30,14 +30,19 @@ class RoiData(BaseData):
         super().__init__(file_name)
         self.meta = meta
 
-        images = create_images_list(data)
+        data = np.asarray(data)
+        assert data.ndim == 2, "data is error"
 
         _dir = join_filepath([output_dir, "tiff", file_name])
         create_directory(_dir)
         self.path = join_filepath([_dir, f"{file_name}.tif"])
-        tifffile.imsave(self.path, images)
 
-        del images, data
+        # float64, as the images formerly written as python lists by tifffile
+        tifffile.imsave(
+            self.path, data[np.newaxis, :, :].astype(np.float64, copy=False)
+        )
+
+        del data
         gc.collect()
 
     @property
@@ -58,9 +63,218 @@ class RoiData(BaseData):
         return OutputPath(path=self.json_path, type=OutputType.ROI)
 
 
+class RoiMasks:
+    """
+    Sparse masks of ROIs on an image of (height, width).
+
+    Each ROI is held as a pixel list, i.e. flat pixel indices (row * width + col)
+    and their weights, so that the operations on ROIs are O(pixels of the ROIs)
+    instead of O(number of ROIs * image size) for a dense (n_rois, H, W) stack.
+    """
+
+    def __init__(self, shape: Tuple[int, int]):
+        self.shape = tuple(int(v) for v in shape)
+        self.pixels: List[np.ndarray] = []
+        self.weights: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return len(self.pixels)
+
+    @classmethod
+    def from_masks(cls, masks, shape: Tuple[int, int]) -> "RoiMasks":
+        """
+        Create from 2D masks of ROIs (non-zero pixels belong to the ROI).
+        """
+        roi_masks = cls(shape)
+        for mask in masks:
+            roi_masks.append(np.asarray(mask) != 0)
+        return roi_masks
+
+    @classmethod
+    def from_matrix(cls, matrix, shape: Tuple[int, int]) -> "RoiMasks":
+        """
+        Create from a (n_rois, H * W) matrix (dense or scipy.sparse) of weights.
+        """
+        from scipy.sparse import csr_matrix
+
+        matrix = csr_matrix(matrix)
+        matrix.eliminate_zeros()
+        roi_masks = cls(shape)
+        for i in range(matrix.shape[0]):
+            start, stop = matrix.indptr[i], matrix.indptr[i + 1]
+            roi_masks.append_pixels(matrix.indices[start:stop], matrix.data[start:stop])
+        return roi_masks
+
+    @classmethod
+    def from_pixels(cls, ypixs, xpixs, shape: Tuple[int, int]) -> "RoiMasks":
+        roi_masks = cls(shape)
+        for ypix, xpix in zip(ypixs, xpixs):
+            roi_masks.append_pixels(np.ravel_multi_index((ypix, xpix), shape))
+        return roi_masks
+
+    @classmethod
+    def from_dense(cls, im: np.ndarray) -> "RoiMasks":
+        """
+        Create from a dense (n_rois, H, W) stack padded with NaN.
+        """
+        return cls.from_masks(~np.isnan(im), im.shape[1:])
+
+    def append_pixels(self, pixels, weights=None) -> int:
+        pixels = np.asarray(pixels, dtype=np.int32)
+        weights = (
+            np.ones(pixels.shape, dtype=np.float32)
+            if weights is None
+            else np.asarray(weights, dtype=np.float32)
+        )
+        self.pixels.append(pixels)
+        self.weights.append(weights)
+        return len(self) - 1
+
+    def append(self, mask: np.ndarray) -> int:
+        """
+        Append a ROI of boolean 2D mask, and return its index.
+        """
+        return self.append_pixels(np.flatnonzero(mask))
+
+    def merge(self, ids: List[int]) -> int:
+        """
+        Append the union of ROIs of ids, and return its index.
+        """
+        return self.append_pixels(np.unique(np.concatenate(self.get_pixels(ids))))
+
+    def truncate(self, num_rois: int):
+        del self.pixels[num_rois:]
+        del self.weights[num_rois:]
+
+    def get_ids(self, ids=None) -> np.ndarray:
+        # ids may be given as indices or a boolean mask of ROIs
+        return np.arange(len(self)) if ids is None else np.arange(len(self))[ids]
+
+    def get_pixels(self, ids=None) -> List[np.ndarray]:
+        return [self.pixels[i] for i in self.get_ids(ids)]
+
+    def get_mask(self, id: int) -> np.ndarray:
+        mask = np.zeros(self.shape, dtype=bool)
+        mask.flat[self.pixels[id]] = True
+        return mask
+
+    def render(self, ids=None) -> np.ndarray:
+        """
+        Render ROIs of ids to an image, whose pixels are the (largest) index of
+        the ROIs they belong to, and NaN outside of the ROIs.
+        (the same as `np.nanmax` of the dense NaN-padded stack)
+        """
+        ids = self.get_ids(ids)
+        image = np.full(self.shape[0] * self.shape[1], -1.0)
+        if len(ids) > 0:
+            pixels = np.concatenate([self.pixels[i] for i in ids])
+            values = np.repeat(ids, [len(self.pixels[i]) for i in ids])
+            np.maximum.at(image, pixels, values)
+        image[image < 0] = np.nan
+        return image.reshape(self.shape)
+
+    def pixel_mask(self, id: int) -> np.ndarray:
+        """
+        NWB pixel_mask of the ROI, as rows of (x, y, weight).
+        """
+        y, x = np.unravel_index(self.pixels[id], self.shape)
+        return np.column_stack((x, y, self.weights[id]))
+
+    def to_pixel_table(self) -> np.ndarray:
+        """
+        Pixels of all ROIs, as rows of (x, y, roi index).
+        """
+        ids = self.get_ids()
+        pixels = np.concatenate([np.zeros(0, dtype=np.int32), *self.pixels])
+        y, x = np.unravel_index(pixels, self.shape)
+        values = np.repeat(ids, [len(p) for p in self.pixels])
+        return np.column_stack((x, y, values))
+
+    def to_dense(self) -> np.ndarray:
+        im = np.full((len(self), *self.shape), np.nan)
+        for i, pixels in enumerate(self.pixels):
+            im[i].flat[pixels] = i
+        return im
+
+
+class MovieRef:
+    """
+    Reference to a (t, y, x) movie file, held instead of the movie data itself.
+
+    kind:
+      - "tiff": TIFF file(s), as ImageData
+      - "caiman_mmap": CaImAn memmap file of float32 (y * x, t),
+        whose pixels are in Fortran order
+    """
+
+    TIFF = "tiff"
+    CAIMAN_MMAP = "caiman_mmap"
+
+    # frames read at once for the trace extraction
+    BLOCK_FRAMES = 1000
+
+    def __init__(self, path, shape: tuple, dtype, kind: str = TIFF):
+        self.path = path
+        self.shape = tuple(int(v) for v in shape)
+        self.dtype = np.dtype(dtype).str
+        self.kind = kind
+
+    @classmethod
+    def from_image(cls, image: ImageData) -> "MovieRef":
+        return cls(image.path, image.shape, image.dtype)
+
+    @classmethod
+    def from_caiman_mmap(cls, mmap_path: str, shape: tuple) -> "MovieRef":
+        return cls(mmap_path, shape, np.float32, kind=cls.CAIMAN_MMAP)
+
+    def extract_traces(self, roi_masks: RoiMasks, ids) -> np.ndarray:
+        """
+        Mean traces (len(ids), t) of ROIs of ids, streaming over the movie
+        in blocks of frames, as sparse (ROIs x pixels) mask matrix products.
+        """
+        from scipy.sparse import csr_matrix
+
+        ids = roi_masks.get_ids(ids)
+        nframes = self.shape[0]
+        traces = np.zeros((len(ids), nframes))
+        pixels = roi_masks.get_pixels(ids)
+        if len(ids) == 0:
+            return traces
+
+        # mask matrix over the pixels used by the ROIs only
+        used_pixels, columns = np.unique(np.concatenate(pixels), return_inverse=True)
+        counts = np.array([len(p) for p in pixels])
+        masks = csr_matrix(
+            (
+                np.repeat(1 / np.maximum(counts, 1), counts),
+                (np.repeat(np.arange(len(ids)), counts), columns),
+            ),
+            shape=(len(ids), len(used_pixels)),
+        )
+
+        if self.kind == self.CAIMAN_MMAP:
+            height, width = self.shape[1:]
+            movie = np.memmap(
+                self.path, dtype=self.dtype, mode="r", shape=(height * width, nframes)
+            )
+            y, x = np.unravel_index(used_pixels, (height, width))
+            used_pixels = np.ravel_multi_index((y, x), (height, width), order="F")
+            for start in range(0, nframes, self.BLOCK_FRAMES):
+                stop = min(start + self.BLOCK_FRAMES, nframes)
+                traces[:, start:stop] = masks @ movie[used_pixels, start:stop]
+        else:
+            image = ImageData(self.path)
+            for start in range(0, nframes, self.BLOCK_FRAMES):
+                frames = image.frames(start, start + self.BLOCK_FRAMES)
+                frames = frames.reshape(len(frames), -1)[:, used_pixels]
+                traces[:, start : start + len(frames)] = masks @ frames.T
+
+        return traces
+
+
 class EditRoiData(BaseData):
-    def __init__(self, images, im):
-        self.images: ImageData = images
+    def __init__(self, images: MovieRef, im: RoiMasks):
+        self.images: MovieRef = images
         self.im = im
         self.temp_add_roi: Dict[int, RoiPos] = {}
         self.temp_merge_roi: Dict[float, List[int]] = {}
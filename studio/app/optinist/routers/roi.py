@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 
 from studio.app.common.core.logger import AppLogger
 from studio.app.common.core.workspace.workspace_dependencies import is_workspace_owner
-from studio.app.optinist.core.edit_ROI import EditROI, EditRoiUtils
+from studio.app.optinist.core.edit_ROI import EditRoiSessions, EditRoiUtils
 from studio.app.optinist.schemas.roi import RoiList, RoiPos, RoiStatus
 
 router = APIRouter(prefix="/outputs", tags=["outputs"])
@@ -16,7 +16,7 @@ logger = AppLogger.get_logger()
     dependencies=[Depends(is_workspace_owner)],
 )
 async def status_roi(filepath: str):
-    return EditROI(file_path=filepath).get_status()
+    return EditRoiSessions.get(filepath).get_status()
 
 
 @router.post(
@@ -25,7 +25,8 @@ async def status_roi(filepath: str):
     dependencies=[Depends(is_workspace_owner)],
 )
 async def add_roi(filepath: str, pos: RoiPos):
-    EditROI(file_path=filepath).add(pos)
+    with EditRoiSessions.edit(filepath) as edit_roi:
+        edit_roi.add(pos)
     return True
 
 
@@ -35,7 +36,8 @@ async def add_roi(filepath: str, pos: RoiPos):
     dependencies=[Depends(is_workspace_owner)],
 )
 async def merge_roi(filepath: str, roi_list: RoiList):
-    EditROI(file_path=filepath).merge(roi_list.ids)
+    with EditRoiSessions.edit(filepath) as edit_roi:
+        edit_roi.merge(roi_list.ids)
     return True
 
 
@@ -45,7 +47,8 @@ async def merge_roi(filepath: str, roi_list: RoiList):
     dependencies=[Depends(is_workspace_owner)],
 )
 async def delete_roi(filepath: str, roi_list: RoiList):
-    EditROI(file_path=filepath).delete(roi_list.ids)
+    with EditRoiSessions.edit(filepath) as edit_roi:
+        edit_roi.delete(roi_list.ids)
     return True
 
 
@@ -56,6 +59,8 @@ async def delete_roi(filepath: str, roi_list: RoiList):
 )
 async def commit_edit(filepath: str):
     try:
+        # the commit process reads the edits from the tmp pickle
+        EditRoiSessions.close(filepath)
         EditRoiUtils.execute(filepath)
 
     except Exception as e:
@@ -74,5 +79,6 @@ async def commit_edit(filepath: str):
     dependencies=[Depends(is_workspace_owner)],
 )
 async def cancel_edit(filepath: str):
-    EditROI(file_path=filepath).cancel()
+    EditRoiSessions.get(filepath).cancel()
+    EditRoiSessions.close(filepath, save=False)
     return True
@@ -12,7 +12,14 @@ from studio.app.common.core.utils.filepath_creater import (
 )
 from studio.app.common.dataclass import ImageData
 from studio.app.optinist.core.nwb.nwb import NWBDATASET
-from studio.app.optinist.dataclass import EditRoiData, FluoData, IscellData, RoiData
+from studio.app.optinist.dataclass import (
+    EditRoiData,
+    FluoData,
+    IscellData,
+    MovieRef,
+    RoiData,
+    RoiMasks,
+)
 
 logger = AppLogger.get_logger()
 
@@ -247,28 +254,22 @@ def caiman_cnmf(
     cell_ims = get_roi(
         cnm.estimates.A[:, idx_good], roi_thr, thr_method, swap_dim, dims
     )
-    cell_ims = np.stack(cell_ims).astype(float)
-    cell_ims[cell_ims == 0] = np.nan
-    cell_ims -= 1
     n_rois = len(cell_ims)
 
     if len(idx_bad) > 0:
         non_cell_ims = get_roi(
             cnm.estimates.A[:, idx_bad], roi_thr, thr_method, swap_dim, dims
         )
-        non_cell_ims = np.stack(non_cell_ims).astype(float)
-        for i, j in enumerate(range(n_rois, n_rois + len(non_cell_ims))):
-            non_cell_ims[i, :] = np.where(non_cell_ims[i, :] != 0, j, 0)
-        non_cell_roi = np.nanmax(non_cell_ims, axis=0).astype(float)
     else:
-        non_cell_ims = np.zeros((0, *dims))
-        non_cell_roi = np.zeros(dims)
-        non_cell_roi[non_cell_roi == 0] = np.nan
-    non_cell_ims[non_cell_ims == 0] = np.nan
+        non_cell_ims = []
 
     n_noncell_rois = len(non_cell_ims)
 
-    im = np.vstack([cell_ims, non_cell_ims])
+    im = RoiMasks.from_masks(cell_ims + non_cell_ims, dims)
+    non_cell_roi = im.render(iscell == 0)
+
+    # ROI footprints (weights) of NWB
+    footprints = RoiMasks.from_matrix(cnm.estimates.A.T, dims)
 
     # NWBの追加
     nwbfile = {}
@@ -277,7 +278,7 @@ def caiman_cnmf(
     n_cells = cnm.estimates.A.shape[-1]
     for i in range(n_cells):
         kargs = {}
-        kargs["image_mask"] = cnm.estimates.A.T[i].T.toarray().reshape(dims)
+        kargs["pixel_mask"] = footprints.pixel_mask(i)
         if hasattr(cnm.estimates, "accepted_list"):
             kargs["accepted"] = i in cnm.estimates.accepted_list
         if hasattr(cnm.estimates, "rejected_list"):
@@ -285,7 +286,9 @@ def caiman_cnmf(
         roi_list.append(kargs)
 
     nwbfile[NWBDATASET.ROI] = {function_id: roi_list}
-    nwbfile[NWBDATASET.POSTPROCESS] = {function_id: {"all_roi_img": im}}
+    nwbfile[NWBDATASET.POSTPROCESS] = {
+        function_id: {"all_roi_pixel_mask": im.to_pixel_table()}
+    }
 
     # iscellを追加
     nwbfile[NWBDATASET.COLUMN] = {
@@ -319,18 +322,18 @@ def caiman_cnmf(
         ),
         "fluorescence": FluoData(fluorescence, file_name="fluorescence"),
         "iscell": IscellData(iscell, file_name="iscell"),
-        "all_roi": RoiData(
-            np.nanmax(im, axis=0), output_dir=output_dir, file_name="all_roi"
-        ),
+        "all_roi": RoiData(im.render(), output_dir=output_dir, file_name="all_roi"),
         "cell_roi": RoiData(
-            np.nanmax(im[iscell != 0], axis=0),
+            im.render(iscell != 0),
             output_dir=output_dir,
             file_name="cell_roi",
         ),
         "non_cell_roi": RoiData(
             non_cell_roi, output_dir=output_dir, file_name="non_cell_roi"
         ),
-        "edit_roi_data": EditRoiData(mmap_images, im),
+        "edit_roi_data": EditRoiData(
+            MovieRef.from_caiman_mmap(mmap_path, mmap_images.shape), im
+        ),
         "nwbfile": nwbfile,
     }
 
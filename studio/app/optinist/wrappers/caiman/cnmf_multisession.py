@@ -7,7 +7,14 @@ from studio.app.common.core.experiment.experiment import ExptOutputPathIds
 from studio.app.common.core.logger import AppLogger
 from studio.app.common.dataclass import ImageData
 from studio.app.optinist.core.nwb.nwb import NWBDATASET
-from studio.app.optinist.dataclass import EditRoiData, FluoData, IscellData, RoiData
+from studio.app.optinist.dataclass import (
+    EditRoiData,
+    FluoData,
+    IscellData,
+    MovieRef,
+    RoiData,
+    RoiMasks,
+)
 from studio.app.optinist.wrappers.caiman.cnmf import (
     get_roi,
     util_download_model_files,
@@ -147,10 +154,11 @@ def caiman_cnmf_multisession(
     iscell = np.concatenate([np.ones(assignments_filtered.shape[0], dtype=int)])
 
     cell_ims = get_roi(spatial_filtered, roi_thr, thr_method, swap_dim, dims)
-    cell_ims = np.stack(cell_ims).astype(float)
-    cell_ims[cell_ims == 0] = np.nan
-    cell_ims -= 1
     n_rois = len(cell_ims)
+    cell_ims = RoiMasks.from_masks(cell_ims, dims)
+
+    # ROI footprints (weights) of NWB
+    footprints = RoiMasks.from_matrix(spatial_filtered.T, dims)
 
     # NWBの追加
     nwbfile = {}
@@ -159,11 +167,13 @@ def caiman_cnmf_multisession(
     n_cells = spatial_filtered.shape[-1]
     for i in range(n_cells):
         kargs = {}
-        kargs["image_mask"] = spatial_filtered.T[i].T.toarray().reshape(dims)
+        kargs["pixel_mask"] = footprints.pixel_mask(i)
         roi_list.append(kargs)
 
     nwbfile[NWBDATASET.ROI] = {function_id: roi_list}
-    nwbfile[NWBDATASET.POSTPROCESS] = {function_id: {"all_roi_img": cell_ims}}
+    nwbfile[NWBDATASET.POSTPROCESS] = {
+        function_id: {"all_roi_pixel_mask": cell_ims.to_pixel_table()}
+    }
 
     # iscellを追加
     nwbfile[NWBDATASET.COLUMN] = {
@@ -193,7 +203,7 @@ def caiman_cnmf_multisession(
     if isinstance(file_path, list):
         file_path = file_path[0]
     images = images.data
-    mmap_images, dims, _ = util_get_memmap(images.data, file_path)
+    mmap_images, dims, mmap_path = util_get_memmap(images.data, file_path)
 
     Cn = local_correlations(mmap_images.transpose(1, 2, 0))
     Cn[np.isnan(Cn)] = 0
@@ -207,11 +217,13 @@ def caiman_cnmf_multisession(
         "fluorescence": FluoData(fluorescence, file_name="fluorescence"),
         "iscell": IscellData(iscell, file_name="iscell"),
         "cell_roi": RoiData(
-            np.nanmax(cell_ims[iscell != 0], axis=0),
+            cell_ims.render(iscell != 0),
             output_dir=output_dir,
             file_name="cell_roi",
         ),
-        "edit_roi_data": EditRoiData(mmap_images, cell_ims),
+        "edit_roi_data": EditRoiData(
+            MovieRef.from_caiman_mmap(mmap_path, mmap_images.shape), cell_ims
+        ),
         "nwbfile": nwbfile,
     }
 
@@ -50,7 +50,8 @@ def caiman_mc(
     # now load the file
     Yr, dims, T = load_memmap(fname_new)
 
-    images = np.array(Yr.T.reshape((T,) + dims, order="F"))
+    # (t, y, x) view of the memmap, without loading the whole movie
+    images = Yr.T.reshape((T,) + dims, order="F")
 
     meanImg, rois = __process_images(images)
 
@@ -60,7 +61,13 @@ def caiman_mc(
         else np.array(mc.shifts_rig)
     )
 
-    mc_images = ImageData(images, output_dir=output_dir, file_name="mc_images")
+    mc_images = ImageData.from_frames(
+        __iter_frames(Yr, dims, T),
+        (T,) + dims,
+        Yr.dtype,
+        output_dir=output_dir,
+        file_name="mc_images",
+    )
 
     nwbfile = {}
     nwbfile[NWBDATASET.MOTION_CORRECTION] = {
@@ -82,6 +89,18 @@ def caiman_mc(
     return info
 
 
+def __iter_frames(Yr, dims, T, chunk_size=1000):
+    """
+    Yield (y, x) frames from the pixel-major (d, T) memmap,
+    reading it in chunks of frames rather than one strided pass per frame.
+    """
+    import numpy as np
+
+    for start in range(0, T, chunk_size):
+        chunk = np.asarray(Yr[:, start : start + chunk_size])
+        yield from chunk.T.reshape((-1,) + dims, order="F")
+
+
 def __process_images(images):
     import numpy as np
     from caiman.base.rois import extract_binary_masks_from_structural_channel
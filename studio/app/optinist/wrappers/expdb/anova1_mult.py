@@ -4,18 +4,67 @@ from studio.app.optinist.core.nwb.nwb import NWBDATASET
 from studio.app.optinist.dataclass import StatData
 
 
-def multi_compare(data):
-    from scipy.stats import tukey_hsd
-
-    _, size = data.shape
-    tukey = tukey_hsd(*data.T).confidence_interval()
-    sig = tukey.high * tukey.low
-    sig[range(size), range(size)] = 0
+def anova1_cells(data):
+    """
+    One-way ANOVA of the groups (stims) of each cell,
+    for data of (cells, trials, groups), the same as
+    `f_oneway(*data[i].T)` of each cell i.
+    Returns F, pvalue (cells,) and the mean square within groups (cells,).
+    """
+    from scipy.stats import f
+
+    _, ntrials, ngroups = data.shape
+    df_between = ngroups - 1
+    df_within = ngroups * ntrials - ngroups
+
+    group_means = data.mean(axis=1)
+    grand_mean = group_means.mean(axis=1)
+    ss_between = ntrials * np.sum((group_means - grand_mean[:, np.newaxis]) ** 2, 1)
+    ss_within = np.sum((data - group_means[:, np.newaxis, :]) ** 2, axis=(1, 2))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ms_within = ss_within / df_within
+        fvalue = (ss_between / df_between) / ms_within
+    return fvalue, f.sf(fvalue, df_between, df_within), ms_within
+
+
+def tukey_hsd_cells(data, ms_within=None, confidence_level=0.95):
+    """
+    Tukey HSD confidence intervals of the differences of the group means
+    of each cell, for data of (cells, trials, groups), the same as
+    `tukey_hsd(*data[i].T).confidence_interval(confidence_level)` of each cell i.
+    Returns low, high (cells, groups, groups).
+    """
+    from scipy.stats import studentized_range
+
+    _, ntrials, ngroups = data.shape
+    if ms_within is None:
+        ms_within = anova1_cells(data)[2]
+
+    group_means = data.mean(axis=1)
+    mean_differences = group_means[:, :, np.newaxis] - group_means[:, np.newaxis, :]
+
+    # the studentized range depends only on the numbers of groups and trials
+    srd = studentized_range.ppf(confidence_level, ngroups, ngroups * ntrials - ngroups)
+    tukey_criterion = srd * np.sqrt(ms_within / ntrials)[:, np.newaxis, np.newaxis]
+
+    return mean_differences - tukey_criterion, mean_differences + tukey_criterion
+
+
+def multi_compare(data, ms_within=None):
+    """
+    Significantly different pairs of groups of each cell (cells, groups, groups),
+    for data of (cells, trials, groups).
+    """
+    _, _, size = data.shape
+    low, high = tukey_hsd_cells(data, ms_within)
+    sig = high * low
+    sig[:, range(size), range(size)] = 0
 
     sig_epochs = np.where(
         (
-            np.where(np.triu(tukey.low, k=1) > 0, 1, 0)
-            | np.where(np.tril(tukey.high, k=-1) > 0, 1, 0)
+            np.where(np.triu(low, k=1) > 0, 1, 0)
+            | np.where(np.tril(high, k=-1) > 0, 1, 0)
         )
         & (np.where(sig > 0, 1, 0)),
         1,
@@ -28,42 +77,42 @@ def multi_compare(data):
 def anova1_mult(
     stat: StatData, output_dir: str, params: dict = None, **kwargs
 ) -> dict(stat=StatData):
-    from scipy.stats import f_oneway
-
     stat.p_value_threshold = params["p_value_threshold"]
     stat.r_best_threshold = params["r_best_threshold"]
     stat.si_threshold = params["si_threshold"]
 
-    for i in range(stat.ncells):
-        this_data = stat.data_table[i]
-        stat.p_value_resp[i] = f_oneway(*this_data.T)[1]
-        # NOTE: tukey_hsd has performance issue, so temporarily comment out
-        # stat.sig_epochs_resp[i] = multi_compare(this_data)
-
-        sel_data = this_data[:, : stat.nstim]
-        stat.p_value_sel[i] = f_oneway(*sel_data.T)[1]
-        # stat.sig_epochs_sel[i] = multi_compare(sel_data)
-        stat.dir_sig[i] = (
-            1
-            if (stat.best_dir[i], stat.null_dir[i])
-            in list(zip(*np.where(stat.sig_epochs_sel[i])))
-            else 0
-        )
-
-        half_nstim = int(stat.nstim / 2)
-        temp_data = np.hstack(
-            (
-                (this_data[:, 0:half_nstim] + this_data[:, half_nstim : stat.nstim])
-                / 2,
-                this_data[:, stat.nstim][:, np.newaxis],
-            )
-        )
-        stat.p_value_ori_resp[i] = f_oneway(*temp_data.T)[1]
-        # stat.sig_epochs_ori_resp[i] = multi_compare(temp_data)
+    # all cells at once, data of (cells, trials, stims)
+    this_data = stat.data_table
+    _, stat.p_value_resp[:], ms_within = anova1_cells(this_data)
+    stat.sig_epochs_resp[:] = multi_compare(this_data, ms_within)
+
+    sel_data = this_data[:, :, : stat.nstim]
+    _, stat.p_value_sel[:], ms_within = anova1_cells(sel_data)
+    stat.sig_epochs_sel[:] = multi_compare(sel_data, ms_within)
+
+    stat.dir_sig[:] = 0
+    has_dir = ~np.isnan(stat.best_dir) & ~np.isnan(stat.null_dir)
+    stat.dir_sig[has_dir] = stat.sig_epochs_sel[
+        np.where(has_dir)[0],
+        stat.best_dir[has_dir].astype(int),
+        stat.null_dir[has_dir].astype(int),
+    ]
+
+    half_nstim = int(stat.nstim / 2)
+    temp_data = np.concatenate(
+        (
+            (this_data[:, :, 0:half_nstim] + this_data[:, :, half_nstim : stat.nstim])
+            / 2,
+            this_data[:, :, stat.nstim][:, :, np.newaxis],
+        ),
+        axis=2,
+    )
+    _, stat.p_value_ori_resp[:], ms_within = anova1_cells(temp_data)
+    stat.sig_epochs_ori_resp[:] = multi_compare(temp_data, ms_within)
 
-        half_temp_data = temp_data[:, :half_nstim]
-        stat.p_value_ori_sel[i] = f_oneway(*half_temp_data.T)[1]
-        # stat.sig_epochs_ori_sel[i] = multi_compare(half_temp_data)
+    half_temp_data = temp_data[:, :, :half_nstim]
+    _, stat.p_value_ori_sel[:], ms_within = anova1_cells(half_temp_data)
+    stat.sig_epochs_ori_sel[:] = multi_compare(half_temp_data, ms_within)
 
     stat.set_anova_props()
 
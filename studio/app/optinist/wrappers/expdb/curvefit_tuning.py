@@ -1,8 +1,8 @@
-import math
+from functools import cached_property
 
 import numpy as np
 from scipy.interpolate import interp1d, make_interp_spline
-from scipy.optimize import curve_fit
+from scipy.optimize import leastsq
 
 from studio.app.optinist.core.nwb.nwb import NWBDATASET
 from studio.app.optinist.dataclass.stat import StatData
@@ -20,9 +20,63 @@ def ori_von_mises(x, a, k, phi):
     return base_von_mises(x, a, k, phi, 90)
 
 
+def fit_von_mises(func, xdata, ydata, p0, max_retries, retry_fevs):
+    """
+    Least squares fit of func to a single cell, by Levenberg-Marquardt
+    (equivalent to `curve_fit(func, xdata, ydata, p0=p0, method="lm")`).
+
+    When the fit does not converge, it is retried with more function
+    evaluations, warm-started from the last estimate of the previous try.
+    Returns the fitted parameters, or None if the fit failed.
+    """
+    xdata = np.asarray_chkfinite(xdata, float)
+    ydata = np.asarray_chkfinite(ydata, float)
+    p0 = np.atleast_1d(p0)
+
+    def residuals(params):
+        return func(xdata, *params) - ydata
+
+    params = {}
+    for i in range(max_retries):
+        if i > 0:
+            params["maxfev"] = i * retry_fevs
+
+        res, _, _, _, ier = leastsq(residuals, p0, full_output=True, **params)
+        if ier in [1, 2, 3, 4]:
+            return res
+
+        if np.all(np.isfinite(res)):
+            p0 = res
+
+    return None
+
+
+def fit_von_mises_cells(func, xdata, ydata, p0, max_retries, retry_fevs):
+    """
+    Fit func to each cell of ydata (npoints, ncells) from p0 (nparams, ncells).
+    Returns fitted parameters of shape (ncells, nparams),
+    filled with NaN for the cells whose fit failed.
+    """
+    res = np.full((ydata.shape[1], p0.shape[0]), np.nan)
+    for i in range(ydata.shape[1]):
+        params = fit_von_mises(
+            func, xdata, ydata[:, i], p0[:, i], max_retries, retry_fevs
+        )
+        if params is not None:
+            res[i] = params
+    return res
+
+
 class TempTuning:
+    """
+    Tuning curves of the cells, fitted by von Mises functions.
+
+    ydata: responses to each stimulus, of shape (nstim_per_run, ncells)
+    """
+
     CURVEFIT_MAX_RETRIES = 3
     CURVEFIT_RETRY_FEVS = 10000
+    CURVEFIT_CHUNK_SIZE = 128
 
     def __init__(self, ydata, interp_method, do_interp) -> None:
         self.raw_ydata = ydata
@@ -33,6 +87,10 @@ class TempTuning:
     def nstim_per_run(self):
         return self.raw_ydata.shape[0]
 
+    @property
+    def ncells(self):
+        return self.raw_ydata.shape[1]
+
     @property
     def raw_xdata(self):
         return np.arange(self.nstim_per_run) * 2 * self.DEGREE / self.nstim_per_run
@@ -60,17 +118,22 @@ class TempTuning:
         return np.arange(-1, self.nstim_per_run + 1.5, step=0.5)
 
     @property
-    def ydata_interp(self):
-        _ydata_interp = np.hstack(
-            (self.raw_ydata[-1], self.raw_ydata, self.raw_ydata[:2])
+    def wrapped_ydata(self):
+        # raw_ydata wrapped around by 1 stimulus before and 2 stimuli after
+        return np.concatenate(
+            (self.raw_ydata[-1:], self.raw_ydata, self.raw_ydata[:2]), axis=0
         )
 
+    @cached_property
+    def ydata_interp(self):
         if self.interp_method == "spline":
-            _ydata_interp = make_interp_spline(self.x, _ydata_interp)(self.xq)
-        else:
-            _ydata_interp = interp1d(self.x, _ydata_interp, kind=self.interp_method)(
+            _ydata_interp = make_interp_spline(self.x, self.wrapped_ydata, axis=0)(
                 self.xq
             )
+        else:
+            _ydata_interp = interp1d(
+                self.x, self.wrapped_ydata, kind=self.interp_method, axis=0
+            )(self.xq)
         return _ydata_interp[2 : self.nstim_per_run * 2 + 2]
 
     @property
@@ -85,29 +148,60 @@ class TempTuning:
     def xdata(self):
         return self.xdata_interp if self.do_interp else self.raw_xdata
 
-    def get_curvefit_results(self):
-        params = {}
-        for i in range(self.CURVEFIT_MAX_RETRIES):
-            if i > 0:
-                params["maxfev"] = i * self.CURVEFIT_RETRY_FEVS
+    def fit_curves(self, cell_indices, workers=1):
+        """
+        Fit func to the cells of cell_indices,
+        in chunks of cells processed in parallel if workers > 1.
+        """
+        ydata = self.ydata[:, cell_indices] - self.ymin
+        p0 = self.p0[:, cell_indices]
+        chunks = [
+            (
+                self.FIT_FUNC,
+                self.xdata,
+                ydata[:, start : start + self.CURVEFIT_CHUNK_SIZE],
+                p0[:, start : start + self.CURVEFIT_CHUNK_SIZE],
+                self.CURVEFIT_MAX_RETRIES,
+                self.CURVEFIT_RETRY_FEVS,
+            )
+            for start in range(0, len(cell_indices), self.CURVEFIT_CHUNK_SIZE)
+        ]
+        if not chunks:
+            return np.full((0, p0.shape[0]), np.nan)
+
+        if workers > 1 and len(chunks) > 1:
+            from concurrent.futures import ProcessPoolExecutor
 
-            try:
-                return self.curve_fit_result(params)
-            except RuntimeError:
-                continue
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(fit_von_mises_cells, *zip(*chunks)))
         else:
-            return None
+            results = [fit_von_mises_cells(*chunk) for chunk in chunks]
+
+        return np.concatenate(results, axis=0)
+
+    def get_curvefit_results(self, cell_indices, workers=1):
+        """
+        Returns the indices of the successfully fitted cells,
+        and the curve fit results of them.
+        """
+        res = self.fit_curves(cell_indices, workers)
+        is_fitted = np.all(np.isfinite(res), axis=1)
+        return np.asarray(cell_indices)[is_fitted], self.curve_fit_result(
+            res[is_fitted].T
+        )
 
     def tuning_width(self, k):
-        return (
-            math.acos(math.log(0.5) / k + 1) * self.DEGREE / math.pi
-            if k > math.log(2) / 2
-            else self.DEGREE
-        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(
+                k > np.log(2) / 2,
+                np.arccos(np.log(0.5) / k + 1) * self.DEGREE / np.pi,
+                self.DEGREE,
+            )
 
 
 class DirTempTuning(TempTuning):
     DEGREE = 180
+    FIT_FUNC = staticmethod(dir_von_mises)
 
     def __init__(self, ydata, interp_method, do_interp, use_fourier) -> None:
         super().__init__(ydata, interp_method, do_interp)
@@ -115,28 +209,29 @@ class DirTempTuning(TempTuning):
 
     @property
     def null_index(self):
-        return int(
-            np.mod((self.best_index + self.nstim_per_run / 2), self.nstim_per_run)
-        )
+        return np.mod(
+            (self.best_index + self.nstim_per_run / 2), self.nstim_per_run
+        ).astype(int)
 
     @property
     def p0(self):
         return np.array(
             [
                 self.ymax - self.ymin,
-                self.raw_ydata[self.null_index] - self.ymin,
-                2,
-                2,
+                np.take_along_axis(self.raw_ydata, self.null_index[np.newaxis], 0)[0]
+                - self.ymin,
+                np.full(self.ncells, 2),
+                np.full(self.ncells, 2),
                 self.best_index * 2 * self.DEGREE / self.nstim_per_run,
                 self.null_index * 2 * self.DEGREE / self.nstim_per_run,
             ]
         )
 
-    @property
+    @cached_property
     def ydata_fourier_interp(self):
         if self.use_fourier:
-            res = np.zeros(360, dtype=np.complex128)
-            f = np.fft.fft(self.ydata)
+            res = np.zeros((360, self.ncells), dtype=np.complex128)
+            f = np.fft.fft(self.ydata, axis=0)
             n = self.ydata.shape[0]
             half_n = int(n / 2)
             if n % 2 == 0:
@@ -147,21 +242,19 @@ class DirTempTuning(TempTuning):
             else:
                 res[:half_n] = f[:half_n]
                 res[360 - half_n :] = f[half_n:]
-            return np.fft.ifft(res).real * 360 / n
+            return np.fft.ifft(res, axis=0).real * 360 / n
         else:
-            _ydata_interp = np.hstack(
-                (self.raw_ydata[-1], self.raw_ydata, self.raw_ydata[:2])
-            )
-            _ydata_interp = interp1d(self.x, _ydata_interp, kind=self.interp_method)(
+            _ydata_interp = interp1d(
+                self.x, self.wrapped_ydata, kind=self.interp_method, axis=0
+            )(
                 np.arange(
                     -1,
                     self.nstim_per_run + 1 + self.nstim_per_run / 360,
                     step=self.nstim_per_run / 360,
                 )
             )
-            return _ydata_interp[
-                360 / self.nstim_per_run : 360 / self.nstim_per_run + 360
-            ]
+            start = int(360 / self.nstim_per_run)
+            return _ydata_interp[start : start + 360]
 
     @property
     def r_best_dir_interp(self):
@@ -177,26 +270,20 @@ class DirTempTuning(TempTuning):
 
     @property
     def r_null_dir_interp(self):
-        return self.ydata_fourier_interp[self.null_dir_interp]
+        return np.take_along_axis(
+            self.ydata_fourier_interp, self.null_dir_interp[np.newaxis], 0
+        )[0]
 
     @property
     def di_interp(self):
         return 1 - self.r_null_dir_interp / self.r_best_dir_interp
 
-    def curve_fit_result(self, params):
-        res = curve_fit(
-            dir_von_mises,
-            self.xdata,
-            self.ydata - self.ymin,
-            p0=self.p0,
-            method="lm",
-            **params,
-        )[0]
-
-        if res[0] >= res[1]:
-            a1, a2, k1, k2, best_dir_fit, phi2 = res
-        else:
-            a2, a1, k2, k1, phi2, best_dir_fit = res
+    def curve_fit_result(self, res):
+        # the larger peak is taken as the best direction
+        is_swapped = res[0] < res[1]
+        a1, a2, k1, k2, best_dir_fit, phi2 = np.where(
+            is_swapped, res[[1, 0, 3, 2, 5, 4]], res
+        )
         best_dir_fit = np.mod(best_dir_fit, self.DEGREE * 2)
         phi2 = np.mod(phi2, self.DEGREE * 2)
         null_dir_fit = np.mod(best_dir_fit + self.DEGREE, self.DEGREE * 2)
@@ -227,27 +314,19 @@ class DirTempTuning(TempTuning):
 
 class OriTempTuning(TempTuning):
     DEGREE = 90
+    FIT_FUNC = staticmethod(ori_von_mises)
 
     @property
     def p0(self):
         return np.array(
             [
                 self.ymax - self.ymin,
-                1,
+                np.full(self.ncells, 1),
                 self.best_index * 2 * self.DEGREE / self.nstim_per_run,
             ]
         )
 
-    def curve_fit_result(self, params):
-        res = curve_fit(
-            ori_von_mises,
-            self.xdata,
-            self.ydata - self.ymin,
-            p0=self.p0,
-            method="lm",
-            **params,
-        )[0]
-
+    def curve_fit_result(self, res):
         a1, k1, best_ori_fit = res
         best_ori_fit = np.mod(best_ori_fit, self.DEGREE * 2)
         ori_tuning_width = self.tuning_width(k1)
@@ -261,45 +340,48 @@ def curvefit_tuning(
     do_interp = params["do_interpolation"]
     p_threshold = params["p_threshold"]
     use_fourier = params["use_fourier"]
-
-    for i in range(stat.ncells):
-        dir_temp = DirTempTuning(
-            stat.dir_ratio_change[i], interp_method, do_interp, use_fourier
-        )
-        stat.best_dir_interp[i] = dir_temp.best_dir_interp
-        stat.null_dir_interp[i] = dir_temp.null_dir_interp
-        stat.r_best_dir_interp[i] = dir_temp.r_best_dir_interp
-        stat.r_null_dir_interp[i] = dir_temp.r_null_dir_interp
-        stat.di_interp[i] = dir_temp.di_interp
-
-        if stat.p_value_sel[i] > p_threshold:
-            continue
-
-        dir_curvefit_results = dir_temp.get_curvefit_results()
-        if dir_curvefit_results is not None:
-            (
-                stat.dir_a1[i],
-                stat.dir_a2[i],
-                stat.dir_k1[i],
-                stat.dir_k2[i],
-                stat.best_dir_fit[i],
-                stat.null_dir_fit[i],
-                stat.r_best_dir_fit[i],
-                stat.r_null_dir_fit[i],
-                stat.di_fit[i],
-                stat.ds[i],
-                stat.dir_tuning_width[i],
-            ) = dir_curvefit_results
-
-        ori_temp = OriTempTuning(stat.ori_ratio_change[i], interp_method, do_interp)
-        ori_curvefit_results = ori_temp.get_curvefit_results()
-        if ori_curvefit_results is not None:
-            (
-                stat.ori_a1[i],
-                stat.ori_k1[i],
-                stat.best_ori_fit[i],
-                stat.ori_tuning_width[i],
-            ) = ori_curvefit_results
+    workers = params.get("workers", 1)
+
+    # all cells are interpolated at once, along the stimulus axis
+    dir_temp = DirTempTuning(
+        stat.dir_ratio_change.T, interp_method, do_interp, use_fourier
+    )
+    stat.best_dir_interp[:] = dir_temp.best_dir_interp
+    stat.null_dir_interp[:] = dir_temp.null_dir_interp
+    stat.r_best_dir_interp[:] = dir_temp.r_best_dir_interp
+    stat.r_null_dir_interp[:] = dir_temp.r_null_dir_interp
+    stat.di_interp[:] = dir_temp.di_interp
+
+    # curve fit only the selective cells
+    fit_cells = np.flatnonzero(~(stat.p_value_sel > p_threshold))
+
+    fitted_cells, dir_curvefit_results = dir_temp.get_curvefit_results(
+        fit_cells, workers
+    )
+    (
+        stat.dir_a1[fitted_cells],
+        stat.dir_a2[fitted_cells],
+        stat.dir_k1[fitted_cells],
+        stat.dir_k2[fitted_cells],
+        stat.best_dir_fit[fitted_cells],
+        stat.null_dir_fit[fitted_cells],
+        stat.r_best_dir_fit[fitted_cells],
+        stat.r_null_dir_fit[fitted_cells],
+        stat.di_fit[fitted_cells],
+        stat.ds[fitted_cells],
+        stat.dir_tuning_width[fitted_cells],
+    ) = dir_curvefit_results
+
+    ori_temp = OriTempTuning(stat.ori_ratio_change.T, interp_method, do_interp)
+    fitted_cells, ori_curvefit_results = ori_temp.get_curvefit_results(
+        fit_cells, workers
+    )
+    (
+        stat.ori_a1[fitted_cells],
+        stat.ori_k1[fitted_cells],
+        stat.best_ori_fit[fitted_cells],
+        stat.ori_tuning_width[fitted_cells],
+    ) = ori_curvefit_results
 
     stat.set_curvefit_props()
 
@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 import numpy as np
 
 
@@ -36,9 +38,7 @@ def dft_ups(inp: np.ndarray, nor=None, noc=None, usfac=1, roff=0, coff=0):
         Row and column offsets,
         allow to shift the output array to a region of interest on the DFT
     """
-    from numpy.fft import ifftshift
-
-    nr, nc = inp.shape
+    nr, nc = inp.shape[-2:]
 
     if nor is None:
         nor = nr
@@ -46,16 +46,51 @@ def dft_ups(inp: np.ndarray, nor=None, noc=None, usfac=1, roff=0, coff=0):
         noc = nc
 
     # Compute kernels and obtain DFT by matrix products
-    kern_row = np.outer(
-        (np.arange(nor) - roff),
-        (ifftshift(np.arange(nr) - np.floor(nr / 2)) * 2 * np.pi / (nr * usfac)),
+    # (inp may also be a stack of arrays (k, nr, nc), with offsets of each array)
+    row_kernel, row_freq, col_kernel, col_freq = get_dft_ups_kernels(
+        nr, nc, int(nor), int(noc), usfac
     )
-    kern_col = np.outer(
-        (ifftshift(np.arange(nc)) - int(np.floor(nc / 2))),
-        (np.arange(noc) - coff) * 2 * np.pi / (nc * usfac),
+    roff = np.asarray(roff, dtype=np.float64)[..., np.newaxis, np.newaxis]
+    coff = np.asarray(coff, dtype=np.float64)[..., np.newaxis, np.newaxis]
+    dtype = np.result_type(inp.dtype, np.complex64)
+
+    kern_row = (row_kernel * np.exp(1j * roff * row_freq)).astype(dtype, copy=False)
+    kern_col = (col_kernel * np.exp(1j * coff * col_freq[:, np.newaxis])).astype(
+        dtype, copy=False
     )
 
-    return np.exp(kern_row * (-1j)) @ inp @ np.exp(kern_col * (-1j))
+    return kern_row @ inp @ kern_col
+
+
+@lru_cache(maxsize=None)
+def get_fft_freqs(n: int) -> np.ndarray:
+    """
+    Frequencies of DFT (in units of samples) with DC in the first element,
+    i.e. ifftshift(-fix(n/2):ceil(n/2)-1).
+    """
+    from numpy.fft import ifftshift
+
+    freqs = ifftshift(np.arange(n) - n // 2).astype(np.float64)
+    freqs.flags.writeable = False
+
+    return freqs
+
+
+@lru_cache(maxsize=None)
+def get_dft_ups_kernels(nr: int, nc: int, nor: int, noc: int, usfac: int) -> tuple:
+    """
+    Offset independent parts of the dft_ups kernels, cached per shape.
+    exp(-1j * (k - off) * f) == exp(-1j * k * f) * exp(1j * off * f)
+    """
+    row_freq = get_fft_freqs(nr) * 2 * np.pi / (nr * usfac)
+    col_freq = get_fft_freqs(nc) * 2 * np.pi / (nc * usfac)
+    row_kernel = np.exp(np.outer(np.arange(nor), row_freq) * (-1j))
+    col_kernel = np.exp(np.outer(col_freq, np.arange(noc)) * (-1j))
+
+    for kernel in [row_freq, col_freq, row_kernel, col_kernel]:
+        kernel.flags.writeable = False
+
+    return row_kernel, row_freq, col_kernel, col_freq
 
 
 def dft_registration(buf1ft: np.ndarray, buf2ft: np.ndarray, usfac: int):
@@ -108,7 +143,7 @@ def dft_registration(buf1ft: np.ndarray, buf2ft: np.ndarray, usfac: int):
         the global phase difference is compensated for.
 
     """
-    from numpy import ceil, conj, exp, fix, meshgrid, pi
+    from numpy import ceil, conj, exp, fix, pi
     from numpy.fft import fftshift, ifft2, ifftshift
 
     if usfac == 0:
@@ -208,10 +243,8 @@ def dft_registration(buf1ft: np.ndarray, buf2ft: np.ndarray, usfac: int):
 
     if usfac > 0:
         n_row, n_col = buf2ft.shape
-        grid_col, grid_row = meshgrid(
-            ifftshift(range(-int(fix(n_col / 2)), int(ceil(n_col / 2)))),
-            ifftshift(range(-int(fix(n_row / 2)), int(ceil(n_row / 2)))),
-        )
+        grid_row = get_fft_freqs(n_row)[:, np.newaxis]
+        grid_col = get_fft_freqs(n_col)[np.newaxis, :]
         g_reg = buf2ft * exp(
             1j * 2 * pi * (-row_shift * grid_row / n_row - col_shift * grid_col / n_col)
         )
@@ -223,6 +256,165 @@ def dft_registration(buf1ft: np.ndarray, buf2ft: np.ndarray, usfac: int):
     return np.squeeze(error), diffphase, row_shift, col_shift, g_reg
 
 
+def dft_registration_frames(buf1ft: np.ndarray, frames: np.ndarray, usfac: int):
+    """
+    Batched version of `dft_registration`,
+    registers a block of frames to the reference image at once.
+
+    The computation is the same as `dft_registration` for each frame,
+    except that for usfac <= 1 (integer pixel shifts), the crosscorrelation
+    is computed with real FFTs and the frames are shifted without inverse FFT.
+    The precision follows the dtype of frames (float32 or float64).
+
+    Parameters
+    ----------
+    buf1ft: ndarray
+        Fourier transform of reference image (m, n), DC in (1,1) [DO NOT FFTSHIFT]
+    frames: ndarray
+        Images to register (k, m, n), NOT Fourier transformed
+    usfac: int
+        Upsampling factor.
+
+    Returns
+    -------
+    outs: ndarray
+        (k, 4) array of error, diffphase, net_row_shift, net_col_shift
+    registered: ndarray
+        (k, m, n) absolute values of registered frames
+    """
+    from numpy import ceil, conj, fix, pi
+    from scipy.fft import fft2, fftshift, ifft2, ifftshift, irfft2, rfft2
+
+    k, m, n = frames.shape
+    outs = np.empty((k, 4))
+    frame_inds = np.arange(k)
+
+    if usfac == 0:
+        buf2ft = fft2(frames)
+        cc_max = np.sum(buf1ft * conj(buf2ft), axis=(1, 2))
+        rfzero = np.sum(buf1ft * conj(buf1ft))
+        rgzero = np.sum(buf2ft * conj(buf2ft), axis=(1, 2))
+        error = np.sqrt(np.abs(1.0 - cc_max * conj(cc_max) / (rgzero * rfzero)))
+        diffphase = np.arctan2(np.imag(cc_max), np.real(cc_max))
+
+        outs[:] = np.stack([error, diffphase, np.nan * error, np.nan * error], 1)
+
+        # only the global phase is compensated
+        return outs, np.abs(frames)
+
+    elif usfac == 1:
+        # the crosscorrelation of real images is real
+        cc = irfft2(buf1ft[:, : n // 2 + 1] * conj(rfft2(frames)), s=(m, n))
+        loc_row, loc_col = __argmax_frames(cc)
+        cc_max = cc[frame_inds, loc_row, loc_col]
+
+        # sum(|F|^2) / (m * n) == sum(|f|^2) (Parseval)
+        rfzero = np.sum(np.abs(buf1ft) ** 2) / (m * n)
+        rgzero = np.sum(np.square(frames, dtype=np.float64), axis=(1, 2))
+        error = np.sqrt(np.abs(1.0 - cc_max**2 / (rgzero * rfzero)))
+        diffphase = np.arctan2(0, cc_max)
+
+        row_shift = np.where(loc_row > fix(m / 2), loc_row - m, loc_row)
+        col_shift = np.where(loc_col > fix(n / 2), loc_col - n, loc_col)
+
+        outs[:] = np.stack([error, diffphase, row_shift, col_shift], 1)
+
+        # integer pixel shift in Fourier domain is a circular shift
+        return outs, np.abs(__roll_frames(frames, row_shift, col_shift))
+
+    buf2ft = fft2(frames)
+    m_large = m * 2
+    n_large = n * 2
+    cc = np.zeros((k, m_large, n_large), dtype=buf2ft.dtype)
+    cc[
+        :,
+        m - int(fix(m / 2)) : m + int(fix((m - 1) / 2)) + 1,
+        n - int(fix(n / 2)) : n + int(fix((n - 1) / 2)) + 1,
+    ] = fftshift(buf1ft) * conj(fftshift(buf2ft, axes=(1, 2)))
+
+    cc = ifft2(ifftshift(cc, axes=(1, 2)))
+    loc_row, loc_col = __argmax_frames(cc)
+    cc_max = cc[frame_inds, loc_row, loc_col]
+
+    md2 = fix(m_large / 2)
+    nd2 = fix(n_large / 2)
+    row_shift = np.where(loc_row > md2, loc_row - m_large, loc_row) / 2
+    col_shift = np.where(loc_col > nd2, loc_col - n_large, loc_col) / 2
+
+    if usfac > 2:
+        row_shift = np.round(row_shift * usfac) / usfac
+        col_shift = np.round(col_shift * usfac) / usfac
+        dftshift = fix(ceil(usfac * 1.5) / 2)
+        cc = conj(
+            dft_ups(
+                buf2ft * conj(buf1ft),
+                ceil(usfac * 1.5),
+                ceil(usfac * 1.5),
+                usfac,
+                dftshift - row_shift * usfac,
+                dftshift - col_shift * usfac,
+            )
+        ) / (md2 * nd2 * usfac**2)
+        loc_row, loc_col = __argmax_frames(cc)
+        cc_max = cc[frame_inds, loc_row, loc_col]
+
+        # dft_ups(a, 1, 1, usfac) == sum(a)
+        rgzero = np.sum(buf1ft * conj(buf1ft)) / (md2 * nd2 * usfac**2)
+        rfzero = np.sum(buf2ft * conj(buf2ft), axis=(1, 2)) / (md2 * nd2 * usfac**2)
+        row_shift = row_shift + (loc_row - dftshift) / usfac
+        col_shift = col_shift + (loc_col - dftshift) / usfac
+
+    else:
+        rgzero = np.sum(buf1ft * conj(buf1ft)) / m_large / n_large
+        rfzero = np.sum(buf2ft * conj(buf2ft), axis=(1, 2)) / m_large / n_large
+
+    error = np.sqrt(np.abs(1.0 - cc_max * conj(cc_max) / (rgzero * rfzero)))
+    diffphase = np.arctan2(np.imag(cc_max), np.real(cc_max))
+
+    if md2 == 1:
+        row_shift[:] = 0
+    if nd2 == 1:
+        col_shift[:] = 0
+
+    outs[:] = np.stack([error, diffphase, row_shift, col_shift], 1)
+
+    # phase ramps are separable into rows and columns
+    dtype = buf2ft.dtype
+    row_phase = np.exp(
+        -1j * 2 * pi * np.multiply.outer(row_shift, get_fft_freqs(m) / m)
+    ).astype(dtype)
+    col_phase = np.exp(
+        1j * diffphase[:, np.newaxis]
+        - 1j * 2 * pi * np.multiply.outer(col_shift, get_fft_freqs(n) / n)
+    ).astype(dtype)
+    g_reg = buf2ft * row_phase[:, :, np.newaxis] * col_phase[:, np.newaxis, :]
+
+    return outs, np.abs(ifft2(g_reg))
+
+
+def __argmax_frames(cc: np.ndarray) -> tuple:
+    """
+    Peak location of each frame, with the same tie-breaking as `dft_registration`
+    (the first column that has the maximum, and then the first row in it).
+    """
+    k, m, _ = cc.shape
+    inds = np.argmax(cc.transpose(0, 2, 1).reshape(k, -1), axis=1)
+
+    return inds % m, inds // m
+
+
+def __roll_frames(frames: np.ndarray, row_shift, col_shift) -> np.ndarray:
+    k, m, n = frames.shape
+    rows = (np.arange(m) - np.asarray(row_shift, dtype=int)[:, np.newaxis]) % m
+    cols = (np.arange(n) - np.asarray(col_shift, dtype=int)[:, np.newaxis]) % n
+
+    return frames[
+        np.arange(k)[:, np.newaxis, np.newaxis],
+        rows[:, :, np.newaxis],
+        cols[:, np.newaxis, :],
+    ]
+
+
 def dft_registration_nD(buf1ft: np.ndarray, buf2ft: np.ndarray):
     """
     Efficient subpixel image registration by crosscorrelation.
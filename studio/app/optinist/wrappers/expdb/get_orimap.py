@@ -9,6 +9,9 @@ from studio.app.common.dataclass.image import ImageData
 from studio.app.optinist.dataclass.expdb import ExpDbData
 from studio.app.optinist.wrappers.expdb.stack_average import stack_average
 
+# non-separable kernels larger than this (elements) are convolved by FFT
+FFT_KERNEL_SIZE = 64
+
 
 @dataclass
 class MapParams:
@@ -116,36 +119,84 @@ def generate_gaussian_filter(kernel_size: int, sigma: int) -> np.ndarray:
     return gaussian_kernel
 
 
+def get_separable_kernels(kernel: np.ndarray, rtol: float = 1e-12):
+    """
+    The column and row vectors of a separable (rank 1) 2d kernel,
+    whose outer product is the kernel, or None if it is not separable.
+    """
+    u, s, vt = np.linalg.svd(kernel)
+    if s[0] == 0 or (len(s) > 1 and s[1] > s[0] * rtol):
+        return None
+
+    scale = np.sqrt(s[0])
+    return u[:, 0] * scale, vt[0] * scale
+
+
+def convolve_taps(stack: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    """
+    Full 2d convolution of all planes of the stack (y, x, ...) by a small kernel,
+    as the sum of the shifted stacks weighted by each tap of the kernel.
+    """
+    kh, kw = kernel.shape
+    h, w = stack.shape[:2]
+    filtered = np.zeros((h + kh - 1, w + kw - 1, *stack.shape[2:]))
+    for (i, j), weight in np.ndenumerate(kernel):
+        if weight != 0:
+            filtered[i : i + h, j : j + w] += weight * stack
+    return filtered
+
+
+def convolve2_nd(
+    stack: np.ndarray, kernel: np.ndarray, mode: str = "full"
+) -> np.ndarray:
+    """
+    2d convolution of all planes of the stack (y, x, ...) at once,
+    the same as `convolve2d(stack[:, :, i], kernel, mode)` of each plane i.
+    A separable kernel is applied as 1d convolutions along y and x,
+    and a large non-separable kernel by FFT.
+    """
+    from scipy.signal import fftconvolve
+
+    assert mode in ["full", "valid"], "mode should be full or valid"
+    stack = np.asarray(stack, dtype=float)
+    kh, kw = kernel.shape
+
+    separable = get_separable_kernels(kernel)
+    if separable is not None:
+        col, row = separable
+        filtered = convolve_taps(stack, col[:, np.newaxis])
+        filtered = convolve_taps(filtered, row[np.newaxis, :])
+    elif kernel.size > FFT_KERNEL_SIZE:
+        # the kernel is broadcast over the planes
+        kernel = kernel.reshape(kh, kw, *(1,) * (stack.ndim - 2))
+        filtered = fftconvolve(stack, kernel, mode="full", axes=(0, 1))
+    else:
+        filtered = convolve_taps(stack, kernel)
+
+    if mode == "valid":
+        h, w = stack.shape[:2]
+        filtered = filtered[kh - 1 : h, kw - 1 : w]
+    return filtered
+
+
 def filter2_nd(filter: np.ndarray, stack: np.ndarray, mode: str = "same") -> np.ndarray:
     """
     Based on Ohki Lab's MATLAB code filter2n.m.
     """
-    from scipy.signal import convolve2d
-
     stack_dim = stack.shape
-    assert stack.ndim in [2, 3], "stack should be 2d or 3d"
+    assert stack.ndim in [2, 3, 4], "stack should be 2d, 3d or 4d"
+
+    # stack: (y, x, t) or (y, x, z, t), filtered at once
+    if mode != "same":
+        return convolve2_nd(stack, np.rot90(filter), mode=mode)
 
     # Note: MATLABとPythonの各conv2d処理では、フィルターを適用する中心点が異なることから
     # （1行1列分ずれている）、Python版では modeを"full"とし、
     # その後中心点を補正（Crop）する処理を実施する。
-    mode = "full" if mode == "same" else mode
-
-    # stack: (y, x, t) or (y, x, z, t)
-    n = np.prod(stack_dim[2:])
-    reshaped_stack = stack.reshape((stack_dim[0], stack_dim[1], n), order="F")
-    filtered_stack = np.zeros((stack_dim[0], stack_dim[1], n))
-
-    for i in range(n):
-        # 中心点を調整（MATLAB形式に合わせるため、1行1列分をシフト）
-        filtered_plane = convolve2d(
-            reshaped_stack[:, :, i], np.rot90(filter), mode=mode
-        )
-        filtered_plane = filtered_plane[1 : stack_dim[0] + 1, 1 : stack_dim[1] + 1]
+    filtered_stack = convolve2_nd(stack, np.rot90(filter), mode="full")
 
-        # stackへ格納
-        filtered_stack[:, :, i] = filtered_plane
-
-    result_stack = filtered_stack.reshape(stack_dim, order="F")
+    # 中心点を調整（MATLAB形式に合わせるため、1行1列分をシフト）
+    result_stack = filtered_stack[1 : stack_dim[0] + 1, 1 : stack_dim[1] + 1].copy()
 
     # returns a copied ndarray from input ndarray.
     return result_stack
@@ -189,32 +240,17 @@ def calc_dF(
     calculate dF images (and their smoothed images) to each direction.
     """
 
-    dim = dir_F.shape
     ndim = dir_F.ndim
-    ndir = dim[-1]
 
     base = np.mean(bases, ndim - 1)
 
-    # TODO: test for 4D pattern
-    if ndim == 4:
-        if use_eachbase:
-            dir_dF = dir_F - bases
-        else:
-            # transpose to appropriate shape for numpy array
-            base_tile = np.tile(base, (ndir, 1, 1, 1)).transpose(1, 2, 0)
-            dir_dF = dir_F - base_tile
-
-        dir_dF_sm = filter2_nd(sp_filter, dir_dF)
-
+    if use_eachbase:
+        dir_dF = dir_F - bases
     else:
-        if use_eachbase:
-            dir_dF = dir_F - bases
-        else:
-            # transpose to appropriate shape for numpy array
-            base_tile = np.tile(base, (ndir, 1, 1)).transpose(1, 2, 0)
-            dir_dF = dir_F - base_tile
+        # broadcast base to each direction, (y, x, (z), dir)
+        dir_dF = dir_F - base[..., np.newaxis]
 
-        dir_dF_sm = filter2_nd(sp_filter, dir_dF)
+    dir_dF_sm = filter2_nd(sp_filter, dir_dF)
 
     # returns a copied ndarray from input ndarray.
     return [dir_dF.copy(), dir_dF_sm.copy()]
@@ -228,28 +264,15 @@ def calc_ratio_change(
     calculate dF/F images to each direction and orientation.
     """
 
-    dim = dir_dF_sm.shape
     ndim = dir_dF_sm.ndim
-    ndir = dim[-1]
 
     bases_sm = np.mean(bases_sm, ndim - 1)
 
-    # TODO: test for 4D pattern
-    if ndim == 4:
-        if use_eachbase:
-            dir_ratio = dir_dF_sm / bases_sm
-        else:
-            # transpose to appropriate shape for numpy array
-            base_sm_tile = np.tile(bases_sm, (ndir, 1, 1, 1)).transpose(1, 2, 0)
-            dir_ratio = dir_dF_sm / base_sm_tile
-
+    if use_eachbase:
+        dir_ratio = dir_dF_sm / bases_sm
     else:
-        if use_eachbase:
-            dir_ratio = dir_dF_sm / bases_sm
-        else:
-            # transpose to appropriate shape for numpy array
-            base_sm_tile = np.tile(bases_sm, (ndir, 1, 1)).transpose(1, 2, 0)
-            dir_ratio = dir_dF_sm / base_sm_tile
+        # broadcast base to each direction, (y, x, (z), dir)
+        dir_ratio = dir_dF_sm / bases_sm[..., np.newaxis]
 
     # returns a copied ndarray from input ndarray.
     return dir_ratio.copy()
@@ -293,78 +316,29 @@ def calc_map_params_fast2D(dir: np.ndarray) -> MapParams:
     thus, tune parameter is between 0 and 1.
     """
 
-    dim = dir.shape
-    ndim = dir.ndim
-    ndir = dim[-1]
+    ndir = dir.shape[-1]
 
-    params = MapParams()
-
-    if ndim == 4:
-        params.th = np.zeros(dim[:3])
-        params.mag = np.zeros(dim[:3])
-        params.ave_change = np.zeros(dim[:3])
-        params.max_change = np.zeros(dim[:3])
-        params.tune = np.zeros(dim[:3])
-    else:
-        params.th = np.zeros(dim[:2])
-        params.mag = np.zeros(dim[:2])
-        params.ave_change = np.zeros(dim[:2])
-        params.max_change = np.zeros(dim[:2])
-        params.tune = np.zeros(dim[:2])
-
-    a = np.zeros((ndir, 1))
+    # cos/sin table of each direction, shape: (ndir, 2)
+    angles = 2 * np.arange(ndir) * np.pi / ndir
+    table = np.stack([np.cos(angles), np.sin(angles)], axis=-1)
 
-    # TODO: test for 4D pattern
-    if ndim == 4:
-        for x in range(dim[0]):
-            for y in range(dim[1]):
-                for z in range(dim[2]):
-                    Vx = 0
-                    Vy = 0
-                    sum = 0
-
-                    # vector averageing
-                    for i in range(ndir):
-                        if dir[x, y, z, i] < 0:
-                            a[i] = 0
-                        else:
-                            a[i] = dir[x, y, z, i].copy()  # explicitly copy.
-
-                        Vx = Vx + a[i] * np.cos(2 * i * np.pi / ndir)
-                        Vy = Vy + a[i] * np.sin(2 * i * np.pi / ndir)
-                        sum = sum + a[i]
-
-                    params.th[x, y, z] = np.arctan2(Vx, Vy)
-                    params.mag[x, y, z] = np.sqrt(Vx**2 + Vy**2)
-                    params.ave_change[x, y, z] = sum / ndir
-                    params.max_change[x, y, z] = np.max(a)
-
-                    if sum > 0:
-                        params.tune[x, y, z] = params.mag[x, y, z] / sum
-                    else:
-                        params.tune[x, y, z] = 0
+    # negative signal changes are replaced by zero.
+    # (2D (y, x, dir) and 3D (y, x, z, dir) inputs are processed in the same way)
+    a = np.maximum(np.asarray(dir, dtype=np.float64), 0)
 
-    else:
-        Vx = np.zeros(dim[:2])
-        Vy = np.zeros(dim[:2])
-        sum = np.zeros(dim[:2])
-        a = np.zeros(dim[:3])
+    # vector averageing
+    V = np.einsum("...i,ij->...j", a, table)
+    Vx = V[..., 0]
+    Vy = V[..., 1]
+    sum = np.sum(a, axis=-1)
 
-        # vector averageing
-        for i in range(ndir):
-            temp = dir[:, :, i].copy()  # explicitly copy.
-            temp[dir[:, :, i] < 0] = 0
-            a[:, :, i] = temp
-            Vx = Vx + a[:, :, i] * np.cos(2 * i * np.pi / ndir)
-            Vy = Vy + a[:, :, i] * np.sin(2 * i * np.pi / ndir)
-            sum = sum + a[:, :, i]
-
-        params.th = np.arctan2(Vx, Vy)
-        params.mag = np.sqrt(Vx**2 + Vy**2)
-        params.ave_change = sum / ndir
-        params.max_change = np.max(a, axis=2)
-        params.tune = np.zeros(dim[0:2])
-        params.tune[sum != 0] = params.mag[sum != 0] / sum[sum != 0]
+    params = MapParams()
+    params.th = np.arctan2(Vx, Vy)
+    params.mag = np.sqrt(Vx**2 + Vy**2)
+    params.ave_change = sum / ndir
+    params.max_change = np.max(a, axis=-1)
+    params.tune = np.zeros(sum.shape)
+    params.tune[sum != 0] = params.mag[sum != 0] / sum[sum != 0]
 
     params.th = params.th / np.pi / 2 + 0.5  # normalize to 0-1.
 
@@ -397,13 +371,13 @@ def hsv2rgbKO_fast2D(hueKO_stack: np.array) -> np.ndarray:
     import matplotlib.colors as mcolors
 
     hueKO_stack_copy = hueKO_stack.copy()
-    h_temp = hueKO_stack_copy[:, :, 0]
+    h_temp = hueKO_stack_copy[..., 0]
 
     h_temp[h_temp < 0] = 0
     h_temp[h_temp > 1] = 1
     h_temp = h_temp * 2 / 3
     h_temp[h_temp > (1 / 3)] = h_temp[h_temp > (1 / 3)] * 2 - 1 / 3
-    hueKO_stack_copy[:, :, 0] = h_temp
+    hueKO_stack_copy[..., 0] = h_temp
 
     rgb = mcolors.hsv_to_rgb(hueKO_stack_copy)
 
@@ -482,9 +456,9 @@ def write_angle_map_fast2D(th: np.ndarray, output_dir: str, prefix: str) -> np.n
     """
     dim = th.shape
 
-    th_map = np.ones((dim[0], dim[1], 3))
-    th_map[:, :, 0] = th.copy()  # explicitly copy
-    angle = np.zeros((dim[0], dim[1], 3))
+    th_map = np.ones((*dim, 3))
+    th_map[..., 0] = th.copy()  # explicitly copy
+    angle = np.zeros((*dim, 3))
 
     angle = hsv2rgbKO_fast2D(th_map)
 
@@ -506,10 +480,10 @@ def write_polar_map_fast2D(
     polar_hc: high contrast polar map
     """
 
-    dim = params.th.T.shape
+    dim = params.th.shape
 
-    seed = np.ones((dim[0], dim[1], 3))
-    seed[:, :, 0] = params.th.copy()  # explicitly copy
+    seed = np.ones((*dim, 3))
+    seed[..., 0] = params.th.copy()  # explicitly copy
     seed_hc = seed.copy()
 
     m1 = params.mag / max
@@ -517,8 +491,8 @@ def write_polar_map_fast2D(
     m1[m1 > 1] = 1
     m2[m2 > 1] = 1
 
-    seed[:, :, 2] = m1
-    seed_hc[:, :, 2] = m2
+    seed[..., 2] = m1
+    seed_hc[..., 2] = m2
 
     polar = hsv2rgbKO_fast2D(seed)
     polar_hc = hsv2rgbKO_fast2D(seed_hc)
@@ -543,23 +517,23 @@ def write_HLS_map_fast2D(
     saturation: tune (0-tune_max)
     HLS_hc: high contrast HLS map
     """
-    dim = params.th.T.shape
+    dim = params.th.shape
 
-    HLS = np.zeros((dim[0], dim[1], 3))
-    HLS_hc = np.zeros((dim[0], dim[1], 3))
+    HLS = np.zeros((*dim, 3))
+    HLS_hc = np.zeros((*dim, 3))
 
     m1 = params.mag / max
     m2 = params.mag * 2 / max
     m1[m1 > 1] = 1
     m2[m2 > 1] = 1
 
-    seed = np.ones((dim[0], dim[1], 3))
-    seed[:, :, 0] = params.th.copy()  # explicitly copy
-    seed[:, :, 1] = params.tune / tune_max
+    seed = np.ones((*dim, 3))
+    seed[..., 0] = params.th.copy()  # explicitly copy
+    seed[..., 1] = params.tune / tune_max
     seed_hc = seed.copy()
 
-    seed[:, :, 2] = m1
-    seed_hc[:, :, 2] = m2
+    seed[..., 2] = m1
+    seed_hc[..., 2] = m2
 
     HLS = hsv2rgbKO_fast2D(seed)
     HLS_hc = hsv2rgbKO_fast2D(seed_hc)
@@ -623,7 +597,7 @@ def get_orimap(
     del stack
 
     if not ts.has_base:
-        ave = ave[:, :, 0 : ts.nframes_per_trial]
+        ave = ave[..., 0 : ts.nframes_per_trial]
 
     assert ave.ndim <= 4, "too many dimensions"
     save_mat("ave", ave, output_dir)
@@ -701,9 +675,9 @@ def get_orimap(
     dir_ratio_hc = np.maximum(
         dir_ratio / (np.mean(dir_ratio[:]) + (3 * np.std(dir_ratio[:]))), 0
     )
-    for n in range(dir_ratio_hc.shape[2]):
+    for n in range(dir_ratio_hc.shape[-1]):
         img_no = n + 1
-        writetiff8(dir_ratio_hc[:, :, n], output_dir, f"{exp_id}_dir_ratio_hc_{img_no}")
+        writetiff8(dir_ratio_hc[..., n], output_dir, f"{exp_id}_dir_ratio_hc_{img_no}")
 
     ori_dF = calc_ori_dF(dir_dF)
     ori_dF_sm = calc_ori_dF(dir_dF_sm)
@@ -727,9 +701,9 @@ def get_orimap(
     ori_ratio_hc = np.maximum(
         ori_ratio / (np.mean(ori_ratio[:]) + (3 * np.std(ori_ratio[:]))), 0
     )
-    for n in range(ori_ratio_hc.shape[2]):
+    for n in range(ori_ratio_hc.shape[-1]):
         img_no = n + 1
-        writetiff8(ori_ratio_hc[:, :, n], output_dir, f"{exp_id}_ori_ratio_hc_{img_no}")
+        writetiff8(ori_ratio_hc[..., n], output_dir, f"{exp_id}_ori_ratio_hc_{img_no}")
     del ori_dF_sm, ori_angle, ori_ratio, ori_ratio_hc
 
     ori_dF_polar = write_polar_map_fast2D(
@@ -46,6 +46,7 @@ def preprocessing(
 
     # set common params to variables
     first_dim = params["first_dim"]
+    phase_usfac = params.get("phase_usfac", 1)
 
     # run preprocess for each channel
     for ch in range(ome_meta.size_c):
@@ -62,7 +63,7 @@ def preprocessing(
             info["avg"] = ImageData(
                 fov.copy(), output_dir=output_dir, file_name=f"{exp_id}_avg_ch{ch + 1}"
             )
-            stack, dx = stack_phase_correct(stack, fov, first_dim)
+            stack, dx = stack_phase_correct(stack, fov, first_dim, phase_usfac)
             fov = np.squeeze(stack_average(stack, period, runs))
             info["p_avg"] = ImageData(
                 fov.copy(),
@@ -71,14 +72,21 @@ def preprocessing(
             )
 
             if params["do_realign"]:
+                register_params = {
+                    "block_size": params.get("block_size", 32),
+                    "workers": params.get("workers", 1),
+                    "use_float32": params.get("use_float32", False),
+                }
                 if stack.ndim == 3:
                     usfac = params["usfac"]
-                    realign_params, stack = stack_register(stack, fov, usfac)
+                    realign_params, stack = stack_register(
+                        stack, fov, usfac, **register_params
+                    )
                 elif stack.ndim == 4:
                     le = params["le"]
                     shift_method = params["shift_method"]
                     realign_params, stack = stack_register_3d(
-                        stack, fov, le, shift_method
+                        stack, fov, le, shift_method, **register_params
                     )
 
                 fov = np.squeeze(stack_average(stack, period, runs))
@@ -116,7 +124,7 @@ def preprocessing(
                 output_dir=output_dir,
                 file_name=f"{exp_id}_avg_ch{ch + 1}",
             )
-            stack, dx = stack_phase_correct(stack, stack, first_dim)
+            stack, dx = stack_phase_correct(stack, stack, first_dim, phase_usfac)
             info["p_avg"] = ImageData(
                 stack,
                 output_dir=output_dir,
@@ -1,9 +1,13 @@
 import numpy as np
 
+from studio.app.optinist.wrappers.expdb.dft_registration import dft_registration
 from studio.app.optinist.wrappers.expdb.stack_register import stack_register_nD
 
+# max size of the lines shifted at once, to be in the cache
+BLOCK_NBYTES = 256 * 1024
 
-def stack_phase_correct(stack: np.ndarray, fov: np.ndarray, first_dim):
+
+def stack_phase_correct(stack: np.ndarray, fov: np.ndarray, first_dim, usfac=1):
     """
     Based on Ohki Lab's stackPhaseCorrect.m.
     Correct phase mismatch in bidirectional scanning with galvano and resonant mirrors
@@ -17,6 +21,10 @@ def stack_phase_correct(stack: np.ndarray, fov: np.ndarray, first_dim):
     first_dim: int
         First dimension, in which bidirectional scan was obtained.
         Usually 1, but sometimes could be 2.
+    usfac: int
+        Upsampling factor of the phase shift estimation.
+        1 for integer pixel shifts, or the shift is estimated within 1/usfac
+        of a pixel and applied by linear interpolation.
 
     Returns
     -------
@@ -25,54 +33,69 @@ def stack_phase_correct(stack: np.ndarray, fov: np.ndarray, first_dim):
     int
         phase shift
     """
-    stack_dim = stack.shape  # (y, x, t) or (y, x, z, t)
-    fov_dim = fov.shape  # (y, x) or (y, x, z)
     assert fov.ndim in [2, 3], "fov must be 2d or 3d"
     assert first_dim in [1, 2], "first_dim must be 1 or 2"
 
-    if first_dim == 1:
-        # separate odd lines and even lines
-        fov = fov.reshape(
-            [fov_dim[0], 2, int(fov_dim[1] / 2), int(np.prod(fov_dim[2:]))],
-            order="F",
-        )
+    # odd lines and even lines,
+    # the columns (first_dim == 1) or the rows (first_dim == 2)
+    line_axis = 2 - first_dim
+    scan_axis = first_dim - 1
+    nlines = fov.shape[line_axis] // 2 * 2
+    even_lines = np.take(fov, np.arange(0, nlines, 2), axis=line_axis)
+    odd_lines = np.take(fov, np.arange(1, nlines, 2), axis=line_axis)
 
-        # estimate phase mismatch
-        outs, out_stack = stack_register_nD(
-            np.squeeze(fov[:, 0, :, :]),
-            np.squeeze(fov[:, 1, :, :]),
+    # estimate phase mismatch
+    if usfac > 1:
+        # 2d registration (of the z projection), within 1/usfac of a pixel
+        if fov.ndim == 3:
+            even_lines, odd_lines = even_lines.mean(axis=2), odd_lines.mean(axis=2)
+        outs = dft_registration(
+            np.fft.fft2(odd_lines.astype(np.float32)),
+            np.fft.fft2(even_lines.astype(np.float32)),
+            usfac,
         )
-        dx = -np.array(outs[2])  # shift
+        dx = -outs[2 + scan_axis]  # shift
+    else:
+        # nD registration of the lines (not squeezed, to keep the scan axis)
+        outs, _ = stack_register_nD(even_lines, odd_lines)
+        dx = -int(outs[2][scan_axis])  # shift
 
-        # align phase of stack
-        stack = stack.reshape(
-            [stack_dim[0], 2, int(stack_dim[1] / 2), int(np.prod(stack_dim[2:]))],
-            order="F",
-        )
-        for i in range(np.prod(stack_dim[2:])):
-            stack[:, 1, :, i] = np.roll(stack[:, 1, :, i], dx, axis=0)
-
-    elif first_dim == 2:
-        # separate odd lines and even lines
-        fov = fov.reshape(
-            [2, int(fov_dim[0] / 2), fov_dim[1], int(np.prod(fov_dim[2:]))],
-            order="F",
-        )
+    # align phase of stack, the odd lines of all frames of a copy in place
+    stack = stack.copy()
+    lines = (slice(None),) * line_axis + (slice(1, None, 2),)
+    shift_lines(stack[lines], dx, scan_axis)
 
-        # estimate phase mismatch
-        outs, outstack = stack_register_nD(
-            np.squeeze(fov[0, :, :, :]),
-            np.squeeze(fov[1, :, :, :]),
-        )
-        dx = -np.array(outs[2])  # shift
+    return stack, dx
 
-        # align phase of stack
-        stack = stack.reshape(
-            [2, int(stack_dim[0] / 2), stack_dim[1], int(np.prod(stack_dim[2:]))],
-            order="F",
-        )
-        for i in range(np.prod(stack_dim[2:])):
-            stack[1, :, :, i] = np.roll(stack[1, :, :, i], dx, axis=1)
 
-    stack = stack.reshape(stack_dim, order="F")
-    return stack, dx
+def shift_lines(lines: np.ndarray, shift, axis: int) -> None:
+    """
+    Circular shift of the lines (y, x, ...) along axis (0 or 1) in place,
+    with the linear interpolation of a sub-pixel shift.
+    The frames (the last axis of 3d or more lines) are shifted in blocks.
+    """
+    if shift == 0:
+        return
+    if lines.ndim < 3:
+        lines[...] = shift_block(lines, shift, axis)
+        return
+
+    nframes = lines.shape[-1]
+    block_size = max(BLOCK_NBYTES // max(lines[..., 0].nbytes, 1), 1)
+    for start in range(0, nframes, block_size):
+        block = lines[..., start : start + block_size]
+        block[...] = shift_block(block, shift, axis)
+
+
+def shift_block(block: np.ndarray, shift, axis: int) -> np.ndarray:
+    n = int(np.floor(shift))
+    fraction = shift - n
+    if fraction == 0:
+        return np.roll(block, n, axis=axis)
+
+    shifted = (1 - fraction) * np.roll(block, n, axis=axis) + fraction * np.roll(
+        block, n + 1, axis=axis
+    )
+    if np.issubdtype(block.dtype, np.integer):
+        shifted = np.rint(shifted)
+    return shifted.astype(block.dtype)
@@ -1,13 +1,20 @@
 import numpy as np
 
 from studio.app.optinist.wrappers.expdb.dft_registration import (
-    dft_registration,
+    dft_registration_frames,
     dft_registration_nD,
 )
 from studio.app.optinist.wrappers.expdb.stack_average import stack_average
 
 
-def stack_register(stack: np.ndarray, target: np.ndarray, usfac: int):
+def stack_register(
+    stack: np.ndarray,
+    target: np.ndarray,
+    usfac: int,
+    block_size: int = 32,
+    workers: int = 1,
+    use_float32: bool = False,
+):
     """
     Fourier-domain subpixel 2d rigid body registration.
 
@@ -19,6 +26,12 @@ def stack_register(stack: np.ndarray, target: np.ndarray, usfac: int):
         2d array
     usfac : int
         upsampling factor
+    block_size : int
+        number of frames transformed at once
+    workers : int
+        number of threads to register blocks in parallel
+    use_float32 : bool
+        compute in single precision (faster, less memory)
 
     Returns
     -------
@@ -29,21 +42,21 @@ def stack_register(stack: np.ndarray, target: np.ndarray, usfac: int):
         outs(:,2) is net row shift
         outs(:,3) is net column shift
     """
-    from numpy.fft import fft2, ifft2
+    from scipy.fft import fft2
 
-    target = fft2(target.astype(np.float32))
+    dtype = np.float32 if use_float32 else np.float64
+    target = fft2(target.astype(np.float32).astype(dtype))
     nframes = stack.shape[-1]
     outs = np.empty((nframes, 4))
 
-    for i in range(nframes):
-        slice_ = fft2(stack[:, :, i].astype(np.float32))
-        error, diffphase, row_shift, col_shift, greg = dft_registration(
-            target, slice_, usfac
-        )
-        outs[i, :] = [error, diffphase, row_shift, col_shift]
+    def register_block(start):
+        stop = min(start + block_size, nframes)
+        frames = __read_frames(stack, start, stop, dtype)
 
-        if greg is not None:
-            stack[:, :, i] = np.abs(ifft2(greg)).astype(stack.dtype)
+        outs[start:stop], registered = dft_registration_frames(target, frames, usfac)
+        stack[..., start:stop] = np.moveaxis(registered, 0, -1).astype(stack.dtype)
+
+    __run_blocks(register_block, nframes, block_size, workers)
 
     return outs, stack
 
@@ -71,6 +84,9 @@ def stack_register_3d(
     target: np.ndarray,
     le: int,
     shift_method: str,
+    block_size: int = 32,
+    workers: int = 1,
+    use_float32: bool = False,
 ):
     """
     DFT-based xy registration of 3D stacks
@@ -91,6 +107,12 @@ def stack_register_3d(
     shift_method: str
         'circ' circular shift
         'zero' shift and pad by zero
+    block_size : int
+        number of frames transformed at once
+    workers : int
+        number of threads to register blocks in parallel
+    use_float32 : bool
+        compute in single precision (faster, less memory)
 
     Returns
     -------
@@ -103,7 +125,7 @@ def stack_register_3d(
     ndarray
         registered stack
     """
-    from numpy.fft import fftn, ifftn
+    from scipy.fft import irfftn, rfftn
 
     # reshape stack to handle 3d (y, x, z, t)
     if stack.ndim < 4:  # (y, x, t)
@@ -116,8 +138,11 @@ def stack_register_3d(
         for z in range(nz):
             realign_params, stack[:, :, z, :] = stack_register(
                 stack[:, :, z, :],
-                stack_average(stack[:, :, z, :], period=1),
+                stack_average(stack[:, :, z, :], period=1)[:, :, 0],
                 usfac=100,
+                block_size=block_size,
+                workers=workers,
+                use_float32=use_float32,
             )
             # insert shifts
             result_params.extend(realign_params[:, 2:4])
@@ -129,33 +154,68 @@ def stack_register_3d(
     else:
         plane_index = np.arange(nz)
 
-    target = fftn(target[:, :, plane_index].astype(np.float32))
+    dtype = np.float32 if use_float32 else np.float64
+    axes = (1, 2, 3)
+    target = rfftn(target[:, :, plane_index].astype(np.float32).astype(dtype))
     result_params = np.zeros((nframes, 3))
 
-    for i in range(nframes):
-        original = np.squeeze(stack[:, :, :, i])
-        source = original[:, :, plane_index]
-        f_stack = fftn(source.astype(np.float32))
-        ref_v = ifftn(target * np.conj(f_stack))
-        loc = np.unravel_index(np.argmax(np.abs(ref_v)), ref_v.shape)
-        loc_row, loc_col = loc[:2]
+    rd_2 = int(np.fix(ny / 2))
+    cd_2 = int(np.fix(nx / 2))
+
+    def register_block(start):
+        stop = min(start + block_size, nframes)
+        original = np.moveaxis(stack[..., start:stop], -1, 0)  # (k, y, x, z)
+        source = original[..., plane_index].astype(np.float32).astype(dtype)
 
-        rd_2 = int(np.fix(ny / 2))
-        cd_2 = int(np.fix(nx / 2))
+        # the crosscorrelation of real volumes is real
+        f_stack = rfftn(source, axes=axes)
+        ref_v = irfftn(target * np.conj(f_stack), s=source.shape[1:], axes=axes)
+        loc = np.argmax(np.abs(ref_v).reshape(len(source), -1), axis=1)
+        loc_row, loc_col, _ = np.unravel_index(loc, source.shape[1:])
 
-        row_shift = loc_row - ny if loc_row > rd_2 else loc_row
-        col_shift = loc_col - nx if loc_col > cd_2 else loc_col
+        row_shift = np.where(loc_row > rd_2, loc_row - ny, loc_row)
+        col_shift = np.where(loc_col > cd_2, loc_col - nx, loc_col)
 
-        if shift_method == "circ":
-            stack[:, :, :, i] = np.roll(original, [row_shift, col_shift, 0])
-        else:
-            stack[:, :, :, i] = translate_stack(original, row_shift, col_shift, 0)
+        for i, (y, x) in enumerate(zip(row_shift, col_shift)):
+            if shift_method == "circ":
+                stack[..., start + i] = np.roll(original[i], (y, x), axis=(0, 1))
+            else:
+                stack[..., start + i] = translate_stack(original[i], y, x, 0)
 
-        result_params[i, :] = [row_shift, col_shift, 0]
+        result_params[start:stop, 0] = row_shift
+        result_params[start:stop, 1] = col_shift
+
+    __run_blocks(register_block, nframes, block_size, workers)
 
     return result_params, stack
 
 
+def __read_frames(stack: np.ndarray, start: int, stop: int, dtype) -> np.ndarray:
+    """
+    Read frames [start, stop) of (y, x, t) stack as (k, y, x) array,
+    casted to float32 first (as the registration of single frame).
+    """
+    frames = np.moveaxis(stack[..., start:stop], -1, 0).astype(np.float32, order="C")
+    return frames.astype(dtype, copy=False)
+
+
+def __run_blocks(func, nframes: int, block_size: int, workers: int) -> None:
+    """
+    Run func for each block of frames, in parallel if workers > 1.
+    (FFTs and most of the numpy operations release the GIL)
+    """
+    starts = range(0, nframes, block_size)
+
+    if workers > 1:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(func, starts))
+    else:
+        for start in starts:
+            func(start)
+
+
 def stack_register_nD(stack: np.ndarray, target: np.ndarray):
     """
     Based on DFTREGISTRATION by Manuel Guizar
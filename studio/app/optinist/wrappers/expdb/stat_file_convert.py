@@ -1,11 +1,12 @@
 import numpy as np
 from scipy.signal import lfilter
 
+from studio.app.common.core.utils.rolling_percentile import rolling_percentile
 from studio.app.optinist.core.nwb.nwb import NWBDATASET
 from studio.app.optinist.dataclass import ExpDbData, StatData
 
 
-def percentile_tc(tc_data: np.ndarray, window, n_percentile):
+def percentile_tc(tc_data: np.ndarray, window, n_percentile, workers=1):
     half_window = int(np.floor(window / 2))
     shape = tc_data.shape
 
@@ -17,13 +18,11 @@ def percentile_tc(tc_data: np.ndarray, window, n_percentile):
         )
     )
 
-    percentiled = np.zeros(shape)
-    for i in range(shape[0]):
-        # method='hazen' is same as matlab's prctile method
-        percentiled[i] = np.percentile(
-            tc_data[i : window + i, :], n_percentile, axis=0, method="hazen"
-        )
-    return percentiled
+    # method='hazen' is same as matlab's prctile method
+    percentiled = rolling_percentile(
+        tc_data, window, n_percentile, axis=0, method="hazen", workers=workers
+    )
+    return percentiled[: shape[0]]
 
 
 def moving_average_tc(tc_data: np.ndarray, tclength, window):
@@ -45,7 +44,12 @@ def moving_average_tc(tc_data: np.ndarray, tclength, window):
 
 
 def detrend_tc(
-    tc_data: np.ndarray, percentile_window, n_percentile, moving_avg_window, nbinning
+    tc_data: np.ndarray,
+    percentile_window,
+    n_percentile,
+    moving_avg_window,
+    nbinning,
+    workers=1,
 ):
     """
     Args:
@@ -53,6 +57,7 @@ def detrend_tc(
         percentile_window : percentile filter window
         moving_avg_window : moving average window
         nbinning : option (for smoothing)
+        workers : number of processes for the percentile filter
 
     trend : estimated trend (percentile filter + moving average)
     trend_raw : estimated trend (percentile filter)
@@ -71,7 +76,7 @@ def detrend_tc(
         ),
         [nbinning, 1, 1],
     ).reshape((tc_len, ncells), order="F")
-    trend_raw = percentile_tc(tiled_tc, percentile_window, n_percentile)
+    trend_raw = percentile_tc(tiled_tc, percentile_window, n_percentile, workers)
 
     trend = moving_average_tc(trend_raw, tc_len, moving_avg_window)
 
@@ -218,6 +223,7 @@ def stat_file_convert(
         params["n_percentile"],
         params["moving_avg_window"],
         params["nbinning"],
+        params.get("workers", 1),
     )
 
     tc_detrended_sorted = sort_tc(
@@ -7,17 +7,22 @@ from studio.app.optinist.dataclass.stat import StatData
 
 
 def get_1d_vector_average(ratio):
-    nstim_per_run = ratio.shape[0]
-    vx, vy, sum = 0, 0, 0
-
-    for i in range(nstim_per_run):
-        a = max(ratio[i], 0)
-        vx += a * math.cos(i * 2 * math.pi / nstim_per_run)
-        vy += a * math.sin(i * 2 * math.pi / nstim_per_run)
-        sum += a
-    vector_angle = np.mod(math.atan2(vy, vx) * 180 / math.pi, 360)
+    """
+    Vector average of the responses to the stims over a cycle,
+    along the last axis of ratio (..., nstim_per_run), e.g. of all cells at once.
+    """
+    nstim_per_run = ratio.shape[-1]
+    angles = np.arange(nstim_per_run) * 2 * math.pi / nstim_per_run
+    # (cos, sin) of each stim
+    unit_vectors = np.stack([np.cos(angles), np.sin(angles)], axis=1)
+
+    a = np.maximum(ratio, 0)
+    vx, vy = np.moveaxis(a @ unit_vectors, -1, 0)
+    sum = a.sum(axis=-1)
+    vector_angle = np.mod(np.arctan2(vy, vx) * 180 / math.pi, 360)
     vector_mag = (vx**2 + vy**2) ** 0.5
-    vector_tune = vector_mag / sum if sum > 0 else 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        vector_tune = np.where(sum > 0, vector_mag / sum, 0)
 
     return vector_angle, vector_mag, vector_tune
 
@@ -25,17 +30,16 @@ def get_1d_vector_average(ratio):
 def vector_average(
     stat: StatData, output_dir: str, params: dict = None, **kwargs
 ) -> dict(stat=StatData):
-    for i in range(stat.ncells):
-        (
-            stat.dir_vector_angle[i],
-            stat.dir_vector_mag[i],
-            stat.dir_vector_tune[i],
-        ) = get_1d_vector_average(stat.dir_ratio_change[i])
-        (
-            stat.ori_vector_angle[i],
-            stat.ori_vector_mag[i],
-            stat.ori_vector_tune[i],
-        ) = get_1d_vector_average(stat.ori_ratio_change[i])
+    (
+        stat.dir_vector_angle,
+        stat.dir_vector_mag,
+        stat.dir_vector_tune,
+    ) = get_1d_vector_average(stat.dir_ratio_change)
+    (
+        stat.ori_vector_angle,
+        stat.ori_vector_mag,
+        stat.ori_vector_tune,
+    ) = get_1d_vector_average(stat.ori_ratio_change)
 
     stat.ori_vector_angle /= 2
     stat.set_vector_average_props()
@@ -2,9 +2,17 @@ import numpy as np
 
 from studio.app.common.core.experiment.experiment import ExptOutputPathIds
 from studio.app.common.core.logger import AppLogger
+from studio.app.common.core.utils.rolling_percentile import rolling_percentile
 from studio.app.common.dataclass import ImageData
 from studio.app.optinist.core.nwb.nwb import NWBDATASET
-from studio.app.optinist.dataclass import EditRoiData, FluoData, IscellData, RoiData
+from studio.app.optinist.dataclass import (
+    EditRoiData,
+    FluoData,
+    IscellData,
+    MovieRef,
+    RoiData,
+    RoiMasks,
+)
 
 logger = AppLogger.get_logger()
 
@@ -31,35 +39,30 @@ def lccd_detect(
 
     reshapedD = D.reshape([D.shape[0] * D.shape[1], D.shape[2]])
     timeseries = np.zeros([num_cell, num_frames])
-    roi_list = []
 
     for i in range(num_cell):
-        roi_list.append((roi[:, i].reshape([D.shape[0], D.shape[1]])) * (i + 1))
         timeseries[i, :] = np.mean(reshapedD[roi[:, i] > 0, :], axis=0)
 
-    im = np.stack(roi_list)
-    im = im.astype(np.float64)
-    im[im == 0] = np.nan
-    im -= 1
+    im = RoiMasks.from_matrix(roi.T, D.shape[:2])
 
-    empty_roi = np.full_like(im[0], np.nan)
-    roi_image = np.nanmax(im[iscell != 0], axis=0).astype(float)
+    empty_roi = np.full(D.shape[:2], np.nan)
+    roi_image = im.render(iscell != 0)
 
+    # f0 of frame k: percentile of frames [k - f0_frames, k + f0_frames)
     timeseries_dff = np.ones([num_cell, num_frames]) * np.nan
-    for i in range(num_cell):
-        for k in range(num_frames):
-            if (k - dff_f0_frames >= 0) and (k + dff_f0_frames < num_frames):
-                f0 = np.percentile(
-                    timeseries[i, k - dff_f0_frames : k + dff_f0_frames],
-                    dff_f0_percentile,
-                )
-                timeseries_dff[i, k] = (timeseries[i, k] - f0) / f0
+    dff_frames = slice(dff_f0_frames, max(num_frames - dff_f0_frames, dff_f0_frames))
+    f0 = rolling_percentile(timeseries, 2 * dff_f0_frames, dff_f0_percentile)
+    f0 = f0[:, : dff_frames.stop - dff_frames.start]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        timeseries_dff[:, dff_frames] = (timeseries[:, dff_frames] - f0) / f0
 
-    roi_list = [{"image_mask": roi[:, i].reshape(D.shape[:2])} for i in range(num_cell)]
+    roi_list = [{"pixel_mask": im.pixel_mask(i)} for i in range(num_cell)]
 
     nwbfile = {}
     nwbfile[NWBDATASET.ROI] = {function_id: roi_list}
-    nwbfile[NWBDATASET.POSTPROCESS] = {function_id: {"all_roi_img": im}}
+    nwbfile[NWBDATASET.POSTPROCESS] = {
+        function_id: {"all_roi_pixel_mask": im.to_pixel_table()}
+    }
 
     nwbfile[NWBDATASET.COLUMN] = {
         function_id: {
@@ -94,7 +97,7 @@ def lccd_detect(
         "non_cell_roi": RoiData(
             empty_roi, output_dir=output_dir, file_name="non_cell_roi"
         ),
-        "edit_roi_data": EditRoiData(images=mc_images.data, im=im),
+        "edit_roi_data": EditRoiData(images=MovieRef.from_image(mc_images), im=im),
         "nwbfile": nwbfile,
     }
 
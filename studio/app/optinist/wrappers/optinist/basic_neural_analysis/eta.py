@@ -1,5 +1,5 @@
 import numpy as np
-from scipy.stats import mode
+from numpy.lib.stride_tricks import sliding_window_view
 
 from studio.app.common.core.experiment.experiment import ExptOutputPathIds
 from studio.app.common.core.logger import AppLogger
@@ -9,63 +9,93 @@ from studio.app.optinist.dataclass import BehaviorData, FluoData, IscellData
 
 logger = AppLogger.get_logger()
 
+# max size of the event windows gathered at once
+BLOCK_NBYTES = 64 * 1024**2
+
 
 def calc_trigger(behavior_data, trigger_type, trigger_threshold):
     behavior_data = np.array(behavior_data, dtype=float)
     flg = np.array(behavior_data > trigger_threshold, dtype=int)
-    trigger_idx = []
-    trigger_lengths = []
-
-    def find_trigger_length(index, flag_value):
-        length = 0
-        while index < len(flg) and flg[index] == flag_value:
-            index += 1  # from initial trigger find subsequent end of trigger
-            length += 1  # record the length of each trigger
-        return length
-
-    i = 0
-    while i < len(flg):
-        if (
-            (trigger_type == "up" and flg[i] == 1 and (i == 0 or flg[i - 1] == 0))
-            or (trigger_type == "down" and flg[i] == 0 and i > 0 and flg[i - 1] == 1)
-            or (
-                trigger_type == "cross"
-                and (
-                    (flg[i] == 1 and (i == 0 or flg[i - 1] == 0))
-                    or (flg[i] == 0 and i > 0 and flg[i - 1] == 1)
-                )
-            )
-        ):
-            length = find_trigger_length(i, flg[i])
-            trigger_idx.append(i)
-            trigger_lengths.append(length)
-            i += length
-        else:
-            i += 1
-    if trigger_lengths:
-        trigger_len = mode(trigger_lengths).mode[0]  # find most common length
-        trigger_idx = [
-            idx
-            for idx, length in zip(trigger_idx, trigger_lengths)
-            if length == trigger_len  # if trigger_len is different (boundary cut-offs)
-        ]  # don't include
-        trigger_idx = np.array(trigger_idx)
-        return trigger_idx, trigger_len
+    if len(flg) == 0:
+        return [], 0
+
+    # run-length encoding of the flags (the starts, lengths and values of the runs)
+    run_starts = np.concatenate(([0], np.flatnonzero(np.diff(flg)) + 1))
+    run_lengths = np.diff(np.append(run_starts, len(flg)))
+    run_values = flg[run_starts]
+
+    # triggers are the starts of the runs of 1 (up), of 0 after 1 (down) or both
+    if trigger_type == "up":
+        is_trigger = run_values == 1
+    elif trigger_type == "down":
+        is_trigger = (run_values == 0) & (run_starts > 0)
+    elif trigger_type == "cross":
+        is_trigger = (run_values == 1) | (run_starts > 0)
     else:
-        return trigger_idx, 0
+        is_trigger = np.zeros(len(run_starts), dtype=bool)
+
+    trigger_idx = run_starts[is_trigger]
+    trigger_lengths = run_lengths[is_trigger]
+    if len(trigger_idx) == 0:
+        return [], 0
+
+    # find most common length (the shortest of the ties)
+    lengths, counts = np.unique(trigger_lengths, return_counts=True)
+    trigger_len = lengths[np.argmax(counts)]
+
+    # if trigger_len is different (boundary cut-offs), don't include
+    return trigger_idx[trigger_lengths == trigger_len], trigger_len
+
+
+def get_event_starts(num_frame, trigger_idx, trigger_len, pre_event, post_event):
+    """
+    The first frames of the event windows within the data, and the window length.
+    """
+    # use abs to make sure neg value
+    window = abs(pre_event) + trigger_len + post_event
+    starts = np.asarray(trigger_idx, dtype=int) - abs(pre_event)
+    starts = starts[(starts >= 0) & (starts + window <= num_frame)]
+    return starts, window
 
 
 def calc_trigger_average(neural_data, trigger_idx, trigger_len, pre_event, post_event):
-    num_frame = neural_data.shape[0]
-    event_trigger_data = []
-    for idx in trigger_idx:
-        event_start = idx - abs(pre_event)  # use abs to make sure neg value
-        event_end = idx + trigger_len + post_event
-        if event_end <= num_frame and event_start >= 0:
-            event_trigger_data.append(neural_data[event_start:event_end])
-    # Convert to numpy array (num_event, cell_number, event_time)
-    event_trigger_data = np.array(event_trigger_data)
-    return event_trigger_data
+    starts, window = get_event_starts(
+        neural_data.shape[0], trigger_idx, trigger_len, pre_event, post_event
+    )
+    if len(starts) == 0 or window < 1:
+        return np.empty((0, max(window, 0), *neural_data.shape[1:]))
+
+    # all event windows at once, as a view of (frame, cell_number, event_time)
+    windows = sliding_window_view(neural_data, window, axis=0)
+
+    # Convert to numpy array (num_event, event_time, cell_number)
+    return np.swapaxes(windows[starts], 1, 2)
+
+
+def calc_trigger_stats(neural_data, trigger_idx, trigger_len, pre_event, post_event):
+    """
+    Mean, std and sem over the events of the event triggered data
+    (cell_number, event_time), and the number of the events.
+    The event windows are gathered in blocks of events.
+    """
+    starts, window = get_event_starts(
+        neural_data.shape[0], trigger_idx, trigger_len, pre_event, post_event
+    )
+    num_event = len(starts)
+    if num_event == 0 or window < 1:
+        return None, None, None, 0
+
+    neural_data = np.asarray(neural_data, dtype=float)
+    windows = sliding_window_view(neural_data, window, axis=0)
+    block_size = max(BLOCK_NBYTES // (windows[0].size * 8), 1)
+    blocks = [starts[i : i + block_size] for i in range(0, num_event, block_size)]
+
+    mean = sum(windows[block].sum(axis=0) for block in blocks) / num_event
+    var = sum(((windows[block] - mean) ** 2).sum(axis=0) for block in blocks)
+    std = np.sqrt(var / num_event)
+    sem = std / np.sqrt(num_event)
+
+    return mean, std, sem, num_event
 
 
 def ETA(
@@ -111,21 +141,12 @@ def ETA(
         Y, params["trigger_type"], params["trigger_threshold"]
     )
 
-    # calculate Triggered average
-    event_trigger_data = calc_trigger_average(
+    # calculate Triggered average and its std and sem over the events
+    # (cell_number, event_time_lambda)
+    mean, std, sem, num_event = calc_trigger_stats(
         X, trigger_idxs, trigger_len, params["pre_event"], params["post_event"]
     )
-
-    # (cell_number, event_time_lambda)
-    if len(event_trigger_data) > 0:
-        mean = np.mean(event_trigger_data, axis=0)
-        std = np.std(event_trigger_data, axis=0)
-        sem = np.std(event_trigger_data, axis=0) / np.sqrt(len(event_trigger_data))
-        mean = mean.transpose()
-        std = std.transpose()
-        sem = sem.transpose()
-    else:
-        assert False, "Output data size is 0"
+    assert num_event > 0, "Output data size is 0"
 
     nwbfile = {}
     nwbfile[NWBDATASET.POSTPROCESS] = {
@@ -6,6 +6,97 @@ from studio.app.optinist.dataclass import FluoData, IscellData
 
 logger = AppLogger.get_logger()
 
+# max size of the (sources, shuffles, nfft) correlations computed at once
+BLOCK_NBYTES = 64 * 1024**2
+
+
+def correlate_spectra(source_spectra, target_spectra, lags, nfft):
+    """
+    Cross correlations of each source and each target from their spectra,
+    (sources, targets, lags) at the lags, the same as `scipy.signal.correlate`.
+    """
+    import numpy as np
+    import scipy.fft as fft
+
+    products = source_spectra[:, np.newaxis, :] * np.conj(target_spectra)
+    return fft.irfft(products, nfft, axis=-1)[..., lags % nfft]
+
+
+def correlate_targets(X, targets, lags, nfft, shuffle_num, seed):
+    """
+    Cross correlations of all cells of X (cells x time) with the target cells,
+    and the mean and sem of those with shuffled targets (shuffle_num surrogates
+    of each target, shared by all source cells).
+    Returns the arrays of (cells, targets, lags).
+    """
+    import numpy as np
+    import scipy.fft as fft
+
+    rng = np.random.default_rng(seed)
+    num_cell, data_len = X.shape
+    spectra = fft.rfft(X, nfft, axis=-1)
+
+    mat = np.zeros([num_cell, len(targets), len(lags)])
+    s_mean = np.zeros([num_cell, len(targets), len(lags)])
+    s_sem = np.zeros([num_cell, len(targets), len(lags)])
+
+    block_size = max(BLOCK_NBYTES // (max(shuffle_num, 1) * nfft * 8), 1)
+    for t, j in enumerate(targets):
+        mat[:, t] = correlate_spectra(spectra, spectra[[j]], lags, nfft)[:, 0]
+        if shuffle_num < 1:
+            continue
+
+        # surrogates of the target, as random permutations in a batch
+        permutations = np.argsort(rng.random([shuffle_num, data_len]), axis=1)
+        surrogate_spectra = fft.rfft(X[j][permutations], nfft, axis=-1)
+
+        for start in range(0, num_cell, block_size):
+            sources = slice(start, start + block_size)
+            ccvals = correlate_spectra(spectra[sources], surrogate_spectra, lags, nfft)
+            s_mean[sources, t] = ccvals.mean(axis=1)
+            if shuffle_num > 1:
+                s_sem[sources, t] = ccvals.std(axis=1, ddof=1) / np.sqrt(shuffle_num)
+            else:
+                s_sem[sources, t] = np.nan
+
+    return mat, s_mean, s_sem
+
+
+def correlate_all_pairs(X, lags, shuffle_num, workers=1):
+    """
+    Cross correlations of all pairs of cells of X (cells x time) at the lags,
+    and the mean and sem of the shuffled baselines,
+    as arrays of (cells, cells, lags).
+
+    Each cell is transformed once, with the zero padding required for the lags,
+    and the targets are processed in chunks in parallel if workers > 1.
+    """
+    import numpy as np
+    import scipy.fft as fft
+
+    num_cell, data_len = X.shape
+    nfft = fft.next_fast_len(data_len + int(np.max(np.abs(lags), initial=0)))
+
+    n_chunks = min(max(workers, 1) * 4, num_cell) if workers > 1 else 1
+    chunks = [c for c in np.array_split(np.arange(num_cell), n_chunks) if len(c)]
+    seeds = np.random.randint(np.iinfo(np.int32).max, size=len(chunks))
+    tasks = [
+        (X, targets, lags, nfft, shuffle_num, seed)
+        for targets, seed in zip(chunks, seeds)
+    ]
+
+    if workers > 1 and len(chunks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(correlate_targets, *zip(*tasks)))
+    else:
+        results = [correlate_targets(*task) for task in tasks]
+
+    return tuple(
+        np.concatenate([result[i] for result in results], axis=1) for i in range(3)
+    )
+
 
 def cross_correlation(
     neural_data: FluoData,
@@ -19,7 +110,6 @@ def cross_correlation(
     import numpy as np
     import scipy.signal as ss
     import scipy.stats as stats
-    from tqdm import tqdm
 
     function_id = ExptOutputPathIds(output_dir).function_id
     logger.info("start cross_correlation: %s", function_id)
@@ -37,50 +127,33 @@ def cross_correlation(
         ind = np.where(iscell > 0)[0]
         X = X[ind, :]
 
+    X = np.asarray(X, dtype="float64")
+
     # calculate cross correlation
     num_cell = X.shape[0]
     data_len = X.shape[1]
     shuffle_num = params["shuffle_sample_number"]
 
     lags = ss.correlation_lags(data_len, data_len, mode="same")
-    ind = np.intersect1d(
-        np.where(-params["lags"] <= lags), np.where(lags <= params["lags"])
+    x = lags[(-params["lags"] <= lags) & (lags <= params["lags"])]
+
+    mat, s_mean, b_sem = correlate_all_pairs(
+        X, x, shuffle_num, workers=params.get("workers", 1)
     )
-    x = lags[ind]
-
-    mat = np.zeros([num_cell, num_cell, len(x)])
-    s_confint = np.zeros([num_cell, num_cell, len(x), 2])
-    s_mean = np.zeros([num_cell, num_cell, len(x)])
-
-    for i in tqdm(range(num_cell)):
-        # for i in tqdm(range(3)):
-        for j in tqdm(range(num_cell)):
-            ccvals = ss.correlate(
-                X[i, :], X[j, :], method=params["method"], mode="same"
-            )
-            mat[i, j, :] = ccvals[ind]
-
-            # baseline
-            tp_s_mat = np.zeros([len(x), shuffle_num])
-            for k in range(shuffle_num):
-                tp = X[j, :]
-                np.random.shuffle(tp)
-                ccvals = ss.correlate(X[i, :], tp, method=params["method"], mode="same")
-                tp_s_mat[:, k] = ccvals[ind]
-
-            b_mean = np.mean(tp_s_mat, axis=1)
-            b_sem = stats.sem(tp_s_mat, axis=1)
-            b_df = shuffle_num - 1
-
-            interval = np.zeros([len(x), 2])
-            for k in range(len(x)):
-                interval[k, :] = stats.t.interval(
-                    params["shuffle_confidence_interval"], b_df, loc=0, scale=b_sem[k]
-                )
-
-            s_confint[i, j, :, 0] = interval[:, 0]
-            s_confint[i, j, :, 1] = interval[:, 1]
-            s_mean[i, j, :] = b_mean
+
+    # baseline confidence interval,
+    # the same as stats.t.interval(confidence, df, loc=0, scale=sem) for each lag
+    b_df = shuffle_num - 1
+    t_value = stats.t.ppf((1 + params["shuffle_confidence_interval"]) / 2, b_df)
+    with np.errstate(invalid="ignore"):
+        half_width = np.where(b_sem > 0, t_value * b_sem, np.nan)
+
+    s_confint = np.stack([-half_width, half_width], axis=-1)
+
+    # pairs of cells of the outputs
+    cb = np.array(list(itertools.combinations(range(num_cell), 2)), dtype=int)
+    cb = cb.reshape(-1, 2)  # (pairs, 2) even without pairs
+    pair_numbers = np.arange(len(cb))
 
     # NWB追加
     nwbfile = {}
@@ -89,6 +162,7 @@ def cross_correlation(
             "mat": mat,
             "baseline": s_mean,
             "base_confint": s_confint,
+            "pairs": cb,
         }
     }
 
@@ -97,24 +171,20 @@ def cross_correlation(
         "nwbfile": nwbfile
     }
 
-    # output structures
-    cb = list(itertools.combinations(range(num_cell), 2))
-
-    for i in range(len(cb)):
-        arr1 = np.stack([x, mat[cb[i][0], cb[i][1], :]], axis=1)
-        arr2 = np.stack(
-            [
-                x,
-                s_mean[cb[i][0], cb[i][1], :],
-                s_confint[cb[i][0], cb[i][1], :, 0],
-                s_confint[cb[i][0], cb[i][1], :, 1],
-            ],
-            axis=1,
-        )
-
-    name = f"{str(cb[i][0])}-{str(cb[i][1])}"
-    info[name] = TimeSeriesData(arr1.T, file_name=name)
-    name = f"shuffle {str(cb[i][0])}-{str(cb[i][1])}"
-    info[name] = TimeSeriesData(arr2.T, file_name=name)
+    # output structures, all pairs in a timeseries (as the cells of it)
+    info["cross_correlation"] = TimeSeriesData(
+        mat[cb[:, 0], cb[:, 1]],
+        index=x,
+        cell_numbers=pair_numbers,
+        file_name="cross_correlation",
+    )
+    # the baseline with the half width of its confidence interval
+    info["shuffle"] = TimeSeriesData(
+        s_mean[cb[:, 0], cb[:, 1]],
+        std=half_width[cb[:, 0], cb[:, 1]],
+        index=x,
+        cell_numbers=pair_numbers,
+        file_name="shuffle",
+    )
 
     return info
@@ -8,6 +8,152 @@ from studio.app.optinist.wrappers.optinist.utils import standard_norm
 logger = AppLogger.get_logger()
 
 
+def get_granger_lags(maxlag):
+    """
+    The lags tested by `grangercausalitytests(x, maxlag)`.
+    """
+    import numpy as np
+
+    if hasattr(maxlag, "__iter__"):
+        return np.array([int(lag) for lag in maxlag])
+    return np.arange(1, int(maxlag) + 1)
+
+
+def granger_ssr_targets(X, targets, lags, addconst=True):
+    """
+    Sums of squared residuals of the Granger regressions of the target cells
+    of X (time x cells), for each lag:
+
+    - ssr_restricted (targets, lags): target on its own lags
+    - ssr_unrestricted (targets, cells, lags): target on its own lags
+      and the lags of each cell
+
+    The lag matrix of each cell is built once per lag, and the unrestricted
+    regressions of a target are solved for all cells at once, on the lags
+    of the cells residualized on the restricted design (Frisch-Waugh-Lovell).
+    """
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    data_len, num_cell = X.shape
+    ssr_restricted = np.full([len(targets), len(lags)], np.nan)
+    ssr_unrestricted = np.full([len(targets), num_cell, len(lags)], np.nan)
+
+    for k, lag in enumerate(lags):
+        nobs = data_len - lag
+        # (nobs, cells, lag) lags of all cells for the times [lag, data_len)
+        lagged = np.ascontiguousarray(sliding_window_view(X, lag, axis=0)[:nobs])
+        lagged_2d = lagged.reshape(nobs, num_cell * lag)
+
+        for t, i in enumerate(targets):
+            y = X[lag:, i]
+            own = lagged[:, i]
+            if addconst:
+                own = np.column_stack([own, np.ones(nobs)])
+
+            # orthonormal basis of the restricted design
+            u, sv, _ = np.linalg.svd(own, full_matrices=False)
+            u = u[:, sv > sv.max(initial=0) * max(own.shape) * np.finfo(float).eps]
+
+            y_resid = y - u @ (u.T @ y)
+            lagged_resid = (lagged_2d - u @ (u.T @ lagged_2d)).reshape(
+                nobs, num_cell, lag
+            )
+
+            gram = np.einsum("npk,npl->pkl", lagged_resid, lagged_resid)
+            cov = np.einsum("npk,n->pk", lagged_resid, y_resid)
+            explained = np.einsum("pk,pkl,pl->p", cov, np.linalg.pinv(gram), cov)
+
+            ssr_restricted[t, k] = y_resid @ y_resid
+            ssr_unrestricted[t, :, k] = ssr_restricted[t, k] - explained
+            ssr_unrestricted[t, i, k] = np.nan
+
+    return ssr_restricted, ssr_unrestricted
+
+
+def granger_all_pairs(X, lags, addconst=True, workers=1):
+    """
+    Granger causality tests of all pairs of cells of X (time x cells),
+    the same statistics as `grangercausalitytests(X[:, [i, j]], lags)`
+    (whether cell j Granger causes cell i), as arrays of (cells, cells, lags):
+
+    - ssr_ftest: (F, pvalue, df_denom, df_num)
+    - ssr_chi2test: (chi2, pvalue, df)
+    - lrtest: (chi2, pvalue, df)
+    - params_ftest: (F, pvalue, df_denom, df_num)
+
+    The targets are processed in chunks in parallel if workers > 1.
+    """
+    import numpy as np
+    import scipy.stats as stats
+
+    data_len, num_cell = X.shape
+    X = np.asarray(X, dtype="float64")
+
+    n_chunks = min(max(workers, 1) * 4, num_cell) if workers > 1 else 1
+    chunks = [c for c in np.array_split(np.arange(num_cell), n_chunks) if len(c)]
+    tasks = [(X, targets, lags, addconst) for targets in chunks]
+
+    if workers > 1 and len(chunks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(granger_ssr_targets, *zip(*tasks)))
+    else:
+        results = [granger_ssr_targets(*task) for task in tasks]
+
+    ssr_restricted = np.concatenate([result[0] for result in results])
+    ssr_unrestricted = np.concatenate([result[1] for result in results])
+
+    ssr_restricted = ssr_restricted[:, np.newaxis, :]
+    nobs = data_len - lags
+    df_num = np.broadcast_to(lags, ssr_unrestricted.shape).astype(float)
+    df_denom = np.broadcast_to(
+        nobs - 2 * lags - int(addconst), ssr_unrestricted.shape
+    ).astype(float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # infeasible tests (perfect fit) as NaN
+        tss = np.sum((X - X.mean(axis=0) * addconst) ** 2, axis=0)
+        infeasible = (
+            ssr_unrestricted <= tss[:, np.newaxis, np.newaxis] * np.finfo(float).eps
+        )
+        ssr_unrestricted = np.where(infeasible, np.nan, ssr_unrestricted)
+
+        ssr_diff = ssr_restricted - ssr_unrestricted
+        fvalue = ssr_diff / ssr_unrestricted / df_num * df_denom
+        chi2 = nobs * ssr_diff / ssr_unrestricted
+        lr = nobs * np.log(ssr_restricted / ssr_unrestricted)
+
+    ssr_ftest = np.stack(
+        [fvalue, stats.f.sf(fvalue, df_num, df_denom), df_denom, df_num], axis=-1
+    )
+    return {
+        "ssr_ftest": ssr_ftest,
+        "ssr_chi2test": np.stack([chi2, stats.chi2.sf(chi2, df_num), df_num], axis=-1),
+        "lrtest": np.stack([lr, stats.chi2.sf(lr, df_num), df_num], axis=-1),
+        # the F test of the lag coefficients of the cause is the ssr based F test
+        # for OLS (with the nonrobust covariance)
+        "params_ftest": ssr_ftest.copy(),
+    }
+
+
+def coint_pairs(X, pairs, params):
+    """
+    Cointegration tests of the pairs of cells of X (time x cells),
+    as (t statistics, pvalues, critical values) of the pairs.
+    """
+    import numpy as np
+    from statsmodels.tsa.stattools import coint
+
+    results = [coint(X[:, i], X[:, j], **params) for i, j in pairs]
+    return (
+        np.array([result[0] for result in results]),
+        np.array([result[1] for result in results]),
+        np.array([result[2] for result in results]).reshape(-1, 3),
+    )
+
+
 def Granger(
     neural_data: FluoData,
     output_dir: str,
@@ -20,7 +166,7 @@ def Granger(
     import itertools
 
     import numpy as np
-    from statsmodels.tsa.stattools import adfuller, coint, grangercausalitytests
+    from statsmodels.tsa.stattools import adfuller
     from tqdm import tqdm
 
     function_id = ExptOutputPathIds(output_dir).function_id
@@ -40,6 +186,7 @@ def Granger(
         X = X[:, ind]
 
     num_cell = X.shape[1]
+    workers = params.get("workers", 1)
     comb = list(itertools.permutations(range(num_cell), 2))  # combinations with dup
     num_comb = len(comb)
 
@@ -91,68 +238,58 @@ def Granger(
     if params["use_coint_test"]:
         logger.info("Running cointegration test ")
 
-        for i in tqdm(range(num_comb)):
-            tp = coint(X[:, comb[i][0]], X[:, comb[i][1]], **params["coint"])
-            if not np.isnan(tp[0]):
-                cit["cit_count_t"][i] = tp[0]
-            if not np.isnan(tp[1]):
-                cit["cit_pvalue"][i] = tp[1]
-            cit["cit_crit_value"][i, :] = tp[2]
+        chunks = [
+            c
+            for c in np.array_split(np.arange(num_comb), max(workers, 1) * 4)
+            if len(c)
+        ]
+        tasks = [(X, [comb[k] for k in chunk], params["coint"]) for chunk in chunks]
+        if workers > 1 and len(chunks) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(coint_pairs, *zip(*tasks)))
+        else:
+            results = [coint_pairs(*task) for task in tqdm(tasks)]
+
+        if results:
+            count_t, pvalue, crit_value = (
+                np.concatenate([result[i] for result in results]) for i in range(3)
+            )
+            cit["cit_count_t"][:] = np.nan_to_num(count_t, nan=0)
+            cit["cit_pvalue"][:] = np.nan_to_num(pvalue, nan=0)
+            cit["cit_crit_value"][:] = crit_value
 
     #  Granger causality
     logger.info("Running granger test ")
 
-    if hasattr(params["Granger_maxlag"], "__iter__"):
-        num_lag = len(params["Granger_maxlag"])
-    else:
-        num_lag = params["Granger_maxlag"]
+    # The Null hypothesis for grangercausalitytests is
+    # that the time series in the second column1,
+    # does NOT Granger cause the time series in the first column0
+    # column 1 -> column 0
+    # -> the tests of all pairs (column0, column1) at once
+    gc_results = granger_all_pairs(
+        tX,
+        get_granger_lags(params["Granger_maxlag"]),
+        addconst=params["Granger_addconst"],
+        workers=workers,
+    )
 
+    pairs = np.array(comb, dtype=int).reshape(-1, 2)
     GC = {
         "gc_combinations": comb,
-        "gc_ssr_ftest": np.zeros([num_comb, num_lag, 4], dtype="float64"),
-        "gc_ssr_chi2test": np.zeros([num_comb, num_lag, 3], dtype="float64"),
-        "gc_lrtest": np.zeros([num_comb, num_lag, 3], dtype="float64"),
-        "gc_params_ftest": np.zeros([num_comb, num_lag, 4], dtype="float64"),
-        "gc_OLS_restricted": [[0] * num_lag for i in range(num_comb)],
-        "gc_OLS_unrestricted": [[0] * num_lag for i in range(num_comb)],
-        "gc_OLS_restriction_matrix": [[0] * num_lag for i in range(num_comb)],
-        "Granger_fval_mat": [np.zeros([num_cell, num_cell]) for i in range(num_lag)],
+        # ssr based F test (F, pval, df_denom, df_num)
+        "gc_ssr_ftest": gc_results["ssr_ftest"][pairs[:, 0], pairs[:, 1]],
+        # ssr based chi2test (chi2, pval, df)
+        "gc_ssr_chi2test": gc_results["ssr_chi2test"][pairs[:, 0], pairs[:, 1]],
+        # likelihood ratio test (chi2, pval, df)
+        "gc_lrtest": gc_results["lrtest"][pairs[:, 0], pairs[:, 1]],
+        # parameter F test (F, pval, df_denom, df_num)
+        "gc_params_ftest": gc_results["params_ftest"][pairs[:, 0], pairs[:, 1]],
+        # (lags, cells, cells)
+        "Granger_fval_mat": np.moveaxis(gc_results["ssr_ftest"][..., 0], -1, 0).copy(),
     }
-
-    for i in tqdm(range(len(comb))):
-        # The Null hypothesis for grangercausalitytests is
-        # that the time series in the second column1,
-        # does NOT Granger cause the time series in the first column0
-        # column 1 -> column 0
-        tp = grangercausalitytests(
-            tX[:, [comb[i][0], comb[i][1]]],
-            params["Granger_maxlag"],
-            verbose=False,
-            addconst=params["Granger_addconst"],
-        )
-
-        for j in range(len(tp)):  # number of lag
-            GC["gc_ssr_ftest"][i, j, :] = tp[j + 1][0]["ssr_ftest"][
-                0:4
-            ]  # ssr based F test (F, pval, df_denom, df_num)
-            GC["gc_ssr_chi2test"][i, j, :] = tp[j + 1][0]["ssr_chi2test"][
-                0:3
-            ]  # ssr based chi2test (chi2, pval, df)
-            GC["gc_lrtest"][i, j, :] = tp[j + 1][0]["lrtest"][
-                0:3
-            ]  # likelihood ratio test (chi2, pval, df)
-            GC["gc_params_ftest"][i, j, :] = tp[j + 1][0]["params_ftest"][
-                0:4
-            ]  # parameter F test (F, pval, df_denom, df_num)
-            GC["gc_OLS_restricted"][i][j] = tp[j + 1][1][0]
-            GC["gc_OLS_unrestricted"][i][j] = tp[j + 1][1][1]
-            GC["gc_OLS_restriction_matrix"][i][j] = tp[j + 1][1][2]
-
-            GC["Granger_fval_mat"][j][comb[i][0], comb[i][1]] = tp[j + 1][0][
-                "ssr_ftest"
-            ][0]
-
-    GC["Granger_fval_mat"] = np.array(GC["Granger_fval_mat"])
+    GC["Granger_fval_mat"][:, np.arange(num_cell), np.arange(num_cell)] = 0
 
     # main results for plot
     info = {}
@@ -6,7 +6,9 @@ from studio.app.optinist.dataclass import (
     EditRoiData,
     FluoData,
     IscellData,
+    MovieRef,
     RoiData,
+    RoiMasks,
     Suite2pData,
 )
 
@@ -17,7 +19,7 @@ def suite2p_roi(
     ops: Suite2pData, output_dir: str, params: dict = None, **kwargs
 ) -> dict(ops=Suite2pData, fluorescence=FluoData, iscell=IscellData):
     import numpy as np
-    from suite2p import ROI, classification, default_ops, detection, extraction
+    from suite2p import classification, default_ops, detection, extraction
 
     function_id = ExptOutputPathIds(output_dir).function_id
     logger.info("start suite2p_roi: %s", function_id)
@@ -52,17 +54,9 @@ def suite2p_roi(
     iscell = classification.classify(stat=stat, classfile=classfile)
     iscell = iscell[:, 0].astype(int)
 
-    arrays = []
-    for i, s in enumerate(stat):
-        array = ROI(
-            ypix=s["ypix"], xpix=s["xpix"], lam=s["lam"], med=s["med"], do_crop=False
-        ).to_array(Ly=ops["Ly"], Lx=ops["Lx"])
-        array *= i + 1
-        arrays.append(array)
-
-    im = np.stack(arrays)
-    im[im == 0] = np.nan
-    im -= 1
+    im = RoiMasks.from_pixels(
+        [s["ypix"] for s in stat], [s["xpix"] for s in stat], (ops["Ly"], ops["Lx"])
+    )
 
     # roiを追加
     roi_list = []
@@ -77,7 +71,9 @@ def suite2p_roi(
     nwbfile = {}
 
     nwbfile[NWBDATASET.ROI] = {function_id: roi_list}
-    nwbfile[NWBDATASET.POSTPROCESS] = {function_id: {"all_roi_img": im}}
+    nwbfile[NWBDATASET.POSTPROCESS] = {
+        function_id: {"all_roi_pixel_mask": im.to_pixel_table()}
+    }
 
     # iscellを追加
     nwbfile[NWBDATASET.COLUMN] = {
@@ -122,20 +118,20 @@ def suite2p_roi(
         "Vcorr": ImageData(ops["Vcorr"], output_dir=output_dir, file_name="Vcorr"),
         "fluorescence": FluoData(F, file_name="fluorescence"),
         "iscell": IscellData(iscell, file_name="iscell"),
-        "all_roi": RoiData(
-            np.nanmax(im, axis=0), output_dir=output_dir, file_name="all_roi"
-        ),
+        "all_roi": RoiData(im.render(), output_dir=output_dir, file_name="all_roi"),
         "non_cell_roi": RoiData(
-            np.nanmax(im[iscell == 0], axis=0),
+            im.render(iscell == 0),
             output_dir=output_dir,
             file_name="noncell_roi",
         ),
         "cell_roi": RoiData(
-            np.nanmax(im[iscell != 0], axis=0),
+            im.render(iscell != 0),
             output_dir=output_dir,
             file_name="cell_roi",
         ),
-        "edit_roi_data": EditRoiData(images=ImageData(ops["filelist"]).data, im=im),
+        "edit_roi_data": EditRoiData(
+            images=MovieRef.from_image(ImageData(ops["filelist"])), im=im
+        ),
         "nwbfile": nwbfile,
     }
 
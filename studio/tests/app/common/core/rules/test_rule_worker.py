@@ -0,0 +1,200 @@
+import os
+import shutil
+import signal
+import time
+
+import pytest
+
+from studio.app.common.core.rules import rule_worker, runner
+from studio.app.common.core.rules.rule_worker import (
+    RuleWorker,
+    RuleWorkerClient,
+    RuleWorkerError,
+    RuleWorkerPool,
+)
+from studio.app.common.core.snakemake.smk import Rule
+from studio.app.common.core.utils.pickle_handler import PickleReader, PickleWriter
+from studio.app.common.core.workflow.workflow_status_journal import (
+    WorkflowStatusJournal,
+)
+from studio.app.dir_path import DIRPATH
+
+workspace_id = "default"
+unique_id = "rule_worker_test"
+
+workflow_dirpath = f"{DIRPATH.DATA_DIR}/output_test/{workspace_id}/result_test"
+output_dirpath = f"{DIRPATH.OUTPUT_DIR}/{workspace_id}/{unique_id}"
+input_pickle_path = f"{output_dirpath}/input_0/data.pkl"
+output_pickle_path = f"{output_dirpath}/func1/rule_worker.pkl"
+
+
+def rule_worker_func(params=None, **kwargs):
+    # crash the worker process, but not the client process
+    if params["crash"] and os.getpid() != params["client_pid"]:
+        os._exit(1)
+    return {"pid": os.getpid()}
+
+
+def get_rule(crash=False):
+    return Rule(
+        input=[input_pickle_path],
+        return_arg={},
+        params={"crash": crash, "client_pid": os.getpid()},
+        output=output_pickle_path,
+        type="rule_worker",
+        path="test/rule_worker",
+    )
+
+
+@pytest.fixture
+def version_path(tmp_path, monkeypatch):
+    shutil.copytree(workflow_dirpath, output_dirpath, dirs_exist_ok=True)
+    PickleWriter.write(input_pickle_path, {"nwbfile": {"input": {}}})
+
+    version_path = f"{tmp_path}/version"
+    with open(version_path, "w") as f:
+        f.write("1")
+
+    def get_code_version(cls):
+        with open(version_path) as f:
+            return f.read()
+
+    monkeypatch.setattr(RuleWorkerPool, "WORKER_DIR", f"{tmp_path}/workers")
+    monkeypatch.setattr(RuleWorkerPool, "WATCH_INTERVAL", 0.1)
+    monkeypatch.setattr(RuleWorkerPool, "CONNECT_TIMEOUT", 1)
+    monkeypatch.setattr(
+        RuleWorkerPool, "get_code_version", classmethod(get_code_version)
+    )
+    monkeypatch.setattr(
+        RuleWorkerClient, "_RuleWorkerClient__start_worker", classmethod(lambda cls: 0)
+    )
+    monkeypatch.setattr(
+        runner,
+        "wrapper_dict",
+        {"test": {"rule_worker": {"function": rule_worker_func}}},
+    )
+
+    yield version_path
+
+    shutil.rmtree(output_dirpath)
+
+
+def start_worker():
+    """
+    warm worker, forked from this (patched) process
+    """
+    pid = os.fork()
+    if pid == 0:
+        try:
+            RuleWorker().serve()
+        finally:
+            os._exit(0)
+
+    # wait for the worker to listen
+    timeout = time.time() + 10
+    while not os.path.exists(RuleWorkerPool.get_address()):
+        assert time.time() < timeout, "rule worker not started"
+        time.sleep(0.1)
+
+    return pid
+
+
+def kill_worker(pid):
+    # the worker may have exited in the test
+    try:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+    except (ProcessLookupError, ChildProcessError):
+        pass
+
+
+@pytest.fixture
+def worker_pid(version_path):
+    pid = start_worker()
+    yield pid
+    kill_worker(pid)
+
+
+def wait_exit(pid, timeout):
+    timeout = time.time() + timeout
+    while True:
+        exited_pid, status = os.waitpid(pid, os.WNOHANG)
+        if exited_pid == pid:
+            return status
+        if time.time() > timeout:
+            return None
+        time.sleep(0.1)
+
+
+def read_output_pid():
+    output_info = PickleReader.read(output_pickle_path)
+    assert PickleReader.check_is_valid_node_pickle(output_info)
+    return output_info["pid"]
+
+
+def test_RuleWorkerClient_run(worker_pid):
+    RuleWorkerClient.run(get_rule(), [], "func.py")
+
+    # the rule runs in a child process forked by the worker
+    output_pid = read_output_pid()
+    assert output_pid not in [os.getpid(), worker_pid]
+
+    events = WorkflowStatusJournal(workspace_id, unique_id).read_events()
+    assert events["func1"].status == "success"
+
+    # the snakemake script process is kept as the process of the rule
+    pid_data = runner.Runner.read_pid_file(workspace_id, unique_id)
+    assert pid_data.last_pid == os.getpid()
+
+    # the worker keeps running for the next rules
+    RuleWorkerClient.run(get_rule(), [], "func.py")
+    assert read_output_pid() not in [output_pid, os.getpid(), worker_pid]
+
+
+def test_RuleWorkerClient_run_worker_crash(worker_pid):
+    with pytest.raises(RuleWorkerError, match="terminated"):
+        RuleWorkerClient.run(get_rule(crash=True), [], "func.py")
+
+    # the rule is not re-run in this process
+    assert not os.path.exists(output_pickle_path)
+
+
+def test_RuleWorkerClient_commit_edit_roi_error(worker_pid):
+    # the traceback of the worker is raised in this process
+    with pytest.raises(RuleWorkerError, match="Traceback"):
+        RuleWorkerClient.commit_edit_roi(f"{output_dirpath}/func1/no_such_file.pkl")
+
+
+def test_RuleWorkerClient_run_no_worker(version_path):
+    RuleWorkerClient.run(get_rule(), [], "func.py")
+
+    # falls back to this process
+    assert read_output_pid() == os.getpid()
+
+
+def test_RuleWorker_code_updated(version_path, worker_pid):
+    address = RuleWorkerPool.get_address()
+
+    with open(version_path, "w") as f:
+        f.write("2")
+    assert RuleWorkerPool.get_address() != address
+
+    # the worker of the updated code shuts down the worker of the former code
+    new_worker_pid = start_worker()
+    try:
+        assert wait_exit(worker_pid, 10) is not None
+        assert not os.path.exists(address)
+
+        RuleWorkerClient.run(get_rule(), [], "func.py")
+        assert read_output_pid() not in [os.getpid(), new_worker_pid]
+    finally:
+        kill_worker(new_worker_pid)
+
+
+def test_RuleWorkerPool_get_code_version(monkeypatch):
+    code_version = RuleWorkerPool.get_code_version()
+    assert code_version != "0-0"
+
+    # computed once per process
+    monkeypatch.setattr(rule_worker.os, "walk", lambda path: pytest.fail())
+    assert RuleWorkerPool.get_code_version() == code_version
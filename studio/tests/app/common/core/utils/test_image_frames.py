@@ -0,0 +1,84 @@
+import gzip
+import os
+
+import numpy as np
+import tifffile
+
+from studio.app.common.core.utils.image_frames import ImageFrames
+from studio.app.dir_path import DIRPATH
+
+dirpath = f"{DIRPATH.OUTPUT_DIR}/default/image_frames_test"
+tiff_path = f"{dirpath}/movie.tif"
+
+
+def create_movie(dtype=np.uint16):
+    os.makedirs(dirpath, exist_ok=True)
+    movie = np.arange(6 * 4 * 6).reshape(6, 4, 6).astype(dtype)
+    tifffile.imwrite(tiff_path, movie)
+    return movie
+
+
+def decode(meta, data):
+    return np.frombuffer(gzip.decompress(data), dtype=meta.dtype).reshape(meta.shape)
+
+
+def test_ImageFrames_read():
+    movie = create_movie()
+
+    meta, data = ImageFrames.read(tiff_path, 1, 4)
+    np.testing.assert_array_equal(decode(meta, data), movie[1:4])
+    assert (meta.vmin, meta.vmax) == (movie[1:4].min(), movie[1:4].max())
+
+    # the cached frames are returned for the same request
+    cached_meta, cached_data = ImageFrames.read(tiff_path, 1, 4)
+    assert cached_meta == meta
+    assert cached_data == data
+
+
+def test_ImageFrames_downsample_quantize():
+    movie = create_movie()
+
+    meta, data = ImageFrames.read(tiff_path, 0, 2, downsample=2, dtype="uint8")
+    frames = decode(meta, data)
+
+    assert frames.shape == (2, 2, 3)
+    assert frames.dtype == np.uint8
+    assert (frames.min(), frames.max()) == (0, 255)
+
+    expected = movie[:2].reshape(2, 2, 2, 3, 2).mean(axis=(2, 4))
+    assert (meta.vmin, meta.vmax) == (np.rint(expected).min(), np.rint(expected).max())
+
+
+def test_ImageFrames_cast():
+    # dtypes not readable by the client
+    for dtype, expected_dtype in [
+        (np.int64, "<f8"),
+        (np.uint64, "<f8"),
+        (np.float16, "<f4"),
+        (np.bool_, "|u1"),
+    ]:
+        movie = create_movie(dtype)
+
+        meta, data = ImageFrames.read(tiff_path, 1, 4)
+        assert meta.dtype == expected_dtype
+        np.testing.assert_array_equal(decode(meta, data), movie[1:4])
+
+
+def test_ImageFrames_nan():
+    movie = create_movie(np.float32)
+    movie[1, 0, :3] = [np.nan, np.inf, -np.inf]
+    movie[2] = np.nan
+    tifffile.imwrite(tiff_path, movie)
+
+    # the range of the finite values
+    meta, data = ImageFrames.read(tiff_path, 1, 3, dtype="uint8")
+    frames = decode(meta, data)
+    finite = movie[1][np.isfinite(movie[1])]
+    assert (meta.vmin, meta.vmax) == (finite.min(), finite.max())
+    assert frames[0, 0, :3].tolist() == [0, 255, 0]
+    assert np.all(frames[1] == 0)
+
+    # no finite values
+    meta, data = ImageFrames.read(tiff_path, 2, 3, dtype="uint8")
+    assert (meta.vmin, meta.vmax) == (0, 0)
+    assert np.all(decode(meta, data) == 0)
@@ -0,0 +1,60 @@
+import gzip
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from studio.app.common.core.utils.json_serializer import (
+    JsonCompression,
+    JsonSerializer,
+)
+from studio.app.dir_path import DIRPATH
+
+dirpath = f"{DIRPATH.OUTPUT_DIR}/default/json_serializer_test"
+
+
+def get_frame():
+    data = np.arange(12, dtype=float).reshape(3, 4)
+    data[1, 2] = np.nan
+    return pd.DataFrame(data)
+
+
+def test_JsonSerializer_dumps_frame():
+    df = get_frame()
+
+    for orient in ["columns", "split"]:
+        json_data = json.loads(JsonSerializer.dumps_frame(df, orient))
+        assert json_data == json.loads(df.to_json(orient=orient))
+
+    json_data = json.loads(JsonSerializer.dumps_frame(df, "split"))
+    assert json_data["data"][1][2] is None
+
+
+def test_JsonCompression_encode():
+    os.makedirs(dirpath, exist_ok=True)
+    json_filepath = f"{dirpath}/data.json"
+    df = pd.DataFrame(np.random.rand(100, 10))
+    JsonSerializer.write(json_filepath, JsonSerializer.dumps_frame(df, "split"))
+
+    def build():
+        with open(json_filepath, "rb") as f:
+            return f.read()
+
+    content, encoding = JsonCompression.encode(
+        json_filepath, [json_filepath], build, "gzip, deflate"
+    )
+    assert encoding == "gzip"
+    assert gzip.decompress(content) == build()
+    # cached in the cache directory, not beside the file
+    assert os.path.exists(JsonCompression.get_cache_path(json_filepath, ".gz"))
+    assert not os.path.exists(f"{json_filepath}.gz")
+
+    content, encoding = JsonCompression.encode(
+        json_filepath, [json_filepath], build, "identity"
+    )
+    assert encoding is None
+    assert content == build()
+
+    shutil.rmtree(JsonCompression.CACHE_DIRPATH)
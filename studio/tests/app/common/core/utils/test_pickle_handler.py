@@ -1,6 +1,12 @@
 import os
 
-from studio.app.common.core.utils.pickle_handler import PickleReader, PickleWriter
+import numpy as np
+
+from studio.app.common.core.utils.pickle_handler import (
+    NodeArrayStore,
+    PickleReader,
+    PickleWriter,
+)
 from studio.app.dir_path import DIRPATH
 
 workspace_id = "default"
@@ -25,3 +31,35 @@ def test_PickleReader():
     data = PickleReader.read(filepath)
 
     assert data == "abc"
+
+
+array_filepath = f"{DIRPATH.OUTPUT_DIR}/{workspace_id}/{unique_id}/func3/func3.pkl"
+
+
+def test_PickleWriter_array_store():
+    large = np.arange(NodeArrayStore.MIN_NBYTES // 8 + 1, dtype=np.float64)
+    small = np.arange(10)
+    PickleWriter.write(
+        array_filepath,
+        {"large": large, "small": small, "nwbfile": {"large": large}},
+    )
+
+    store_dirpath = NodeArrayStore.get_dirpath(array_filepath)
+    assert len(os.listdir(store_dirpath)) == 1
+
+    data = PickleReader.read(array_filepath)
+    assert isinstance(data["large"], np.memmap)
+    assert not isinstance(data["small"], np.memmap)
+    np.testing.assert_array_equal(data["large"], large)
+    np.testing.assert_array_equal(data["nwbfile"]["large"], large)
+
+    # rewriting replaces the sidecar files of the previous result
+    PickleWriter.write(array_filepath, data)
+    assert len(os.listdir(store_dirpath)) == 1
+    np.testing.assert_array_equal(PickleReader.read(array_filepath)["large"], large)
+
+
+def test_PickleReader_read_keys():
+    data = PickleReader.read_keys(array_filepath, ["small"])
+
+    assert set(data.keys()) == {"small", "nwbfile"}
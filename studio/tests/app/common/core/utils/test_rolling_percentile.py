@@ -0,0 +1,34 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from studio.app.common.core.utils.rolling_percentile import (
+    rolling_percentile,
+    rolling_percentile_rows,
+)
+
+
+def get_expected(data, window, q, method):
+    windows = sliding_window_view(data, window, axis=-1)
+    return np.percentile(windows, q, axis=-1, method=method)
+
+
+def test_rolling_percentile():
+    data = np.random.default_rng(0).normal(size=(3, 50))
+
+    for window, q, method in [(10, 8, "linear"), (7, 20, "hazen"), (4, 50, "hazen")]:
+        np.testing.assert_allclose(
+            rolling_percentile(data, window, q, method=method),
+            get_expected(data, window, q, method),
+        )
+
+    # along axis 0
+    np.testing.assert_allclose(
+        rolling_percentile(data.T, 7, 20, axis=0, method="hazen"),
+        get_expected(data, 7, 20, "hazen").T,
+    )
+
+    # without the rolling quantile
+    np.testing.assert_allclose(
+        rolling_percentile_rows(data, 6, 30, method="nearest"),
+        get_expected(data, 6, 30, "nearest"),
+    )
@@ -0,0 +1,55 @@
+import numpy as np
+
+from studio.app.common.core.utils.timeseries_store import TimeSeriesStore
+from studio.app.common.dataclass import TimeSeriesData
+from studio.app.dir_path import DIRPATH
+
+json_dirpath = f"{DIRPATH.OUTPUT_DIR}/default/timeseries_store_test"
+
+
+def save_timeseries(n_cells=3, n_frames=100):
+    rng = np.random.default_rng(0)
+    data = rng.normal(size=(n_cells, n_frames))
+    std = np.abs(rng.normal(size=(n_cells, n_frames)))
+    timeseries = TimeSeriesData(
+        data, std=std, cell_numbers=range(1, n_cells + 1), file_name="fluo"
+    )
+    timeseries.save_json(json_dirpath)
+    return timeseries
+
+
+def test_TimeSeriesStore_read():
+    timeseries = save_timeseries()
+    store = TimeSeriesStore(timeseries.json_path)
+
+    assert TimeSeriesStore.exists(timeseries.json_path)
+    assert store.xrange == [str(i) for i in range(100)]
+
+    result = store.read(cells=[3, 1], start=10, stop=20)
+    assert list(result["data"]) == ["3", "1"]
+    assert list(result["data"]["3"]) == [str(i) for i in range(10, 20)]
+    assert result["data"]["1"]["15"] == timeseries.data[0, 15]
+    assert result["std"]["3"]["10"] == timeseries.std[2, 10]
+    assert result["index"] == [str(i) for i in range(10, 20)]
+
+
+def test_TimeSeriesStore_decimate():
+    timeseries = save_timeseries(n_frames=1000)
+    store = TimeSeriesStore(timeseries.json_path)
+
+    for method in [TimeSeriesStore.MINMAX, TimeSeriesStore.LTTB]:
+        result = store.read(max_points=100, method=method)
+        for i, values in enumerate(result["data"].values()):
+            assert len(values) <= 100
+            assert list(map(int, values)) == sorted(map(int, values))
+            for x, value in values.items():
+                assert value == timeseries.data[i, int(x)]
+
+        # the x values of the points kept for any cell, in order
+        xs = set().union(*result["data"].values())
+        assert result["index"] == sorted(xs, key=int)
+
+    # the extremes are kept by minmax decimation
+    result = store.read(max_points=100, method=TimeSeriesStore.MINMAX)
+    assert max(result["data"]["1"].values()) == timeseries.data[0].max()
+    assert min(result["data"]["1"].values()) == timeseries.data[0].min()
@@ -0,0 +1,131 @@
+import os
+import shutil
+
+from studio.app.common.core.experiment.experiment_writer import ExptConfigWriter
+from studio.app.common.core.workflow.workflow import NodeRunStatus
+from studio.app.common.core.workflow.workflow_result import WorkflowResult
+from studio.app.common.core.workflow.workflow_status_journal import (
+    WorkflowStatusJournal,
+)
+from studio.app.dir_path import DIRPATH
+
+workspace_id = "default"
+unique_id = "journal_test"
+node_id_list = ["func1", "func2"]
+
+workflow_dirpath = f"{DIRPATH.DATA_DIR}/output_test/{workspace_id}/result_test"
+output_dirpath = f"{DIRPATH.OUTPUT_DIR}/{workspace_id}/{unique_id}"
+
+
+def test_WorkflowStatusJournal_read_events():
+    shutil.copytree(
+        workflow_dirpath,
+        output_dirpath,
+        dirs_exist_ok=True,
+    )
+    journal = WorkflowStatusJournal(workspace_id, unique_id)
+    journal.clear()
+
+    assert journal.read_events() == {}
+
+    WorkflowStatusJournal.write_success(f"{output_dirpath}/func1/func1.pkl", {})
+    events = journal.read_events()
+
+    assert list(events.keys()) == ["func1"]
+    assert events["func1"].status == NodeRunStatus.SUCCESS.value
+
+    WorkflowStatusJournal.write_error(
+        f"{output_dirpath}/func2/func2.pkl", Exception("test error")
+    )
+    events = journal.read_events()
+
+    assert set(events.keys()) == {"func1", "func2"}
+    assert events["func2"].status == NodeRunStatus.ERROR.value
+    assert "test error" in events["func2"].message
+
+    unapplied_events, offset = journal.read_unapplied_events()
+    assert set(unapplied_events.keys()) == {"func1", "func2"}
+
+    journal.write_applied_offset(offset)
+    assert journal.read_unapplied_events() == ({}, offset)
+    assert set(journal.read_events().keys()) == {"func1", "func2"}
+
+    # re-read from the start (e.g. in another process)
+    journal.clear()
+    WorkflowStatusJournal.write_success(f"{output_dirpath}/func1/func1.pkl", {})
+    WorkflowStatusJournal.write_error(
+        f"{output_dirpath}/func2/func2.pkl", Exception("test error")
+    )
+
+
+def test_WorkflowResult_observe_journal():
+    output = WorkflowResult(workspace_id=workspace_id, unique_id=unique_id).observe(
+        node_id_list
+    )
+
+    assert output["func1"].status == NodeRunStatus.SUCCESS.value
+    assert output["func2"].status == NodeRunStatus.ERROR.value
+
+
+def test_WorkflowResult_observe_journal_applied_once(monkeypatch):
+    write_raw_calls = []
+    write_raw = ExptConfigWriter.write_raw
+
+    def count_write_raw(*args, **kwargs):
+        write_raw_calls.append(args)
+        write_raw(*args, **kwargs)
+
+    monkeypatch.setattr(ExptConfigWriter, "write_raw", count_write_raw)
+
+    # the events have been applied by the previous poll
+    output = WorkflowResult(workspace_id=workspace_id, unique_id=unique_id).observe(
+        node_id_list
+    )
+
+    assert output["func1"].status == NodeRunStatus.SUCCESS.value
+    assert output["func2"].status == NodeRunStatus.ERROR.value
+    assert write_raw_calls == []
+
+    # a new event is applied once
+    WorkflowStatusJournal.write_success(f"{output_dirpath}/func2/func2.pkl", {})
+    for _ in range(2):
+        output = WorkflowResult(workspace_id=workspace_id, unique_id=unique_id).observe(
+            node_id_list
+        )
+
+    assert output["func2"].status == NodeRunStatus.SUCCESS.value
+    assert len(write_raw_calls) == 1
+
+
+def test_WorkflowResult_observe_journal_unknown_node():
+    # an event of a node not in the workflow config is skipped
+    WorkflowStatusJournal.write_success(f"{output_dirpath}/removed/removed.pkl", {})
+    output = WorkflowResult(workspace_id=workspace_id, unique_id=unique_id).observe(
+        node_id_list
+    )
+
+    assert output["func2"].status == NodeRunStatus.SUCCESS.value
+    journal = WorkflowStatusJournal(workspace_id, unique_id)
+    unapplied_events, _ = journal.read_unapplied_events()
+    assert unapplied_events == {}
+
+
+def test_WorkflowStatusJournal_tail_cache(monkeypatch):
+    monkeypatch.setattr(WorkflowStatusJournal, "MAX_CACHED_JOURNALS", 2)
+    tail_cache = WorkflowStatusJournal._WorkflowStatusJournal__tail_cache
+
+    journals = [WorkflowStatusJournal(workspace_id, unique_id)] + [
+        WorkflowStatusJournal(workspace_id, f"{unique_id}_{i}") for i in range(2)
+    ]
+    for journal in journals:
+        os.makedirs(os.path.dirname(journal.journal_path), exist_ok=True)
+        open(journal.journal_path, "a").close()
+        journal.read_events()
+
+    # the least recently read journal is dropped
+    assert journals[0].journal_path not in tail_cache
+    assert [journal.journal_path for journal in journals[1:]] == list(tail_cache)
+
+    for journal in journals:
+        journal.clear()
+    assert not os.path.exists(f"{output_dirpath}/{WorkflowStatusJournal.JOURNAL_FILE}")
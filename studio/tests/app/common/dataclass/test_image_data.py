@@ -0,0 +1,56 @@
+import numpy as np
+import tifffile
+
+from studio.app.common.dataclass import ImageData
+from studio.app.dir_path import DIRPATH
+
+output_dirpath = f"{DIRPATH.OUTPUT_DIR}/default/image_data_test"
+
+
+def assert_memmap_round_trip(image_data, expected):
+    with tifffile.TiffFile(image_data.path[0]) as tif:
+        assert tif.is_bigtiff
+        # one page per (y, x) plane
+        assert len(tif.pages) == int(np.prod(expected.shape[:-2]))
+
+    assert image_data.shape == expected.shape
+    assert image_data.dtype == expected.dtype
+
+    data = image_data.data
+    assert isinstance(data, np.memmap)
+    np.testing.assert_array_equal(data, expected)
+    np.testing.assert_array_equal(image_data.frames(1, 3), expected[1:3])
+
+
+def test_ImageData_from_frames():
+    stack = np.arange(5 * 6 * 4, dtype=np.uint16).reshape(5, 6, 4)
+
+    # (t, y, x) frames, read lazily
+    image_data = ImageData.from_frames(
+        (frame for frame in stack),
+        stack.shape,
+        stack.dtype,
+        output_dir=output_dirpath,
+        file_name="from_frames",
+    )
+    assert_memmap_round_trip(image_data, stack)
+
+    # (t, z, y, x) frames of non-contiguous views, casted to dtype
+    stack_4d = np.random.default_rng(0).random((4, 3, 5, 6))
+    frames = stack_4d.transpose(0, 1, 3, 2)
+    image_data = ImageData.from_frames(
+        iter(frames),
+        frames.shape,
+        np.float32,
+        output_dir=output_dirpath,
+        file_name="from_frames_4d",
+    )
+    assert_memmap_round_trip(image_data, frames.astype(np.float32))
+
+
+def test_ImageData_ndarray():
+    # a transposed (non-contiguous) stack is written frame by frame
+    stack = np.arange(4 * 5 * 6, dtype=np.float32).reshape(6, 5, 4).transpose(2, 1, 0)
+    image_data = ImageData(stack, output_dir=output_dirpath, file_name="ndarray")
+
+    assert_memmap_round_trip(image_data, stack)
@@ -1,3 +1,16 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from studio.app.common.core.utils.file_reader import JsonReader
+from studio.app.common.core.utils.json_serializer import JsonCompression
+from studio.app.common.core.utils.json_writer import JsonWriter
+from studio.app.common.dataclass import TimeSeriesData
+from studio.app.common.schemas.outputs import OutputData, PlotMetaData
 from studio.app.dir_path import DIRPATH
 
 workspace_id = "default"
@@ -68,6 +81,92 @@ def test_alltimedata(client):
         assert len(value) == 1000
 
 
+def test_timeseries(client):
+    timeseries = TimeSeriesData(
+        np.arange(3 * 500, dtype=float).reshape(3, 500), file_name="timeseries"
+    )
+    timeseries.save_json(f"{DIRPATH.OUTPUT_DIR}/{workspace_id}/{unique_id}/func2")
+
+    response = client.get(f"/outputs/inittimedata/{timeseries.json_path}")
+    data = response.json()
+
+    assert response.status_code == 200
+    assert list(data["data"]) == ["0", "1", "2"]
+    assert len(data["data"]["0"]) == 500
+    assert len(data["data"]["1"]) == 1
+
+    response = client.get(
+        f"/outputs/timeseries/{timeseries.json_path}",
+        params={"cells": [2], "start": 100, "stop": 300, "max_points": 50},
+    )
+    data = response.json()
+
+    assert response.status_code == 200
+    assert list(data["data"]) == ["2"]
+    assert len(data["data"]["2"]) == 50
+    assert data["data"]["2"]["100"] == 1100.0
+    # x of the decimated points
+    assert data["xrange"] == list(data["data"]["2"])
+
+    response = client.get(
+        f"/outputs/timeseries/{timeseries.json_path}",
+        params={"start": 100, "stop": 300, "max_points": 50, "method": "lttb"},
+    )
+    data = response.json()
+
+    assert response.status_code == 200
+    assert len(data["xrange"]) < 200
+    assert set(data["xrange"]) == set().union(*data["data"].values())
+
+
+def get_model_response(filepath):
+    # the former route, the OutputData validated by the response model
+    model_app = FastAPI()
+
+    @model_app.get("/data/{filepath:path}", response_model=OutputData)
+    async def get_file(filepath: str):
+        return JsonReader.read_as_output(filepath)
+
+    with TestClient(model_app) as model_client:
+        return model_client.get(f"/data/{filepath}").json()
+
+
+def test_data(client):
+    output_dirpath = f"{DIRPATH.OUTPUT_DIR}/{workspace_id}/{unique_id}/func3"
+    os.makedirs(output_dirpath, exist_ok=True)
+    JsonWriter.write_as_split(
+        f"{output_dirpath}/data.json",
+        pd.DataFrame(np.arange(600, dtype=float).reshape(200, 3)),
+    )
+    JsonWriter.write_plot_meta(output_dirpath, "data", PlotMetaData(title="data"))
+    filepaths = [
+        f"{output_dirpath}/data.json",
+        f"{DIRPATH.INPUT_DIR}/1/test/test_0_1.json",
+    ]
+
+    for filepath in filepaths:
+        expected = get_model_response(filepath)
+        assert expected["columns"][:2] == ["0", "1"]
+
+        for accept_encoding in ["gzip", "identity", "gzip"]:
+            response = client.get(
+                f"/outputs/data/{filepath}",
+                headers={"Accept-Encoding": accept_encoding},
+            )
+            data = response.json()
+
+            assert response.status_code == 200
+            assert response.headers["vary"] == "Accept-Encoding"
+            assert list(data) == list(expected)
+            for key, value in expected.items():
+                assert data[key] == value, key
+
+        # precompressed in the cache directory, not beside the file
+        assert not os.path.exists(f"{filepath}.gz")
+
+    shutil.rmtree(JsonCompression.CACHE_DIRPATH)
+
+
 tif_filepath = "test.tif"
 workspace_id = "1"
 
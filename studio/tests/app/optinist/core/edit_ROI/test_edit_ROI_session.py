@@ -0,0 +1,83 @@
+import os
+import shutil
+
+import numpy as np
+
+from studio.app.common.core.utils.pickle_handler import PickleReader, PickleWriter
+from studio.app.dir_path import DIRPATH
+from studio.app.optinist.core.edit_ROI import EditRoiSessions
+from studio.app.optinist.dataclass import EditRoiData, FluoData, IscellData, RoiMasks
+from studio.app.optinist.schemas.roi import RoiPos
+
+shape = (8, 8)
+node_dirpath = (
+    f"{DIRPATH.OUTPUT_DIR}/default/edit_roi_session_test/lccd_cell_detection_0123456789"
+)
+pickle_path = f"{node_dirpath}/lccd_cell_detection.pkl"
+tmp_pickle_path = f"{node_dirpath}/tmp_lccd_cell_detection.pkl"
+cell_roi_path = f"{node_dirpath}/tiff/cell_roi/cell_roi.tif"
+
+
+def create_node_pickle():
+    shutil.rmtree(node_dirpath, ignore_errors=True)
+    roi_masks = RoiMasks(shape)
+    roi_masks.append_pixels([0, 1, 8, 9])
+    roi_masks.append_pixels([30, 31])
+    PickleWriter.write(
+        pickle_path,
+        {
+            "edit_roi_data": EditRoiData(None, roi_masks),
+            "iscell": IscellData(np.ones(2)),
+            "fluorescence": FluoData(np.zeros((2, 5)), file_name="fluorescence"),
+        },
+    )
+
+
+def test_EditRoiSessions_write_behind():
+    create_node_pickle()
+    EditRoiSessions.close()
+
+    with EditRoiSessions.edit(pickle_path) as edit_roi:
+        edit_roi.add(RoiPos(posx=5, posy=5, sizex=2, sizey=2))
+
+    # the overlay is written on each edit, the tmp pickle behind it
+    assert os.path.exists(cell_roi_path)
+    assert not os.path.exists(tmp_pickle_path)
+    assert EditRoiSessions.get(pickle_path) is edit_roi
+
+    with EditRoiSessions.edit(pickle_path) as edit_roi:
+        edit_roi.merge([0, 1])
+        edit_roi.delete([2])
+
+    np.testing.assert_array_equal(
+        edit_roi.cell_roi_image,
+        edit_roi.tmp_data.im.render(edit_roi.tmp_iscell != 0),
+    )
+
+    EditRoiSessions.flush(pickle_path)
+    tmp_output_info = PickleReader.read(tmp_pickle_path)
+    assert set(tmp_output_info) == {"iscell", "edit_roi_data"}
+    np.testing.assert_array_equal(tmp_output_info["iscell"].data, [-2, -2, -2, -1])
+
+    # a new session restores the edits from the tmp pickle
+    EditRoiSessions.close(pickle_path)
+    edit_roi = EditRoiSessions.get(pickle_path)
+    assert edit_roi.get_status().temp_add_roi == [2]
+    assert edit_roi.get_status().temp_delete_roi == [2]
+
+    edit_roi.cancel()
+    EditRoiSessions.close(pickle_path, save=False)
+    assert not os.path.exists(tmp_pickle_path)
+
+
+def test_EditRoiSessions_reload():
+    create_node_pickle()
+    EditRoiSessions.close()
+
+    edit_roi = EditRoiSessions.get(pickle_path)
+    assert EditRoiSessions.get(pickle_path) is edit_roi
+
+    # the node pickle is updated by another process
+    os.utime(pickle_path, ns=(0, 0))
+    assert EditRoiSessions.get(pickle_path) is not edit_roi
+    EditRoiSessions.close()
@@ -0,0 +1,183 @@
+import os
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import psutil
+import pytest
+import yaml
+from zc import lockfile
+
+from studio.app.dir_path import DIRPATH
+from studio.app.optinist.core.expdb import batch_runner
+from studio.app.optinist.core.expdb.batch_runner import (
+    FLAG_FILE_EXT,
+    LOCKFILE_NAME,
+    ExpDbBatchRunner,
+)
+
+REGISTRATION_SECONDS = 0.5
+
+
+@contextmanager
+def session_scope():
+    yield None
+
+
+@pytest.fixture
+def expdb_dir(tmp_path, monkeypatch):
+    expdb_dir = f"{tmp_path}/expdb"
+    os.makedirs(f"{tmp_path}/logs")
+
+    # lockfile and logs are created in the current directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(DIRPATH, "EXPDB_DIR", expdb_dir)
+    monkeypatch.setattr(batch_runner, "session_scope", session_scope)
+    monkeypatch.setattr(batch_runner, "get_organization", lambda db, org_id: None)
+    monkeypatch.setattr(batch_runner, "MEMORY_CHECK_INTERVAL", 0.1)
+
+    return expdb_dir
+
+
+@pytest.fixture
+def summarize_calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        batch_runner, "summarize_experiment_metadata", lambda db: calls.append(db)
+    )
+    return calls
+
+
+def create_flag_files(expdb_dir, exp_ids, command="regist"):
+    flag_files = []
+    for exp_id in exp_ids:
+        os.makedirs(f"{expdb_dir}/{exp_id}")
+        flag_file = f"{expdb_dir}/{exp_id}/{exp_id}{FLAG_FILE_EXT}"
+        with open(flag_file, "w") as f:
+            yaml.dump({"command": command}, f)
+        flag_files.append(flag_file)
+    return flag_files
+
+
+def set_registration(monkeypatch, registration):
+    monkeypatch.setattr(
+        ExpDbBatchRunner,
+        "_ExpDbBatchRunner__process_dataset_registration",
+        registration,
+    )
+
+
+def record_registration(self, flag_file):
+    """
+    record the worker process, and the time range of the registration
+    """
+    start_time = time.time()
+    time.sleep(REGISTRATION_SECONDS)
+    if "error" in flag_file:
+        raise ValueError("registration error")
+
+    with open(f"{os.path.dirname(flag_file)}/registration.yaml", "w") as f:
+        yaml.dump(
+            {
+                "pid": os.getpid(),
+                "start_time": start_time,
+                "end_time": time.time(),
+                "threads": os.environ.get("OMP_NUM_THREADS"),
+            },
+            f,
+        )
+    return True
+
+
+def read_registration(expdb_dir, exp_id):
+    with open(f"{expdb_dir}/{exp_id}/registration.yaml") as f:
+        return yaml.safe_load(f)
+
+
+def read_result_log(flag_file):
+    with open(flag_file) as f:
+        return yaml.safe_load(f)
+
+
+def test_process_datasets_parallel(expdb_dir, summarize_calls, monkeypatch):
+    set_registration(monkeypatch, record_registration)
+    exp_ids = ["exp1", "exp2", "exp3", "exp_error"]
+    flag_files = create_flag_files(expdb_dir, exp_ids)
+
+    ExpDbBatchRunner(1, workers=2, worker_threads=3).process()
+
+    registrations = [read_registration(expdb_dir, i) for i in exp_ids[:3]]
+
+    # datasets are processed in worker processes, 2 at once
+    pids = [r["pid"] for r in registrations]
+    assert os.getpid() not in pids
+    assert len(set(pids)) == 3
+    assert registrations[0]["start_time"] < registrations[1]["end_time"]
+    assert registrations[1]["start_time"] < registrations[0]["end_time"]
+    assert all(r["threads"] == "3" for r in registrations)
+
+    # flag files are renamed by the workers
+    for flag_file in flag_files[:3]:
+        assert not os.path.exists(flag_file)
+        assert read_result_log(f"{flag_file}.done")["result"] == "success"
+
+    result_log = read_result_log(f"{flag_files[3]}.error")
+    assert result_log["result"] == "error"
+    assert "registration error" in result_log["log"]
+
+    # experiment metadata is summarized once, after all datasets
+    assert len(summarize_calls) == 1
+
+    # lockfile is released
+    lockfile.LockFile(LOCKFILE_NAME).close()
+
+
+def test_process_datasets_parallel_locked(expdb_dir, summarize_calls, monkeypatch):
+    set_registration(monkeypatch, record_registration)
+    flag_files = create_flag_files(expdb_dir, ["exp1", "exp2"])
+
+    lock = lockfile.LockFile(LOCKFILE_NAME)
+    try:
+        ExpDbBatchRunner(1, workers=2).process()
+    finally:
+        lock.close()
+
+    # already running, no dataset is processed
+    assert all(os.path.exists(flag_file) for flag_file in flag_files)
+    assert summarize_calls == []
+
+
+def test_process_datasets_parallel_memory_limit(
+    expdb_dir, summarize_calls, monkeypatch
+):
+    chunk_nbytes = 256 * 1024**2
+
+    def allocate_registration(self, flag_file):
+        if "memmap" in flag_file:
+            # large virtual memory, but few resident pages
+            memmap_path = f"{os.path.dirname(flag_file)}/data.bin"
+            with open(memmap_path, "wb") as f:
+                f.truncate(4 * chunk_nbytes)
+            data = np.memmap(memmap_path, dtype=np.uint8, mode="r")
+            data[::4096][:16].sum()
+        else:
+            data = np.ones(chunk_nbytes, dtype=np.uint8)
+        time.sleep(5 * REGISTRATION_SECONDS)
+        del data
+        return True
+
+    set_registration(monkeypatch, allocate_registration)
+    flag_files = create_flag_files(expdb_dir, ["exp_memmap", "exp_alloc"])
+
+    # the worker is forked, the limit is relative to the current RSS
+    rss_gb = psutil.Process().memory_info().rss / 1024**3
+    worker_memory_limit = rss_gb + chunk_nbytes / 2 / 1024**3
+
+    ExpDbBatchRunner(1, workers=2, worker_memory_limit=worker_memory_limit).process()
+
+    assert read_result_log(f"{flag_files[0]}.done")["result"] == "success"
+
+    result_log = read_result_log(f"{flag_files[1]}.error")
+    assert result_log["result"] == "error"
+    assert "memory limit" in result_log["log"]
+    assert len(summarize_calls) == 1
@@ -0,0 +1,138 @@
+import os
+
+import numpy as np
+from pynwb import NWBHDF5IO
+
+from studio.app.common.core.utils.config_handler import ConfigReader
+from studio.app.dir_path import DIRPATH
+from studio.app.optinist.core.nwb import nwb_creater
+from studio.app.optinist.core.nwb.nwb import NWBDATASET
+from studio.app.optinist.core.nwb.nwb_creater import (
+    NWBConfigIndex,
+    get_unused_nbytes,
+    replace_nwbfile,
+    update_nwbfile,
+)
+
+nwb_path = f"{DIRPATH.OUTPUT_DIR}/default/nwb_test/whole.nwb"
+
+
+def get_input_config():
+    input_config = ConfigReader.read(f"{DIRPATH.APP_DIR}/optinist/core/nwb/nwb.yaml")
+    input_config[NWBDATASET.IMAGE_SERIES]["external_file"] = "test.tif"
+    return input_config
+
+
+def get_roi_config(function_id, value=1.0):
+    return {
+        NWBDATASET.ROI: {
+            function_id: [{"image_mask": np.full((8, 8), value)} for _ in range(3)]
+        },
+        NWBDATASET.POSTPROCESS: {function_id: {"result": np.full(10, value)}},
+    }
+
+
+def read_plane_segmentations():
+    with NWBHDF5IO(nwb_path, "r") as io:
+        nwbfile = io.read()
+        image_seg = nwbfile.processing["ophys"]["ImageSegmentation"]
+        return {
+            k: v["image_mask"][0][0][0]
+            for k, v in image_seg.plane_segmentations.items()
+            if k != "PlaneSegmentation"
+        }
+
+
+def test_update_nwbfile():
+    os.makedirs(os.path.dirname(nwb_path), exist_ok=True)
+
+    update_nwbfile(nwb_path, get_input_config(), get_roi_config("func1"))
+    assert read_plane_segmentations() == {"func1": 1.0}
+
+    # new entries are appended in place
+    update_nwbfile(nwb_path, get_input_config(), get_roi_config("func2"))
+    assert read_plane_segmentations() == {"func1": 1.0, "func2": 1.0}
+
+    index = NWBConfigIndex(nwb_path).read()
+    assert f"{NWBDATASET.ROI}/func1" in index
+    assert f"{NWBDATASET.ROI}/func2" in index
+
+    # changed entries are overwritten
+    update_nwbfile(nwb_path, get_input_config(), get_roi_config("func1", 2.0))
+    assert read_plane_segmentations() == {"func1": 2.0, "func2": 1.0}
+
+
+def get_fluorescence_config(function_id, value=1.0, nframes=5):
+    config = get_roi_config(function_id, value)
+    config[NWBDATASET.COLUMN] = {
+        function_id: {"name": "iscell", "description": "iscell", "data": np.ones(3)}
+    }
+    config[NWBDATASET.FLUORESCENCE] = {
+        function_id: {
+            "Fluorescence": {
+                "table_name": "ROIs",
+                "region": [0, 1, 2],
+                "name": "Fluorescence",
+                "data": np.full((3, nframes), value),
+                "unit": "lumens",
+            }
+        }
+    }
+    return config
+
+
+def test_replace_nwbfile():
+    os.makedirs(os.path.dirname(nwb_path), exist_ok=True)
+    if os.path.exists(nwb_path):
+        os.remove(nwb_path)
+    NWBConfigIndex(nwb_path).remove()
+
+    update_nwbfile(nwb_path, get_input_config(), get_fluorescence_config("func1"))
+    update_nwbfile(nwb_path, get_input_config(), get_roi_config("func2"))
+
+    # the ROIs are replaced in place along with their fluorescence
+    assert replace_nwbfile(nwb_path, get_fluorescence_config("func1", 2.0))
+    assert read_plane_segmentations() == {"func1": 2.0, "func2": 1.0}
+
+    # the fluorescence refers to the ROIs, which cannot be replaced alone
+    assert not replace_nwbfile(nwb_path, get_roi_config("func1", 3.0))
+
+    update_nwbfile(nwb_path, get_input_config(), get_fluorescence_config("func1", 3.0))
+    assert read_plane_segmentations() == {"func1": 3.0, "func2": 1.0}
+
+    with NWBHDF5IO(nwb_path, "r") as io:
+        nwbfile = io.read()
+        fluo = nwbfile.processing["ophys"]["func1"]["Fluorescence"]
+        assert fluo.data[0][0] == 3.0
+        assert len(fluo.rois.table) == 3
+
+
+def test_replace_nwbfile_repack(monkeypatch):
+    monkeypatch.setattr(nwb_creater, "REPACK_MIN_NBYTES", 2 * 1024 * 1024)
+    os.makedirs(os.path.dirname(nwb_path), exist_ok=True)
+    if os.path.exists(nwb_path):
+        os.remove(nwb_path)
+    NWBConfigIndex(nwb_path).remove()
+
+    # 1.2 MB of fluorescence, replaced on every commit
+    nframes = 50000
+    update_nwbfile(
+        nwb_path, get_input_config(), get_fluorescence_config("func1", 0, nframes)
+    )
+    initial_nbytes = os.path.getsize(nwb_path)
+
+    nbytes = []
+    for value in range(1, 5):
+        config = get_fluorescence_config("func1", value, nframes)
+        update_nwbfile(nwb_path, get_input_config(), config)
+        nbytes.append(os.path.getsize(nwb_path))
+
+    # the removed containers are reclaimed, and the file does not keep growing
+    assert max(nbytes) < initial_nbytes + nwb_creater.REPACK_MIN_NBYTES * 1.5
+    assert min(nbytes[1:]) < max(nbytes)
+    assert get_unused_nbytes(nwb_path) < nwb_creater.REPACK_MIN_NBYTES
+
+    assert read_plane_segmentations() == {"func1": 4.0}
+    with NWBHDF5IO(nwb_path, "r") as io:
+        fluo = io.read().processing["ophys"]["func1"]["Fluorescence"]
+        assert fluo.data[0][-1] == 4.0
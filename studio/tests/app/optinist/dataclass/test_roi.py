@@ -0,0 +1,124 @@
+import os
+
+import numpy as np
+import tifffile
+
+from studio.app.common.dataclass.utils import create_images_list
+from studio.app.dir_path import DIRPATH
+from studio.app.optinist.dataclass import MovieRef, RoiData, RoiMasks
+
+shape = (6, 8)
+movie_dirpath = f"{DIRPATH.OUTPUT_DIR}/default/movie_ref_test"
+roi_dirpath = f"{DIRPATH.OUTPUT_DIR}/default/roi_data_test"
+
+
+def get_dense_rois():
+    im = np.full((3, *shape), np.nan)
+    im[0, 0:2, 0:3] = 0
+    im[1, 1:4, 2:5] = 1
+    im[2, 5, 7] = 2
+    return im
+
+
+def test_RoiMasks_render():
+    im = get_dense_rois()
+    roi_masks = RoiMasks.from_dense(im)
+
+    assert len(roi_masks) == 3
+    assert roi_masks.shape == shape
+    np.testing.assert_array_equal(roi_masks.render(), np.nanmax(im, axis=0))
+
+    iscell = np.array([1, 0, 1])
+    np.testing.assert_array_equal(
+        roi_masks.render(iscell != 0), np.nanmax(im[iscell != 0], axis=0)
+    )
+    np.testing.assert_array_equal(roi_masks.to_dense(), im)
+
+
+def test_RoiMasks_edit():
+    roi_masks = RoiMasks.from_dense(get_dense_rois())
+
+    mask = np.zeros(shape, dtype=bool)
+    mask[4, 0:2] = True
+    assert roi_masks.append(mask) == 3
+    np.testing.assert_array_equal(roi_masks.get_mask(3), mask)
+
+    assert roi_masks.merge([0, 1]) == 4
+    np.testing.assert_array_equal(
+        roi_masks.get_mask(4), roi_masks.get_mask(0) | roi_masks.get_mask(1)
+    )
+
+    roi_masks.truncate(3)
+    assert len(roi_masks) == 3
+
+
+def test_RoiMasks_pixel_mask():
+    roi_masks = RoiMasks.from_dense(get_dense_rois())
+
+    pixel_mask = roi_masks.pixel_mask(2)
+    np.testing.assert_array_equal(pixel_mask, [[7, 5, 1]])
+
+    table = roi_masks.to_pixel_table()
+    assert table.shape == (6 + 9 + 1, 3)
+    np.testing.assert_array_equal(np.unique(table[:, 2]), [0, 1, 2])
+
+
+def get_movie():
+    return np.arange(5 * shape[0] * shape[1], dtype=np.float32).reshape(5, *shape)
+
+
+def get_mean_traces(movie, im):
+    return np.array([np.mean(movie[:, ~np.isnan(roi)], axis=1) for roi in im])
+
+
+def test_MovieRef_extract_traces_tiff():
+    os.makedirs(movie_dirpath, exist_ok=True)
+    movie = get_movie()
+    tiff_path = f"{movie_dirpath}/movie.tif"
+    tifffile.imwrite(tiff_path, movie)
+
+    im = get_dense_rois()
+    movie_ref = MovieRef(tiff_path, movie.shape, movie.dtype)
+    movie_ref.BLOCK_FRAMES = 2
+    traces = movie_ref.extract_traces(RoiMasks.from_dense(im), [0, 2])
+
+    np.testing.assert_allclose(traces, get_mean_traces(movie, im[[0, 2]]))
+
+
+def test_MovieRef_extract_traces_caiman_mmap():
+    os.makedirs(movie_dirpath, exist_ok=True)
+    movie = get_movie()
+    mmap_path = f"{movie_dirpath}/movie.mmap"
+    # (y * x, t) with pixels in Fortran order
+    movie.reshape(len(movie), -1, order="F").T.tofile(mmap_path)
+
+    im = get_dense_rois()
+    movie_ref = MovieRef.from_caiman_mmap(mmap_path, movie.shape)
+    traces = movie_ref.extract_traces(RoiMasks.from_dense(im), None)
+
+    np.testing.assert_allclose(traces, get_mean_traces(movie, im))
+
+
+def test_RoiData_dtype():
+    os.makedirs(roi_dirpath, exist_ok=True)
+    im = np.nanmax(get_dense_rois(), axis=0)
+
+    for data in [
+        im,
+        im.astype(np.float32),
+        np.nan_to_num(im, nan=-1).astype(np.int32),
+        np.nan_to_num(im).astype(np.uint8),
+        ~np.isnan(im),
+    ]:
+        roi_data = RoiData(data, output_dir=roi_dirpath, file_name="roi")
+
+        # the same TIFF as formerly written through python lists
+        former_path = f"{roi_dirpath}/former_roi.tif"
+        tifffile.imsave(former_path, create_images_list(data))
+        expected = tifffile.imread(former_path)
+
+        saved = tifffile.imread(roi_data.path)
+        assert saved.dtype == expected.dtype
+        assert saved.shape == expected.shape
+        np.testing.assert_array_equal(saved, expected)
+        np.testing.assert_array_equal(roi_data.data, data)
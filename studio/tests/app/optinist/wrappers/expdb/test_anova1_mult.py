@@ -0,0 +1,33 @@
+import numpy as np
+from scipy.stats import f_oneway, tukey_hsd
+
+from studio.app.optinist.wrappers.expdb.anova1_mult import (
+    anova1_cells,
+    tukey_hsd_cells,
+)
+
+
+def get_data_table():
+    data = np.random.default_rng(0).normal(size=(3, 8, 4))
+    data[:, :, 1] += np.arange(3)[:, np.newaxis]
+    return data
+
+
+def test_anova1_cells():
+    data = get_data_table()
+
+    _, pvalue, _ = anova1_cells(data)
+
+    expected = [f_oneway(*cell.T)[1] for cell in data]
+    np.testing.assert_allclose(pvalue, expected)
+
+
+def test_tukey_hsd_cells():
+    data = get_data_table()
+
+    low, high = tukey_hsd_cells(data)
+
+    for i, cell in enumerate(data):
+        expected = tukey_hsd(*cell.T).confidence_interval()
+        np.testing.assert_allclose(low[i], expected.low)
+        np.testing.assert_allclose(high[i], expected.high)
@@ -0,0 +1,170 @@
+import math
+
+import numpy as np
+from scipy.interpolate import interp1d, make_interp_spline
+from scipy.optimize import curve_fit
+
+from studio.app.optinist.wrappers.expdb.curvefit_tuning import (
+    DirTempTuning,
+    OriTempTuning,
+    dir_von_mises,
+    ori_von_mises,
+)
+
+NCELLS = 24
+
+
+def create_responses(nstim, degree, rng):
+    """
+    (nstim, ncells) responses of von Mises tuned cells with noise
+    """
+    x = np.arange(nstim) * 2 * degree / nstim
+    a = rng.uniform(0.5, 2, NCELLS)
+    k = rng.uniform(1, 4, NCELLS)
+    phi = rng.uniform(0, 2 * degree, NCELLS)
+    responses = a * np.exp(k * (np.cos((x[:, np.newaxis] - phi) * np.pi / degree) - 1))
+    return responses + rng.normal(0, 0.05, responses.shape)
+
+
+def ydata_interp_of_cell(raw_ydata, interp_method, nstim_per_run):
+    # the former implementation, for a single cell
+    x = np.arange(-1, nstim_per_run + 2)
+    xq = np.arange(-1, nstim_per_run + 1.5, step=0.5)
+    _ydata_interp = np.hstack((raw_ydata[-1], raw_ydata, raw_ydata[:2]))
+
+    if interp_method == "spline":
+        _ydata_interp = make_interp_spline(x, _ydata_interp)(xq)
+    else:
+        _ydata_interp = interp1d(x, _ydata_interp, kind=interp_method)(xq)
+    return _ydata_interp[2 : nstim_per_run * 2 + 2]
+
+
+def tuning_width_of_cell(k, degree):
+    # the former implementation, for a single cell
+    return (
+        math.acos(math.log(0.5) / k + 1) * degree / math.pi
+        if k > math.log(2) / 2
+        else degree
+    )
+
+
+def dir_curve_fit_result_of_cell(res, ymin=0):
+    # the former implementation, for a single cell
+    if res[0] >= res[1]:
+        a1, a2, k1, k2, best_dir_fit, phi2 = res
+    else:
+        a2, a1, k2, k1, phi2, best_dir_fit = res
+    best_dir_fit = np.mod(best_dir_fit, 360)
+    phi2 = np.mod(phi2, 360)
+    null_dir_fit = np.mod(best_dir_fit + 180, 360)
+    r_best_dir_fit = dir_von_mises(best_dir_fit, a1, a2, k1, k2, best_dir_fit, phi2)
+    r_null_dir_fit = dir_von_mises(null_dir_fit, a1, a2, k1, k2, best_dir_fit, phi2)
+    di_fit = 1 - r_null_dir_fit / r_best_dir_fit
+    ds = (a1 - a2) / (a1 + a2)
+
+    return (
+        a1,
+        a2,
+        k1,
+        k2,
+        best_dir_fit,
+        null_dir_fit,
+        r_best_dir_fit + ymin,
+        r_null_dir_fit + ymin,
+        di_fit,
+        ds,
+        tuning_width_of_cell(k1, 180),
+    )
+
+
+def ori_curve_fit_result_of_cell(res):
+    # the former implementation, for a single cell
+    a1, k1, best_ori_fit = res
+    return (a1, k1, np.mod(best_ori_fit, 180), tuning_width_of_cell(k1, 90))
+
+
+def curve_fit_of_cells(temp, func, curve_fit_result_of_cell):
+    """
+    per-cell curve_fit, for the cells converging on the first try
+    """
+    results = {}
+    for i in range(temp.ncells):
+        try:
+            res = curve_fit(
+                func,
+                temp.xdata,
+                temp.ydata[:, i] - temp.ymin,
+                p0=temp.p0[:, i],
+                method="lm",
+            )[0]
+        except RuntimeError:
+            continue
+        results[i] = curve_fit_result_of_cell(res)
+    return results
+
+
+def assert_curvefit_results(temp, func, curve_fit_result_of_cell, workers=1):
+    expected = curve_fit_of_cells(temp, func, curve_fit_result_of_cell)
+    assert len(expected) > NCELLS // 2
+
+    cell_indices = np.arange(temp.ncells)
+    fitted_cells, results = temp.get_curvefit_results(cell_indices, workers)
+
+    assert set(expected.keys()) <= set(fitted_cells)
+    for i in expected.keys():
+        j = np.flatnonzero(fitted_cells == i)[0]
+        np.testing.assert_allclose(
+            [result[j] for result in results], expected[i], rtol=1e-7, atol=1e-10
+        )
+
+
+def test_ydata_interp():
+    rng = np.random.default_rng(0)
+    ydata = create_responses(12, 180, rng)
+
+    for interp_method in ["linear", "cubic", "spline"]:
+        temp = DirTempTuning(ydata, interp_method, True, True)
+        ydata_interp = temp.ydata_interp
+
+        # cached, and the same as interpolated for each cell
+        assert temp.ydata_interp is ydata_interp
+        assert ydata_interp.shape == (24, NCELLS)
+        for i in range(NCELLS):
+            np.testing.assert_allclose(
+                ydata_interp[:, i],
+                ydata_interp_of_cell(ydata[:, i], interp_method, 12),
+                atol=1e-12,
+            )
+
+
+def test_get_curvefit_results():
+    rng = np.random.default_rng(1)
+
+    for do_interp in [False, True]:
+        dir_temp = DirTempTuning(
+            create_responses(12, 180, rng), "linear", do_interp, True
+        )
+        assert_curvefit_results(dir_temp, dir_von_mises, dir_curve_fit_result_of_cell)
+
+        ori_temp = OriTempTuning(create_responses(6, 90, rng), "linear", do_interp)
+        assert_curvefit_results(ori_temp, ori_von_mises, ori_curve_fit_result_of_cell)
+
+
+def test_get_curvefit_results_workers(monkeypatch):
+    rng = np.random.default_rng(2)
+    dir_temp = DirTempTuning(create_responses(12, 180, rng), "linear", True, True)
+    cell_indices = np.arange(1, NCELLS, 2)
+
+    expected_cells, expected_results = dir_temp.get_curvefit_results(cell_indices)
+
+    # chunks of cells (with a partial last chunk) in worker processes
+    monkeypatch.setattr(DirTempTuning, "CURVEFIT_CHUNK_SIZE", 5)
+    fitted_cells, results = dir_temp.get_curvefit_results(cell_indices, workers=2)
+
+    np.testing.assert_array_equal(fitted_cells, expected_cells)
+    np.testing.assert_array_equal(results, expected_results)
+
+    # the same cells fitted by the former per-cell implementation
+    assert_curvefit_results(
+        dir_temp, dir_von_mises, dir_curve_fit_result_of_cell, workers=2
+    )
@@ -0,0 +1,168 @@
+import numpy as np
+from scipy.signal import convolve2d
+
+from studio.app.optinist.wrappers.expdb.get_orimap import (
+    MapParams,
+    calc_map_params_fast2D,
+    convolve2_nd,
+    filter2_nd,
+)
+
+
+def filter2_nd_of_planes(filter, stack):
+    # the former implementation, for each plane
+    stack_dim = stack.shape
+    n = int(np.prod(stack_dim[2:]))
+    reshaped_stack = stack.reshape((stack_dim[0], stack_dim[1], n), order="F")
+    filtered_stack = np.zeros((stack_dim[0], stack_dim[1], n))
+
+    for i in range(n):
+        filtered_plane = convolve2d(
+            reshaped_stack[:, :, i], np.rot90(filter), mode="full"
+        )
+        filtered_stack[:, :, i] = filtered_plane[
+            1 : stack_dim[0] + 1, 1 : stack_dim[1] + 1
+        ]
+
+    return filtered_stack.reshape(stack_dim, order="F")
+
+
+def get_filters(rng):
+    kernel_1d = np.exp(-((np.arange(5) - 2) ** 2) / 2)
+    return [
+        np.full((2, 2), 0.25),
+        np.outer(kernel_1d, kernel_1d) / kernel_1d.sum() ** 2,
+        rng.random((3, 2)),
+        rng.random((9, 9)),
+    ]
+
+
+def test_filter2_nd():
+    rng = np.random.default_rng(0)
+
+    for stack in [
+        rng.random((20, 16)),
+        rng.random((20, 16, 3)),
+        rng.random((20, 16, 2, 3)),
+    ]:
+        for filter in get_filters(rng):
+            filtered = filter2_nd(filter, stack)
+            assert filtered.shape == stack.shape
+            np.testing.assert_allclose(
+                filtered, filter2_nd_of_planes(filter, stack), atol=1e-12
+            )
+
+
+def test_convolve2_nd_valid():
+    rng = np.random.default_rng(1)
+    stack = rng.random((12, 10, 4))
+
+    for kernel in get_filters(rng):
+        filtered = convolve2_nd(stack, kernel, mode="valid")
+        for i in range(stack.shape[2]):
+            np.testing.assert_allclose(
+                filtered[:, :, i],
+                convolve2d(stack[:, :, i], kernel, mode="valid"),
+                atol=1e-12,
+            )
+
+
+def calc_map_params_fast2D_of_pixels(dir):
+    # the former implementation, for each pixel (4D) or direction (2D)
+    dim = dir.shape
+    ndim = dir.ndim
+    ndir = dim[-1]
+
+    params = MapParams()
+
+    if ndim == 4:
+        params.th = np.zeros(dim[:3])
+        params.mag = np.zeros(dim[:3])
+        params.ave_change = np.zeros(dim[:3])
+        params.max_change = np.zeros(dim[:3])
+        params.tune = np.zeros(dim[:3])
+    else:
+        params.th = np.zeros(dim[:2])
+        params.mag = np.zeros(dim[:2])
+        params.ave_change = np.zeros(dim[:2])
+        params.max_change = np.zeros(dim[:2])
+        params.tune = np.zeros(dim[:2])
+
+    a = np.zeros((ndir, 1))
+
+    if ndim == 4:
+        for x in range(dim[0]):
+            for y in range(dim[1]):
+                for z in range(dim[2]):
+                    Vx = 0
+                    Vy = 0
+                    sum = 0
+
+                    # vector averageing
+                    for i in range(ndir):
+                        if dir[x, y, z, i] < 0:
+                            a[i] = 0
+                        else:
+                            a[i] = dir[x, y, z, i].copy()  # explicitly copy.
+
+                        Vx = Vx + a[i] * np.cos(2 * i * np.pi / ndir)
+                        Vy = Vy + a[i] * np.sin(2 * i * np.pi / ndir)
+                        sum = sum + a[i]
+
+                    params.th[x, y, z] = np.arctan2(Vx, Vy)[0]
+                    params.mag[x, y, z] = np.sqrt(Vx**2 + Vy**2)[0]
+                    params.ave_change[x, y, z] = sum[0] / ndir
+                    params.max_change[x, y, z] = np.max(a)
+
+                    if sum > 0:
+                        params.tune[x, y, z] = params.mag[x, y, z] / sum[0]
+                    else:
+                        params.tune[x, y, z] = 0
+
+    else:
+        Vx = np.zeros(dim[:2])
+        Vy = np.zeros(dim[:2])
+        sum = np.zeros(dim[:2])
+        a = np.zeros(dim[:3])
+
+        # vector averageing
+        for i in range(ndir):
+            temp = dir[:, :, i].copy()  # explicitly copy.
+            temp[dir[:, :, i] < 0] = 0
+            a[:, :, i] = temp
+            Vx = Vx + a[:, :, i] * np.cos(2 * i * np.pi / ndir)
+            Vy = Vy + a[:, :, i] * np.sin(2 * i * np.pi / ndir)
+            sum = sum + a[:, :, i]
+
+        params.th = np.arctan2(Vx, Vy)
+        params.mag = np.sqrt(Vx**2 + Vy**2)
+        params.ave_change = sum / ndir
+        params.max_change = np.max(a, axis=2)
+        params.tune = np.zeros(dim[0:2])
+        params.tune[sum != 0] = params.mag[sum != 0] / sum[sum != 0]
+
+    params.th = params.th / np.pi / 2 + 0.5  # normalize to 0-1.
+
+    return params
+
+
+def test_calc_map_params_fast2D():
+    rng = np.random.default_rng(2)
+
+    for dir in [
+        rng.standard_normal((9, 7, 12)),
+        rng.standard_normal((9, 7, 1, 12)),
+        rng.standard_normal((9, 7, 3, 12)),
+        rng.standard_normal((6, 5, 4, 8)).astype(np.float32),
+    ]:
+        # no positive signal change to any direction
+        dir[0, 0] = -1
+
+        params = calc_map_params_fast2D(dir)
+        expected = calc_map_params_fast2D_of_pixels(dir)
+
+        for name in ["th", "mag", "ave_change", "max_change", "tune"]:
+            assert getattr(params, name).shape == dir.shape[:-1]
+            np.testing.assert_allclose(
+                getattr(params, name), getattr(expected, name), atol=1e-12
+            )
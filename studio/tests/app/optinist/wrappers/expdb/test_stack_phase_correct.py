@@ -0,0 +1,113 @@
+import numpy as np
+
+from studio.app.optinist.wrappers.expdb.stack_phase_correct import stack_phase_correct
+from studio.app.optinist.wrappers.expdb.stack_register import stack_register_nD
+
+
+def stack_phase_correct_of_frames(stack, fov, first_dim):
+    # the former implementation, for each frame
+    stack_dim = stack.shape
+    fov_dim = fov.shape
+
+    if first_dim == 1:
+        fov = fov.reshape(
+            [fov_dim[0], 2, int(fov_dim[1] / 2), int(np.prod(fov_dim[2:]))],
+            order="F",
+        )
+        outs, _ = stack_register_nD(
+            np.squeeze(fov[:, 0, :, :]), np.squeeze(fov[:, 1, :, :])
+        )
+        dx = -np.array(outs[2])
+        stack = stack.reshape(
+            [stack_dim[0], 2, int(stack_dim[1] / 2), int(np.prod(stack_dim[2:]))],
+            order="F",
+        )
+        for i in range(np.prod(stack_dim[2:])):
+            stack[:, 1, :, i] = np.roll(stack[:, 1, :, i], dx, axis=0)
+
+    elif first_dim == 2:
+        fov = fov.reshape(
+            [2, int(fov_dim[0] / 2), fov_dim[1], int(np.prod(fov_dim[2:]))],
+            order="F",
+        )
+        outs, _ = stack_register_nD(
+            np.squeeze(fov[0, :, :, :]), np.squeeze(fov[1, :, :, :])
+        )
+        dx = -np.array(outs[2])
+        stack = stack.reshape(
+            [2, int(stack_dim[0] / 2), stack_dim[1], int(np.prod(stack_dim[2:]))],
+            order="F",
+        )
+        for i in range(np.prod(stack_dim[2:])):
+            stack[1, :, :, i] = np.roll(stack[1, :, :, i], dx, axis=1)
+
+    return stack.reshape(stack_dim, order="F")
+
+
+def get_scanned_stack(shape, shift, rng):
+    # bidirectional scan of smooth images (along x), odd rows are shifted
+    y, x = np.meshgrid(np.arange(shape[0]), np.arange(shape[1]), indexing="ij")
+    x = x + np.where(y % 2 == 1, shift, 0)
+    frames = [
+        np.sin(x / 3 + phase) + np.cos(y / 5 - phase)
+        for phase in rng.random(int(np.prod(shape[2:])))
+    ]
+    return np.stack(frames, axis=-1).reshape(shape) * 100 + 1000
+
+
+def test_stack_phase_correct():
+    rng = np.random.default_rng(0)
+
+    for shape in [(16, 24, 10), (16, 24, 3, 4)]:
+        for first_dim in [1, 2]:
+            stack = np.round(get_scanned_stack(shape, 2, rng)).astype(np.uint16)
+            stack = stack + rng.integers(0, 50, shape, dtype=np.uint16)
+            fov = stack.mean(axis=-1)
+
+            expected = stack_phase_correct_of_frames(stack.copy(), fov, first_dim)
+            original = stack.copy()
+            corrected, _ = stack_phase_correct(stack, fov, first_dim)
+            np.testing.assert_array_equal(corrected, expected)
+
+            # the stack of the caller is not modified
+            np.testing.assert_array_equal(stack, original)
+
+
+def test_stack_phase_correct_orthogonal_shift():
+    rng = np.random.default_rng(2)
+
+    for first_dim in [1, 2]:
+        line_axis, scan_axis = 2 - first_dim, first_dim - 1
+
+        # odd lines shifted by 2 along the scan axis, and by 1 across the lines
+        even_lines = get_scanned_stack((8, 12, 1), 0, rng)[..., 0]
+        if first_dim == 1:
+            even_lines = even_lines.T
+        odd_lines = np.roll(np.roll(even_lines, 1, line_axis), 2, scan_axis)
+        fov = np.stack([even_lines, odd_lines], axis=line_axis + 1).reshape(
+            (16, 12) if first_dim == 2 else (12, 16)
+        )
+        stack = np.repeat(fov[..., np.newaxis], 3, axis=-1)
+
+        # only the shift along the scan axis is corrected
+        for usfac in [1, 10]:
+            corrected, dx = stack_phase_correct(stack, fov, first_dim, usfac)
+            assert dx == -2
+
+            lines = (slice(None),) * line_axis + (slice(1, None, 2),)
+            np.testing.assert_allclose(
+                corrected[lines], np.roll(stack[lines], -2, scan_axis), atol=1e-9
+            )
+
+
+def test_stack_phase_correct_subpixel():
+    rng = np.random.default_rng(1)
+    stack = get_scanned_stack((64, 64, 5), 1.5, rng)
+    fov = stack.mean(axis=-1)
+
+    corrected, dx = stack_phase_correct(stack.copy(), fov, 2, usfac=10)
+    assert abs(dx - 1.5) <= 0.2
+
+    expected = get_scanned_stack((64, 64, 5), 0, np.random.default_rng(1))
+    inner = (slice(None), slice(4, -4))
+    assert np.abs(corrected - expected)[inner].max() < 0.1 * np.abs(expected).max()
@@ -0,0 +1,132 @@
+import numpy as np
+from numpy.fft import fft2, ifft2
+
+from studio.app.optinist.wrappers.expdb.dft_registration import (
+    dft_registration,
+    dft_registration_frames,
+)
+from studio.app.optinist.wrappers.expdb.stack_register import stack_register
+
+USFACS = [0, 1, 2, 20]
+
+
+def stack_register_of_frames(stack, target, usfac):
+    # the former implementation, for each frame
+    target = fft2(target.astype(np.float32))
+    nframes = stack.shape[-1]
+    outs = np.empty((nframes, 4))
+
+    for i in range(nframes):
+        slice_ = fft2(stack[:, :, i].astype(np.float32))
+        error, diffphase, row_shift, col_shift, greg = dft_registration(
+            target, slice_, usfac
+        )
+        outs[i, :] = [error, diffphase, row_shift, col_shift]
+
+        if greg is not None:
+            stack[:, :, i] = np.abs(ifft2(greg)).astype(stack.dtype)
+
+    return outs, stack
+
+
+def create_stack(nframes=10, shape=(32, 24)):
+    """
+    (y, x, t) stack of a smooth image, shifted by subpixels with noise
+    """
+    rng = np.random.default_rng(0)
+    m, n = shape
+    freqs = np.add.outer(np.fft.fftfreq(m) ** 2, np.fft.fftfreq(n) ** 2)
+    target = np.real(ifft2(fft2(rng.random(shape)) * np.exp(-freqs * 20))) * 100
+
+    shifts = rng.uniform(-4, 4, (nframes, 2))
+    frames = [
+        np.real(
+            ifft2(
+                fft2(target)
+                * np.exp(
+                    -2j
+                    * np.pi
+                    * np.add.outer(
+                        np.fft.fftfreq(m) * row_shift, np.fft.fftfreq(n) * col_shift
+                    )
+                )
+            )
+        )
+        + rng.normal(0, 0.1, shape)
+        for row_shift, col_shift in shifts
+    ]
+
+    return np.stack(frames, axis=-1).astype(np.float32), target
+
+
+def test_dft_registration_frames():
+    stack, target = create_stack()
+    buf1ft = fft2(target.astype(np.float32))
+    frames = np.moveaxis(stack, -1, 0).astype(np.float64)
+
+    for usfac in USFACS:
+        outs, registered = dft_registration_frames(buf1ft, frames, usfac)
+
+        for i, frame in enumerate(frames):
+            error, diffphase, row_shift, col_shift, greg = dft_registration(
+                buf1ft, fft2(frame), usfac
+            )
+            np.testing.assert_allclose(
+                outs[i],
+                np.array([error, diffphase, row_shift, col_shift], dtype=float),
+                atol=1e-9,
+            )
+            np.testing.assert_allclose(registered[i], np.abs(ifft2(greg)), atol=1e-9)
+
+
+def test_stack_register():
+    stack, target = create_stack()
+
+    for usfac in USFACS:
+        expected_outs, expected_stack = stack_register_of_frames(
+            stack.copy(), target, usfac
+        )
+
+        # blocks of frames, with a partial last block, in threads
+        for workers in [1, 3]:
+            outs, registered = stack_register(
+                stack.copy(), target, usfac, block_size=4, workers=workers
+            )
+            assert registered.dtype == stack.dtype
+            np.testing.assert_allclose(outs, expected_outs, atol=1e-9)
+            np.testing.assert_allclose(registered, expected_stack, rtol=1e-6, atol=1e-4)
+
+
+def test_stack_register_float32():
+    stack, target = create_stack()
+
+    for usfac in USFACS:
+        expected_outs, expected_stack = stack_register_of_frames(
+            stack.copy(), target, usfac
+        )
+        outs, registered = stack_register(
+            stack.copy(), target, usfac, block_size=4, workers=2, use_float32=True
+        )
+
+        # single precision:
+        # - error (sqrt(1 - normalized cc peak)) to sqrt(eps), phase to 1e-4
+        # - shifts exactly for usfac <= 2, else to one upsampled pixel (1/usfac),
+        #   as the flat upsampled cc peak may move by rounding
+        # - registered images to 1e-5 of the intensity range for usfac <= 2,
+        #   else in average to 1e-3 (subpixel shifts may differ by 1/usfac)
+        shift_tol = 1e-6 if usfac <= 2 else 1 / usfac + 1e-6
+        intensity_range = np.ptp(expected_stack)
+
+        np.testing.assert_allclose(
+            outs[:, 0], expected_outs[:, 0], atol=np.sqrt(np.finfo(np.float32).eps)
+        )
+        np.testing.assert_allclose(outs[:, 1], expected_outs[:, 1], atol=1e-4)
+        np.testing.assert_allclose(outs[:, 2:], expected_outs[:, 2:], atol=shift_tol)
+        if usfac <= 2:
+            np.testing.assert_allclose(
+                registered, expected_stack, atol=1e-5 * intensity_range
+            )
+        else:
+            assert np.mean(np.abs(registered - expected_stack)) < (
+                1e-3 * intensity_range
+            )
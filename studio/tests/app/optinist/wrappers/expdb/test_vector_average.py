@@ -0,0 +1,34 @@
+import math
+
+import numpy as np
+
+from studio.app.optinist.wrappers.expdb.vector_average import get_1d_vector_average
+
+
+def get_1d_vector_average_of_cell(ratio):
+    # the former implementation, for a cell
+    nstim_per_run = ratio.shape[0]
+    vx, vy, sum = 0, 0, 0
+
+    for i in range(nstim_per_run):
+        a = max(ratio[i], 0)
+        vx += a * math.cos(i * 2 * math.pi / nstim_per_run)
+        vy += a * math.sin(i * 2 * math.pi / nstim_per_run)
+        sum += a
+    vector_angle = np.mod(math.atan2(vy, vx) * 180 / math.pi, 360)
+    vector_mag = (vx**2 + vy**2) ** 0.5
+    vector_tune = vector_mag / sum if sum > 0 else 0
+
+    return vector_angle, vector_mag, vector_tune
+
+
+def test_get_1d_vector_average():
+    ratio = np.random.default_rng(0).normal(size=(5, 12))
+    ratio[3] = -1
+    ratio[4, 2] = np.nan
+
+    results = get_1d_vector_average(ratio)
+
+    for i, cell_ratio in enumerate(ratio):
+        expected = get_1d_vector_average_of_cell(cell_ratio)
+        np.testing.assert_allclose([r[i] for r in results], expected, atol=1e-12)
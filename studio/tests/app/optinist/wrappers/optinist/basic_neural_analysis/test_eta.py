@@ -0,0 +1,95 @@
+import numpy as np
+from scipy.stats import mode
+
+from studio.app.optinist.wrappers.optinist.basic_neural_analysis.eta import (
+    calc_trigger,
+    calc_trigger_average,
+    calc_trigger_stats,
+)
+
+
+def calc_trigger_of_frames(behavior_data, trigger_type, trigger_threshold):
+    # the former implementation, frame by frame
+    flg = np.array(np.array(behavior_data, dtype=float) > trigger_threshold, dtype=int)
+    trigger_idx = []
+    trigger_lengths = []
+
+    i = 0
+    while i < len(flg):
+        if (
+            (trigger_type == "up" and flg[i] == 1 and (i == 0 or flg[i - 1] == 0))
+            or (trigger_type == "down" and flg[i] == 0 and i > 0 and flg[i - 1] == 1)
+            or (
+                trigger_type == "cross"
+                and (
+                    (flg[i] == 1 and (i == 0 or flg[i - 1] == 0))
+                    or (flg[i] == 0 and i > 0 and flg[i - 1] == 1)
+                )
+            )
+        ):
+            length = 0
+            while i + length < len(flg) and flg[i + length] == flg[i]:
+                length += 1
+            trigger_idx.append(i)
+            trigger_lengths.append(length)
+            i += length
+        else:
+            i += 1
+
+    if not trigger_lengths:
+        return [], 0
+    trigger_len = mode(trigger_lengths, keepdims=True).mode[0]
+    trigger_idx = [
+        idx
+        for idx, length in zip(trigger_idx, trigger_lengths)
+        if length == trigger_len
+    ]
+    return np.array(trigger_idx), trigger_len
+
+
+def test_calc_trigger():
+    rng = np.random.default_rng(0)
+    behaviors = [
+        np.repeat(rng.random(200) > 0.5, rng.choice([3, 5], 200)),
+        np.tile([0, 0, 1, 1, 1, 0, 0, 0], 20)[1:],
+        np.ones(10),
+        np.zeros(10),
+        np.tile([1, 0], 10),
+    ]
+
+    for behavior in behaviors:
+        for trigger_type in ["up", "down", "cross"]:
+            trigger_idx, trigger_len = calc_trigger(behavior, trigger_type, 0)
+            expected_idx, expected_len = calc_trigger_of_frames(
+                behavior, trigger_type, 0
+            )
+            np.testing.assert_array_equal(trigger_idx, expected_idx)
+            assert trigger_len == expected_len
+
+
+def test_calc_trigger_stats():
+    rng = np.random.default_rng(1)
+    neural_data = rng.normal(size=(500, 7))
+    trigger_idx = np.sort(rng.choice(500, 60, replace=False))
+    trigger_len, pre_event, post_event = 4, -10, 12
+
+    # the event windows of the triggers within the data
+    events = [
+        neural_data[idx + pre_event : idx + trigger_len + post_event]
+        for idx in trigger_idx
+        if idx + pre_event >= 0 and idx + trigger_len + post_event <= 500
+    ]
+    events = np.array(events)
+
+    event_trigger_data = calc_trigger_average(
+        neural_data, trigger_idx, trigger_len, pre_event, post_event
+    )
+    np.testing.assert_array_equal(event_trigger_data, events)
+
+    mean, std, sem, num_event = calc_trigger_stats(
+        neural_data, trigger_idx, trigger_len, pre_event, post_event
+    )
+    assert num_event == len(events)
+    np.testing.assert_allclose(mean, events.mean(axis=0).T)
+    np.testing.assert_allclose(std, events.std(axis=0).T)
+    np.testing.assert_allclose(sem, events.std(axis=0).T / np.sqrt(len(events)))
@@ -0,0 +1,32 @@
+import numpy as np
+import scipy.signal as ss
+
+from studio.app.optinist.wrappers.optinist.neural_population_analysis.cross_correlation import (  # noqa: E501
+    correlate_all_pairs,
+)
+
+
+def get_lags(data_len, max_lag):
+    lags = ss.correlation_lags(data_len, data_len, mode="same")
+    return lags, (-max_lag <= lags) & (lags <= max_lag)
+
+
+def test_correlate_all_pairs():
+    X = np.random.default_rng(0).normal(size=(4, 51))
+    X_copy = X.copy()
+    lags, ind = get_lags(X.shape[1], 10)
+
+    mat, s_mean, s_sem = correlate_all_pairs(X, lags[ind], shuffle_num=20)
+
+    expected = np.array(
+        [
+            [ss.correlate(xi, xj, mode="same", method="direct")[ind] for xj in X]
+            for xi in X
+        ]
+    )
+    np.testing.assert_allclose(mat, expected, atol=1e-10)
+    assert s_mean.shape == s_sem.shape == mat.shape
+    assert np.all(s_sem > 0)
+
+    # the input is not shuffled in place
+    np.testing.assert_array_equal(X, X_copy)
@@ -0,0 +1,29 @@
+import itertools
+
+import numpy as np
+from statsmodels.tsa.stattools import grangercausalitytests
+
+from studio.app.optinist.wrappers.optinist.neural_population_analysis.granger import (
+    get_granger_lags,
+    granger_all_pairs,
+)
+
+
+def test_granger_all_pairs():
+    X = np.random.default_rng(0).normal(size=(100, 3))
+    X[1:, 2] += 0.8 * X[:-1, 0]
+    lags = get_granger_lags(2)
+
+    results = granger_all_pairs(X, lags)
+
+    for i, j in itertools.permutations(range(3), 2):
+        expected = grangercausalitytests(X[:, [i, j]], 2, verbose=False)
+        for k, lag in enumerate(lags):
+            for key in ["ssr_ftest", "ssr_chi2test", "lrtest", "params_ftest"]:
+                test = expected[lag][0][key]
+                np.testing.assert_allclose(
+                    results[key][i, j, k], np.array(test, dtype=float)
+                )
+
+    # cell 0 Granger causes cell 2
+    assert results["ssr_ftest"][2, 0, 0, 1] < 0.01